@@ -0,0 +1,32 @@
+"""
+Add an index for the history pages of a user.
+
+Revision ID: 3f9c2b7d41a8
+Revises: ecdad15af032
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f9c2b7d41a8"
+down_revision = "ecdad15af032"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create the (user_id, created_at DESC, id) index on history."""
+    op.create_index(
+        "ix_history_user_id_created_at_id",
+        "history",
+        ["user_id", sa.text("created_at DESC"), "id"],
+    )
+
+
+def downgrade():
+    """Drop the (user_id, created_at DESC, id) index on history."""
+    op.drop_index("ix_history_user_id_created_at_id", table_name="history")
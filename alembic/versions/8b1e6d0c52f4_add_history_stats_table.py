@@ -0,0 +1,60 @@
+"""
+Add the history_stats counters table.
+
+Revision ID: 8b1e6d0c52f4
+Revises: 3f9c2b7d41a8
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8b1e6d0c52f4"
+down_revision = "3f9c2b7d41a8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Create the history_stats table and fill it from the history."""
+    op.create_table(
+        "history_stats",
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("yt_video_url", sa.String(), nullable=False),
+        sa.Column("resolution", sa.String(), nullable=False),  # Empty for audio-only
+        sa.Column("video_title", sa.String(), nullable=False),
+        sa.Column("downloads", sa.Integer(), nullable=False),
+        sa.Column("clip_seconds", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("user_id", "day", "yt_video_url", "resolution"),
+    )
+    op.execute(
+        """
+        INSERT INTO history_stats (
+            user_id, day, yt_video_url, resolution,
+            video_title, downloads, clip_seconds
+        )
+        SELECT
+            user_id,
+            CAST(created_at AS DATE),
+            yt_video_url,
+            COALESCE(resolution, ''),
+            MAX(video_title),
+            COUNT(*),
+            COALESCE(SUM(end_time - start_time), 0)
+        FROM history
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def downgrade():
+    """Drop the history_stats table."""
+    op.drop_table("history_stats")
@@ -0,0 +1,75 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    """Load a results file written by `benchmarks.run`."""
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    Print the change of every benchmark's median between two results.
+
+    Returns
+    -------
+        The names of the benchmarks more than `threshold` percent slower.
+
+    """
+    regressions = []
+    print(f"{'benchmark':<20} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name, {}).get("median")
+        after = result.get("median")
+        if before is None or after is None:
+            note = result.get("skipped") or result.get("error") or "no baseline"
+            print(f"{name:<20} {note}")
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  slower"
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<20} {before:>10.3f}ms {after:>10.3f}ms {change:>+8.1f}%{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Compare two results files, failing if the second one regressed."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compare",
+        description="Compare the medians of two benchmark results files.",
+    )
+    parser.add_argument("baseline", help="results of the reference commit")
+    parser.add_argument("current", help="results of the commit to check")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="percent slower a median may get before failing",
+    )
+    options = parser.parse_args(argv)
+
+    baseline = load_results(options.baseline)
+    current = load_results(options.current)
+    for key in ("platform", "cpu_count", "ffmpeg", "options"):
+        if baseline.get(key) != current.get(key):
+            print(f"Warning: the {key} differ, results may not be comparable.")
+    print(f"{baseline.get('commit')} -> {current.get('commit')}")
+
+    regressions = compare(baseline, current, options.threshold)
+    if regressions:
+        print(f"Slower by more than {options.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
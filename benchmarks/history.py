@@ -0,0 +1,182 @@
+import datetime
+import random
+from typing import Any, Dict, List, Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from yt_download_service.app.use_cases.history_service import encode_history_cursor
+from yt_download_service.infrastructure.database.models import (
+    Base,
+    DBHistory,
+    DBHistoryStats,
+    DBUser,
+)
+
+# Everything lives in this schema, dropped afterwards, so the benchmark
+# can run against a development database without touching its tables.
+BENCHMARK_SCHEMA = "ytds_benchmark"
+_INSERT_CHUNK_SIZE = 5000
+
+
+class BenchmarkDatabase:
+    """
+    Postgres stand-in for the service's database, in a throwaway schema.
+
+    The history is seeded with a heavy user, whose queries are measured,
+    and as many rows spread over other users, so that the queries have to
+    go through the indexes rather than read the whole table. SQLite cannot
+    stand in: the models use Postgres UUIDs and the statistics upserts.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.engine = create_async_engine(
+            url,
+            execution_options={"schema_translate_map": {None: BENCHMARK_SCHEMA}},
+        )
+        self.sessions = async_sessionmaker(
+            self.engine, expire_on_commit=False, class_=AsyncSession
+        )
+        self.user_id: UUID = uuid4()
+
+    async def create(self) -> None:
+        """Create the schema and its tables, dropping any left behind."""
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                text(f"DROP SCHEMA IF EXISTS {BENCHMARK_SCHEMA} CASCADE")
+            )
+            await connection.execute(text(f"CREATE SCHEMA {BENCHMARK_SCHEMA}"))
+            await connection.run_sync(Base.metadata.create_all)
+
+    async def drop(self) -> None:
+        """Drop the schema, and close the connections."""
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                text(f"DROP SCHEMA IF EXISTS {BENCHMARK_SCHEMA} CASCADE")
+            )
+        await self.engine.dispose()
+
+    async def seed(
+        self, rows: int, videos: int = 500, days: int = 365, other_users: int = 50
+    ) -> None:
+        """
+        Fill the history, and its statistics from it.
+
+        The benchmark user gets `rows` entries over the last `days` days,
+        the other users as many between them.
+        """
+        rng = random.Random(0)
+        users = [self.user_id] + [uuid4() for _ in range(other_users)]
+        now = datetime.datetime.now()
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                insert(DBUser),
+                [
+                    {
+                        "id": user_id,
+                        "email": f"benchmark-{index}@example.com",
+                        "first_name": "Benchmark",
+                        "last_name": str(index),
+                    }
+                    for index, user_id in enumerate(users)
+                ],
+            )
+            for owners in ([self.user_id], users[1:]):
+                entries = [
+                    self._entry(rng, rng.choice(owners), now, videos, days)
+                    for _ in range(rows)
+                ]
+                for start in range(0, rows, _INSERT_CHUNK_SIZE):
+                    await connection.execute(
+                        insert(DBHistory), entries[start : start + _INSERT_CHUNK_SIZE]
+                    )
+            # Same counters as the migration that added the statistics.
+            keys = [
+                DBHistory.user_id,
+                func.date(DBHistory.created_at),
+                DBHistory.yt_video_url,
+                func.coalesce(DBHistory.resolution, ""),
+            ]
+            await connection.execute(
+                insert(DBHistoryStats).from_select(
+                    [
+                        "user_id",
+                        "day",
+                        "yt_video_url",
+                        "resolution",
+                        "video_title",
+                        "downloads",
+                        "clip_seconds",
+                    ],
+                    select(
+                        *keys,
+                        func.max(DBHistory.video_title),
+                        func.count(),
+                        func.coalesce(
+                            func.sum(DBHistory.end_time - DBHistory.start_time), 0
+                        ),
+                    ).group_by(*keys),
+                )
+            )
+        async with self.engine.connect() as connection:
+            await connection.execute(text(f"ANALYZE {BENCHMARK_SCHEMA}.history"))
+            await connection.execute(text(f"ANALYZE {BENCHMARK_SCHEMA}.history_stats"))
+
+    def _entry(
+        self,
+        rng: random.Random,
+        user_id: UUID,
+        now: datetime.datetime,
+        videos: int,
+        days: int,
+    ) -> Dict[str, Any]:
+        video = rng.randrange(videos)
+        created_at = now - datetime.timedelta(seconds=rng.uniform(0, days * 86400))
+        start_time: Optional[int] = None
+        end_time: Optional[int] = None
+        if rng.random() < 0.5:
+            start_time = rng.randrange(600)
+            end_time = start_time + rng.randrange(5, 120)
+        return {
+            "id": uuid4(),
+            "user_id": user_id,
+            "yt_video_url": f"https://www.youtube.com/watch?v=bm{video:09d}",
+            "video_title": f"Benchmark video {video}",
+            "resolution": rng.choice(["1080p", "720p", "360p", None]),
+            "format_id": "137",
+            "start_time": start_time,
+            "end_time": end_time,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+    async def cursor_at(self, offset: int) -> Optional[str]:
+        """Return the cursor of the history page starting after `offset` rows."""
+        async with self.sessions() as db:
+            row = (
+                await db.execute(
+                    select(DBHistory.created_at, DBHistory.id)
+                    .where(DBHistory.user_id == self.user_id)
+                    .order_by(DBHistory.created_at.desc(), DBHistory.id)
+                    .offset(offset - 1)
+                    .limit(1)
+                )
+            ).first()
+        return encode_history_cursor((row.created_at, row.id)) if row else None
+
+
+def history_entries(user_id: UUID, count: int) -> List[Dict[str, Any]]:
+    """Return entries to record, as the history writer queues them."""
+    return [
+        {
+            "user_id": user_id,
+            "video_url": f"https://www.youtube.com/watch?v=bm{index:09d}",
+            "video_title": f"Benchmark video {index}",
+            "format_id": "137",
+            "resolution": "1080p",
+            "start_time_str": "00:00:10",
+            "end_time_str": "00:00:40",
+        }
+        for index in range(count)
+    ]
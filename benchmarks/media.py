@@ -0,0 +1,230 @@
+import os
+import re
+import subprocess
+import sys
+import threading
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+# The ladder YouTube serves for most videos, each in H.264 and VP9.
+VIDEO_HEIGHTS = (144, 240, 360, 480, 720)
+VIDEO_CODECS = ("avc1", "vp9")
+# Keyframe interval, in seconds, close to YouTube's DASH formats.
+GOP_SECONDS = 2
+FRAME_RATE = 30
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def video_width(height: int) -> int:
+    """Return the width of a 16:9 video, rounded down to an even number."""
+    return height * 16 // 9 // 2 * 2
+
+
+def video_file_name(codec: str, height: int) -> str:
+    """Return the name of the video-only file of a codec and height."""
+    extension = "mp4" if codec == "avc1" else "webm"
+    return f"{codec}_{height}p.{extension}"
+
+
+AUDIO_FILES = {"mp4a": "mp4a_128k.m4a", "opus": "opus_160k.webm"}
+
+
+def _video_command(codec: str, height: int, duration: int, path: str) -> List[str]:
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc2=size={video_width(height)}x{height}:rate={FRAME_RATE}",
+        "-t",
+        str(duration),
+        "-g",
+        str(GOP_SECONDS * FRAME_RATE),
+        "-keyint_min",
+        str(GOP_SECONDS * FRAME_RATE),
+        "-pix_fmt",
+        "yuv420p",
+    ]
+    if codec == "avc1":
+        command += [
+            "-c:v",
+            "libx264",
+            "-profile:v",
+            "high",
+            "-preset",
+            "veryfast",
+            "-sc_threshold",
+            "0",
+            # Fragmented, like YouTube's DASH formats.
+            "-movflags",
+            "+frag_keyframe+empty_moov+default_base_moof",
+        ]
+    else:
+        command += [
+            "-c:v",
+            "libvpx-vp9",
+            "-deadline",
+            "realtime",
+            "-cpu-used",
+            "8",
+            "-b:v",
+            f"{height * 2}k",
+        ]
+    return command + ["-an", path]
+
+
+def _audio_command(codec: str, duration: int, path: str) -> List[str]:
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        "sine=frequency=440:sample_rate=48000",
+        "-t",
+        str(duration),
+    ]
+    if codec == "mp4a":
+        command += [
+            "-c:a",
+            "aac",
+            "-b:a",
+            "128k",
+            "-movflags",
+            "+frag_keyframe+empty_moov+default_base_moof",
+        ]
+    else:
+        command += ["-c:a", "libopus", "-b:a", "160k"]
+    return command + ["-vn", path]
+
+
+def generate_media(media_dir: str, duration: int) -> None:
+    """
+    Generate the test media with ffmpeg, reusing files already there.
+
+    Files do not record their duration, use a directory per duration.
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    commands = [
+        (video_file_name(codec, height), partial(_video_command, codec, height))
+        for codec in VIDEO_CODECS
+        for height in VIDEO_HEIGHTS
+    ] + [(name, partial(_audio_command, codec)) for codec, name in AUDIO_FILES.items()]
+    for name, build_command in commands:
+        path = os.path.join(media_dir, name)
+        if os.path.exists(path):
+            continue
+        # Written aside first, so an interrupted run leaves no partial file.
+        partial_path = os.path.join(media_dir, "partial_" + name)
+        subprocess.run(build_command(duration, partial_path), check=True)
+        os.replace(partial_path, path)
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Static file handler answering single `Range` requests, like a CDN.
+
+    ffmpeg and ffprobe seek in remote inputs with range requests, which
+    the standard handler ignores. Multiple ranges are not supported.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def send_head(self):  # noqa: D102
+        self._range: Optional[Tuple[int, int]] = None
+        header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if header is None or not os.path.isfile(path):
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        match = _RANGE_PATTERN.match(header.strip())
+        if match is None or match.groups() == ("", ""):
+            return super().send_head()
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1
+        if start >= size or start > end:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        file = open(path, "rb")
+        file.seek(start)
+        self._range = (start, end)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        return file
+
+    def end_headers(self) -> None:  # noqa: D102
+        if self._range is None:
+            self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def copyfile(self, source, outputfile) -> None:  # noqa: D102
+        if self._range is None:
+            return super().copyfile(source, outputfile)
+        remaining = self._range[1] - self._range[0] + 1
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+    def log_message(self, format, *args) -> None:  # noqa: D102
+        pass
+
+
+class _MediaHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # ffmpeg drops its connection whenever it seeks.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MediaServer:
+    """Serve a directory over HTTP on localhost, from a background thread."""
+
+    def __init__(self, directory: str) -> None:
+        handler = partial(RangeRequestHandler, directory=directory)
+        self._server = _MediaHTTPServer(("127.0.0.1", 0), handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="media-server", daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        """Return the URL the files are served under."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "MediaServer":
+        """Start serving."""
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop serving, and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from benchmarks.media import MediaServer, generate_media
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+# Must match the names in `benchmarks.suite.BENCHMARKS`, which cannot be
+# imported before the environment is set up.
+BENCHMARK_NAMES = [
+    "formats",
+    "full_download",
+    "sample",
+    "samples_zip",
+    "throughput_formats",
+    "throughput_samples",
+    "history_first_page",
+    "history_deep_page",
+    "history_stats",
+    "history_export",
+    "history_write",
+]
+# Seconds of media the ranges of `benchmarks.suite` need: the last sample
+# ends at 47s, and its GOP at 48s.
+MIN_DURATION = 48
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmark the service offline, and save the results as JSON.",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=BENCHMARK_NAMES,
+        default=BENCHMARK_NAMES,
+        metavar="NAME",
+        help=f"benchmarks to run, among: {', '.join(BENCHMARK_NAMES)}",
+    )
+    parser.add_argument(
+        "--output",
+        help="results file, benchmarks/results/<commit>.json by default",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs first")
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=200,
+        help="calls per run of the formats benchmark",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="requests sent at once"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=32, help="requests per throughput run"
+    )
+    parser.add_argument(
+        "--extraction-delay",
+        type=float,
+        default=0.2,
+        help="seconds a stubbed extraction takes",
+    )
+    parser.add_argument(
+        "--duration",
+        type=int,
+        default=60,
+        help=f"seconds of the test media, at least {MIN_DURATION}",
+    )
+    parser.add_argument(
+        "--media-dir",
+        default=os.path.join(BENCHMARKS_DIR, ".media"),
+        help="where the test media is generated, and kept between runs",
+    )
+    parser.add_argument(
+        "--db-url",
+        default=os.getenv("BENCH_DB_URL"),
+        help=(
+            "Postgres database for the history benchmarks, as a "
+            "postgresql+asyncpg:// URL, $BENCH_DB_URL by default. "
+            "They are skipped without one."
+        ),
+    )
+    parser.add_argument(
+        "--history-rows",
+        type=int,
+        default=20000,
+        help="history entries of the benchmarked user",
+    )
+    options = parser.parse_args(argv)
+    if options.duration < MIN_DURATION:
+        parser.error(
+            f"--duration must be at least {MIN_DURATION}s, "
+            "the samples are cut up to 47s"
+        )
+    return options
+
+
+def _configure_environment(options: argparse.Namespace) -> None:
+    """Set the settings the service reads on import."""
+    # Every run has to do the work, rather than be served from the cache.
+    os.environ["RESULT_CACHE_MAX_BYTES"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    # Only connected to by the history benchmarks, through their own engine.
+    os.environ.setdefault(
+        "DB_URL", options.db_url or "postgresql+asyncpg://benchmark@127.0.0.1/benchmark"
+    )
+
+
+def _command_output(command: List[str]) -> Optional[str]:
+    try:
+        return subprocess.run(
+            command, capture_output=True, text=True, check=True, cwd=REPO_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info() -> Dict[str, Any]:
+    """Describe what the results were measured on, to compare like with like."""
+    ffmpeg_version = _command_output(["ffmpeg", "-version"])
+    return {
+        "commit": _command_output(["git", "rev-parse", "HEAD"]),
+        "dirty": bool(_command_output(["git", "status", "--porcelain", "-uno"])),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version.splitlines()[0] if ffmpeg_version else None,
+    }
+
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    """Print a summary of the results."""
+    for name, result in results.items():
+        if "median" in result:
+            line = (
+                f"median {result['median']:>10.3f} ms   p95 {result['p95']:>10.3f} ms"
+            )
+            if "requests_per_second" in result:
+                line += f"   {result['requests_per_second']} req/s"
+        else:
+            line = result.get("skipped") or result.get("error", "")
+        print(f"{name:<20} {line}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks, print and save their results."""
+    options = parse_args(argv)
+    _configure_environment(options)
+    from benchmarks.suite import run_benchmarks
+
+    media_dir = os.path.join(options.media_dir, f"{options.duration}s")
+    print(f"Generating the test media in {media_dir}...", flush=True)
+    generate_media(media_dir, options.duration)
+
+    info = environment_info()
+    started_at = datetime.now(timezone.utc)
+    with MediaServer(media_dir) as server:
+        results = asyncio.run(run_benchmarks(options, server.base_url, options.only))
+
+    report = {
+        **info,
+        "started_at": started_at.isoformat(),
+        "options": {
+            name: value
+            for name, value in vars(options).items()
+            if name not in ("output", "media_dir", "db_url")
+        },
+        "database": bool(options.db_url),
+        "results": results,
+    }
+    output = options.output
+    if output is None:
+        suffix = "-dirty" if info["dirty"] else ""
+        output = os.path.join(
+            BENCHMARKS_DIR,
+            "results",
+            f"{(info['commit'] or 'unknown')[:12]}{suffix}.json",
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+        file.write("\n")
+
+    print_results(results)
+    print(f"Results saved to {output}")
+    return 1 if any("error" in result for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
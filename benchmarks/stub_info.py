@@ -0,0 +1,154 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.media import (
+    AUDIO_FILES,
+    VIDEO_CODECS,
+    VIDEO_HEIGHTS,
+    video_file_name,
+    video_width,
+)
+from yt_download_service.app.use_cases.video_service import VideoService
+from yt_download_service.app.utils.video_utils import extract_video_id
+
+# YouTube's itags for the video-only formats of the ladder.
+_VIDEO_ITAGS = {
+    "avc1": {144: "160", 240: "133", 360: "134", 480: "135", 720: "136"},
+    "vp9": {144: "278", 240: "242", 360: "243", 480: "244", 720: "247"},
+}
+_VCODECS = {"avc1": "avc1.64001f", "vp9": "vp09.00.31.08"}
+# Media URLs are signed for six hours, which the info cache relies on.
+_URL_LIFETIME_SECONDS = 6 * 3600
+
+
+class StubInfoProvider:
+    """
+    Stand-in for yt-dlp's extraction, answering with local media URLs.
+
+    Info dicts have the shape yt-dlp gives for a YouTube video: the video
+    ladder in H.264 and VP9, M4A and Opus audio, plus the HLS, muxed and
+    storyboard formats the service has to skip. Media URLs point at the
+    local media server, which only has the files of the formats used for
+    downloads. `delay` stands for the time a real extraction takes, slept
+    on the calling worker thread.
+
+    Replaces `VideoService._extract_video_info`, so the info cache in
+    front of it stays part of what is measured.
+    """
+
+    def __init__(self, base_url: str, duration: int, delay: float = 0.0) -> None:
+        self.base_url = base_url
+        self.duration = duration
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def install(self, video_service: VideoService) -> None:
+        """Make a service extract from this provider instead of YouTube."""
+        video_service._extract_video_info = self  # type: ignore[method-assign]
+
+    def __call__(self, url: str, encoded_cookies: Optional[str] = None) -> dict:
+        """Return the info dict of a video, as `_extract_video_info` would."""
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        video_id = extract_video_id(url) or url
+        return self.info_dict(video_id)
+
+    def info_dict(self, video_id: str) -> Dict[str, Any]:
+        """Build the info dict of a video."""
+        return {
+            "id": video_id,
+            "title": f"Benchmark video {video_id}",
+            "duration": self.duration,
+            "thumbnail": f"{self.base_url}/{video_id}.jpg",
+            "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+            "formats": self._formats(),
+        }
+
+    def _url(self, name: str) -> str:
+        expire = int(time.time()) + _URL_LIFETIME_SECONDS
+        return f"{self.base_url}/{name}?expire={expire}"
+
+    def _formats(self) -> List[Dict[str, Any]]:
+        # Worst to best, as yt-dlp sorts them.
+        formats: List[Dict[str, Any]] = [
+            {
+                "format_id": "sb0",
+                "vcodec": "none",
+                "acodec": "none",
+                "ext": "mhtml",
+                "protocol": "mhtml",
+                "url": self._url("storyboard.mhtml"),
+            },
+            {
+                "format_id": "139",
+                "vcodec": "none",
+                "acodec": "mp4a.40.5",
+                "abr": 48,
+                "ext": "m4a",
+                "protocol": "https",
+                "url": self._url(AUDIO_FILES["mp4a"]),
+            },
+            {
+                "format_id": "140",
+                "vcodec": "none",
+                "acodec": "mp4a.40.2",
+                "abr": 129,
+                "ext": "m4a",
+                "protocol": "https",
+                "url": self._url(AUDIO_FILES["mp4a"]),
+            },
+            {
+                "format_id": "251",
+                "vcodec": "none",
+                "acodec": "opus",
+                "abr": 160,
+                "ext": "webm",
+                "protocol": "https",
+                "url": self._url(AUDIO_FILES["opus"]),
+            },
+            {
+                "format_id": "18",
+                "vcodec": "avc1.42001E",
+                "acodec": "mp4a.40.2",
+                "height": 360,
+                "resolution": "640x360",
+                "ext": "mp4",
+                "protocol": "https",
+                "url": self._url("muxed_360p.mp4"),
+            },
+        ]
+        for height in VIDEO_HEIGHTS:
+            width = video_width(height)
+            formats.append(
+                {
+                    "format_id": f"hls-{height}",
+                    "vcodec": _VCODECS["avc1"],
+                    "acodec": "mp4a.40.2",
+                    "height": height,
+                    "resolution": f"{width}x{height}",
+                    "ext": "mp4",
+                    "protocol": "m3u8_native",
+                    "url": self._url(f"hls_{height}p.m3u8"),
+                }
+            )
+            for codec in VIDEO_CODECS:
+                formats.append(
+                    {
+                        "format_id": _VIDEO_ITAGS[codec][height],
+                        "vcodec": _VCODECS[codec],
+                        "acodec": "none",
+                        "height": height,
+                        "width": width,
+                        "resolution": f"{width}x{height}",
+                        "fps": 30,
+                        "tbr": height * 2,
+                        "ext": "mp4" if codec == "avc1" else "webm",
+                        "protocol": "https",
+                        "url": self._url(video_file_name(codec, height)),
+                    }
+                )
+        return formats
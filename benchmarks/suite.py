@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import NAMESPACE_URL, uuid5
+
+import httpx
+from fastapi import Header
+
+from benchmarks.history import BenchmarkDatabase, history_entries
+from benchmarks.stub_info import StubInfoProvider
+from yt_download_service.app.controllers import video_controller
+from yt_download_service.app.use_cases.history_service import HistoryService
+from yt_download_service.app.utils.async_utils import gather_or_cancel
+from yt_download_service.app.utils.dependencies import get_current_user_from_token
+from yt_download_service.domain.models.user import UserRead
+from yt_download_service.main import app
+
+logger = logging.getLogger(__name__)
+
+Result = Dict[str, Any]
+
+# Ranges cut by the sample benchmarks. The media must cover them, which
+# `benchmarks.run.MIN_DURATION` enforces.
+SAMPLE_RANGE = ("00:00:07", "00:00:22")
+SAMPLES_RANGES = [
+    ("00:00:05", "00:00:12"),
+    ("00:00:20", "00:00:31"),
+    ("00:00:40", "00:00:47"),
+]
+# The H.264 720p format, the one the samples are cut from.
+SAMPLE_FORMAT_ID = "136"
+HISTORY_PAGE_SIZE = 50
+HISTORY_EXPORT_BATCH_SIZE = 500
+HISTORY_WRITE_BATCH_SIZE = 50
+
+
+class _SkippedError(Exception):
+    """Raised by a benchmark that cannot run here."""
+
+
+def summarize(samples_ms: List[float], **extra: Any) -> Result:
+    """Summarize timings, in milliseconds."""
+    ordered = sorted(samples_ms)
+    return {
+        "unit": "ms",
+        "runs": len(ordered),
+        "min": round(ordered[0], 3),
+        "median": round(statistics.median(ordered), 3),
+        "mean": round(statistics.fmean(ordered), 3),
+        "p95": round(ordered[max(round(len(ordered) * 0.95) - 1, 0)], 3),
+        "max": round(ordered[-1], 3),
+        **extra,
+    }
+
+
+async def measure(
+    run: Callable[[], Awaitable[Any]], repeat: int, warmup: int
+) -> List[float]:
+    """Time `repeat` calls of `run`, after `warmup` untimed ones."""
+    for _ in range(warmup):
+        await run()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+class _DiscardingHistoryWriter:
+    """Drops history entries, which `history_write` measures on its own."""
+
+    def record(self, **entry: Any) -> None:
+        pass
+
+
+async def _benchmark_user(
+    x_benchmark_user: str = Header(default="0", alias="X-Benchmark-User"),
+) -> UserRead:
+    """Authenticate requests as the user their header names."""
+    now = datetime.now(timezone.utc)
+    return UserRead(
+        id=uuid5(NAMESPACE_URL, f"benchmark-user-{x_benchmark_user}"),
+        email=f"benchmark-{x_benchmark_user}@example.com",
+        first_name="Benchmark",
+        last_name=x_benchmark_user,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+class BenchmarkContext:
+    """What the benchmarks share: options, the stubbed service, the database."""
+
+    def __init__(
+        self,
+        options: argparse.Namespace,
+        provider: StubInfoProvider,
+        database: Optional[BenchmarkDatabase],
+    ) -> None:
+        self.options = options
+        self.provider = provider
+        self.database = database
+        self.video_service = video_controller.video_service
+        self.history_service = HistoryService()
+        self._video_ids = itertools.count()
+        provider.install(self.video_service)
+        app.dependency_overrides[get_current_user_from_token] = _benchmark_user
+        video_controller.history_writer = _DiscardingHistoryWriter()  # type: ignore[assignment]
+
+    def new_video_url(self) -> str:
+        """Return the URL of a video not extracted yet."""
+        return f"https://www.youtube.com/watch?v=bm{next(self._video_ids):09d}"
+
+    async def measure(self, run: Callable[[], Awaitable[Any]]) -> List[float]:
+        """Time `run` as many times as the options say."""
+        return await measure(run, self.options.repeat, self.options.warmup)
+
+
+async def bench_formats(context: BenchmarkContext) -> Result:
+    """Turn a cached info dict into the formats response."""
+    url = context.new_video_url()
+    iterations = context.options.iterations
+    get_formats = context.video_service._get_formats_sync
+    # Extracted once, so that only the processing is timed.
+    get_formats(url)
+
+    async def run() -> None:
+        for _ in range(iterations):
+            get_formats(url)
+
+    samples = await context.measure(run)
+    return summarize([sample / iterations for sample in samples], per="call")
+
+
+async def bench_full_download(context: BenchmarkContext) -> Result:
+    """Merge the best video and audio formats into an MP4."""
+    url = context.new_video_url()
+    sizes = []
+
+    async def run() -> None:
+        result = await context.video_service.download_full_video(url)
+        file_path = str(result.file_path)
+        sizes.append(os.path.getsize(file_path))
+        os.remove(file_path)
+
+    samples = await context.measure(run)
+    return summarize(samples, output_bytes=sizes[-1])
+
+
+async def bench_sample(context: BenchmarkContext) -> Result:
+    """Cut a sample out of the H.264 720p format."""
+    url = context.new_video_url()
+    sizes = []
+
+    async def run() -> None:
+        result = await context.video_service.download_optimal_sample(
+            url, *SAMPLE_RANGE, format_id=SAMPLE_FORMAT_ID
+        )
+        file_path = str(result.file_path)
+        sizes.append(os.path.getsize(file_path))
+        os.remove(file_path)
+
+    samples = await context.measure(run)
+    return summarize(samples, output_bytes=sizes[-1])
+
+
+async def bench_samples_zip(context: BenchmarkContext) -> Result:
+    """Cut several samples and stream them as a zip."""
+    url = context.new_video_url()
+    sizes = []
+
+    async def run() -> None:
+        stream, _ = await context.video_service.stream_samples(
+            url, SAMPLES_RANGES, format_id=SAMPLE_FORMAT_ID, output="zip"
+        )
+        size = 0
+        async for chunk in stream:
+            size += len(chunk)
+        sizes.append(size)
+
+    samples = await context.measure(run)
+    return summarize(samples, output_bytes=sizes[-1])
+
+
+async def _throughput(
+    context: BenchmarkContext,
+    path: str,
+    payload: Callable[[int], Dict[str, Any]],
+) -> Result:
+    """
+    Send concurrent requests to the application, in process.
+
+    Requests come from as many users as run at once, so that per-user
+    limits do not queue them. Returns their latencies and the throughput.
+    """
+    concurrency = context.options.concurrency
+    count = context.options.requests
+    latencies: List[float] = []
+    throughputs: List[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None
+    ) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(index: int) -> float:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    path,
+                    json=payload(index),
+                    headers={"X-Benchmark-User": str(index % concurrency)},
+                )
+                if response.is_error:
+                    raise RuntimeError(
+                        f"{path} answered {response.status_code}: {response.text}"
+                    )
+                return (time.perf_counter() - started) * 1000
+
+        for run in range(context.options.warmup + context.options.repeat):
+            started = time.perf_counter()
+            run_latencies = await gather_or_cancel(*(send(i) for i in range(count)))
+            elapsed = time.perf_counter() - started
+            if run >= context.options.warmup:
+                latencies.extend(run_latencies)
+                throughputs.append(count / elapsed)
+
+    return summarize(
+        latencies,
+        per="request",
+        concurrency=concurrency,
+        requests_per_run=count,
+        requests_per_second=round(statistics.median(throughputs), 2),
+    )
+
+
+async def bench_throughput_formats(context: BenchmarkContext) -> Result:
+    """Get the formats of videos never seen, each a (stubbed) extraction."""
+    return await _throughput(
+        context,
+        "/api/video/formats",
+        lambda index: {"url": context.new_video_url()},
+    )
+
+
+async def bench_throughput_samples(context: BenchmarkContext) -> Result:
+    """Download samples of a video, its info already cached."""
+    url = context.new_video_url()
+    return await _throughput(
+        context,
+        "/api/video/download/sample",
+        lambda index: {
+            "url": url,
+            "format_id": SAMPLE_FORMAT_ID,
+            "start_time": SAMPLE_RANGE[0],
+            "end_time": SAMPLE_RANGE[1],
+        },
+    )
+
+
+def _require_database(context: BenchmarkContext) -> BenchmarkDatabase:
+    if context.database is None:
+        raise _SkippedError("no database, pass --db-url or set BENCH_DB_URL")
+    return context.database
+
+
+async def bench_history_first_page(context: BenchmarkContext) -> Result:
+    """Read the most recent page of a heavy user's history."""
+    database = _require_database(context)
+
+    async def run() -> None:
+        async with database.sessions() as db:
+            page, _ = await context.history_service.get_history_page(
+                db, database.user_id, limit=HISTORY_PAGE_SIZE
+            )
+        # Errors are logged and give an empty page, which must not pass.
+        if len(page) != HISTORY_PAGE_SIZE:
+            raise RuntimeError(f"Got {len(page)} history entries.")
+
+    return summarize(await context.measure(run))
+
+
+async def bench_history_deep_page(context: BenchmarkContext) -> Result:
+    """Read a page near the end of a heavy user's history."""
+    database = _require_database(context)
+    offset = context.options.history_rows - 2 * HISTORY_PAGE_SIZE
+    cursor = await database.cursor_at(offset)
+
+    async def run() -> None:
+        async with database.sessions() as db:
+            page, _ = await context.history_service.get_history_page(
+                db, database.user_id, limit=HISTORY_PAGE_SIZE, cursor=cursor
+            )
+        if len(page) != HISTORY_PAGE_SIZE:
+            raise RuntimeError(f"Got {len(page)} history entries.")
+
+    return summarize(await context.measure(run), offset=offset)
+
+
+async def bench_history_stats(context: BenchmarkContext) -> Result:
+    """Aggregate the statistics of a heavy user."""
+    database = _require_database(context)
+
+    async def run() -> None:
+        async with database.sessions() as db:
+            await context.history_service.get_history_stats(
+                db, database.user_id, days=30, top=10
+            )
+
+    return summarize(await context.measure(run))
+
+
+async def bench_history_export(context: BenchmarkContext) -> Result:
+    """Read the whole history of a heavy user, as exports do."""
+    database = _require_database(context)
+
+    async def run() -> None:
+        rows = 0
+        async with database.sessions() as db:
+            async for batch in context.history_service.stream_history(
+                db, database.user_id, batch_size=HISTORY_EXPORT_BATCH_SIZE
+            ):
+                rows += len(batch)
+        if rows < context.options.history_rows:
+            raise RuntimeError(f"Exported {rows} history entries.")
+
+    return summarize(await context.measure(run), rows=context.options.history_rows)
+
+
+async def bench_history_write(context: BenchmarkContext) -> Result:
+    """Write a batch of entries, as the history writer flushes them."""
+    database = _require_database(context)
+    entries = history_entries(database.user_id, HISTORY_WRITE_BATCH_SIZE)
+
+    async def run() -> None:
+        async with database.sessions() as db:
+            await context.history_service.create_history_entries(db, entries)
+
+    return summarize(await context.measure(run), entries=len(entries))
+
+
+# In the order they run.
+BENCHMARKS: Dict[str, Callable[[BenchmarkContext], Awaitable[Result]]] = {
+    "formats": bench_formats,
+    "full_download": bench_full_download,
+    "sample": bench_sample,
+    "samples_zip": bench_samples_zip,
+    "throughput_formats": bench_throughput_formats,
+    "throughput_samples": bench_throughput_samples,
+    "history_first_page": bench_history_first_page,
+    "history_deep_page": bench_history_deep_page,
+    "history_stats": bench_history_stats,
+    "history_export": bench_history_export,
+    "history_write": bench_history_write,
+}
+
+
+async def run_benchmarks(
+    options: argparse.Namespace, base_url: str, names: List[str]
+) -> Dict[str, Result]:
+    """
+    Run the named benchmarks, against media served from `base_url`.
+
+    A benchmark that fails is reported with its error, and the others
+    still run.
+    """
+    provider = StubInfoProvider(
+        base_url, options.duration, delay=options.extraction_delay
+    )
+    database = None
+    if options.db_url and any(name.startswith("history_") for name in names):
+        database = BenchmarkDatabase(options.db_url)
+    context = BenchmarkContext(options, provider, database)
+
+    results: Dict[str, Result] = {}
+    try:
+        if database is not None:
+            print("Seeding the history...", flush=True)
+            await database.create()
+            await database.seed(options.history_rows)
+        for name in [name for name in BENCHMARKS if name in names]:
+            print(f"{name}...", flush=True)
+            try:
+                results[name] = await BENCHMARKS[name](context)
+            except _SkippedError as e:
+                results[name] = {"skipped": str(e)}
+            except Exception as e:
+                logger.exception("Benchmark %s failed", name)
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        context.video_service.close()
+        if database is not None:
+            await database.drop()
+    return results
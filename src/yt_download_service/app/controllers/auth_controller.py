@@ -1,18 +1,29 @@
-import httpx
+from typing import TYPE_CHECKING
+
 from fastapi import APIRouter, HTTPException, Request, status
 from fastapi.params import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+
 from yt_download_service.app.use_cases.auth_service import AuthService
 from yt_download_service.app.utils.dependencies import (
     get_auth_service,
     get_current_user_from_token,
 )
-from yt_download_service.app.utils.google_sso import oauth
 from yt_download_service.app.utils.jwt_handler import TokenResponse, create_access_token
+from yt_download_service.app.utils.lazy_import import lazy_import
 from yt_download_service.domain.models.auth import GoogleToken
 from yt_download_service.domain.models.user import UserRead
 from yt_download_service.infrastructure.database.session import get_db_session
 
+if TYPE_CHECKING:
+    import httpx
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from yt_download_service.app.utils import google_sso
+else:
+    httpx = lazy_import("httpx")
+    # Imports authlib and registers the Google client.
+    google_sso = lazy_import("yt_download_service.app.utils.google_sso")
+
 router = APIRouter()
 
 
@@ -20,18 +31,18 @@ router = APIRouter()
 async def login_google(request: Request):
     """Redirect to Google for authentication."""
     redirect_uri = request.url_for("auth_google")
-    return await oauth.google.authorize_redirect(request, redirect_uri)
+    return await google_sso.oauth.google.authorize_redirect(request, redirect_uri)
 
 
 @router.get("/google/callback", response_model=TokenResponse)
 async def auth_google(
     request: Request,
-    db: AsyncSession = Depends(get_db_session),
+    db: "AsyncSession" = Depends(get_db_session),
     auth_service: AuthService = Depends(get_auth_service),
 ):
     """Process Google callback, authenticate user, and return a JWT access token."""
     try:
-        token = await oauth.google.authorize_access_token(request)
+        token = await google_sso.oauth.google.authorize_access_token(request)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -59,7 +70,7 @@ async def auth_google(
 @router.post("/login/google/token", response_model=TokenResponse)
 async def login_google_token(
     google_token: GoogleToken,
-    db: AsyncSession = Depends(get_db_session),
+    db: "AsyncSession" = Depends(get_db_session),
     # INJECT THE SERVICE: FastAPI will call get_auth_service() for you
     auth_service: AuthService = Depends(get_auth_service),
 ):
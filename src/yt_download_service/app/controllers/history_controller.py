@@ -1,39 +1,175 @@
+import csv
+import io
+import logging
+from typing import TYPE_CHECKING, AsyncIterator, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from yt_download_service.app.use_cases.history_service import HistoryService
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from yt_download_service.app.use_cases.history_service import (
+    HISTORY_LIST_ADAPTER,
+    HistoryService,
+)
 from yt_download_service.app.utils.dependencies import (
     get_current_user_from_token,
     get_db_session,
 )
-from yt_download_service.domain.models.history import History
+from yt_download_service.app.utils.serialization import serialized_response
+from yt_download_service.app.utils.tracing import span
+from yt_download_service.domain.models.history import History, HistoryStats
 from yt_download_service.domain.models.user import UserRead
+from yt_download_service.infrastructure.database.session import (
+    get_session_factory,
+)
+from yt_download_service.settings import get_settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 history_service = HistoryService()
 
+HISTORY_PAGE_SIZE = get_settings().history_page_size
+HISTORY_MAX_PAGE_SIZE = get_settings().history_max_page_size
+HISTORY_EXPORT_BATCH_SIZE = get_settings().history_export_batch_size
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+ExportFormat = Literal["ndjson", "csv"]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 
 @router.get(
     "/",
     response_model=list[History],
     summary="Get User Download History",
-    description="Retrieves the download history for the currently authenticated user.",
+    description=(
+        "Retrieves a page of the download history for the currently "
+        "authenticated user, most recent first. When more entries follow, "
+        f"the `{NEXT_CURSOR_HEADER}` response header holds the `cursor` of "
+        "the next page. Sent as MessagePack when the client accepts "
+        "`application/msgpack` and the server is installed with the "
+        "`msgpack` extra (`poetry install -E msgpack`), JSON otherwise."
+    ),
 )
 async def get_user_history(
-    db: AsyncSession = Depends(get_db_session),
+    request: Request,
+    limit: int = Query(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: str | None = Query(default=None),
+    db: "AsyncSession" = Depends(get_db_session),
     current_user: UserRead = Depends(get_current_user_from_token),
 ):
     """
-    Get the history for the logged-in user.
+    Get a page of the history for the logged-in user.
 
     The user ID is taken from the authentication token, ensuring users
     can only access their own history.
     """
-    history_records = await history_service.get_history_by_user_id(
-        db, user_id=current_user.id
+    try:
+        history_records, next_cursor = await history_service.get_history_page(
+            db, user_id=current_user.id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor is not None else {}
+    return serialized_response(
+        request, HISTORY_LIST_ADAPTER, history_records, headers=headers
+    )
+
+
+@router.get(
+    "/stats",
+    response_model=HistoryStats,
+    summary="Get User Download Statistics",
+    description=(
+        "Retrieves aggregates of the download history for the currently "
+        "authenticated user: totals, downloads per day over the last `days` "
+        "days, and the most downloaded videos and resolutions."
+    ),
+)
+async def get_user_history_stats(
+    days: int = Query(default=30, ge=1, le=366),
+    top: int = Query(default=10, ge=1, le=100),
+    db: "AsyncSession" = Depends(get_db_session),
+    current_user: UserRead = Depends(get_current_user_from_token),
+):
+    """
+    Get statistics of the history for the logged-in user.
+
+    The user ID is taken from the authentication token, ensuring users
+    can only access their own statistics.
+    """
+    return await history_service.get_history_stats(
+        db, user_id=current_user.id, days=days, top=top
+    )
+
+
+async def _export_history(
+    user_id: UUID, export_format: ExportFormat
+) -> AsyncIterator[bytes]:
+    """
+    Yield the history of a user, serialized, one chunk per batch of rows.
+
+    Uses its own session, since the stream outlives the request handler.
+    """
+    columns = list(History.model_fields)
+    export_span = span("history_export", format=export_format)
+    rows = 0
+    error = None
+    try:
+        if export_format == "csv":
+            yield (",".join(columns) + "\r\n").encode("utf-8")
+        async with get_session_factory()() as db:
+            async for batch in history_service.stream_history(
+                db, user_id, batch_size=HISTORY_EXPORT_BATCH_SIZE
+            ):
+                if export_format == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    for entry in batch:
+                        writer.writerow(entry.model_dump(mode="json").values())
+                    chunk = buffer.getvalue()
+                else:
+                    chunk = "".join(entry.model_dump_json() + "\n" for entry in batch)
+                rows += len(batch)
+                yield chunk.encode("utf-8")
+    except Exception as e:
+        # The response has started, the export can only be cut short.
+        logger.exception("Error exporting history for user %s", user_id)
+        error = e
+        raise
+    finally:
+        export_span.set(rows=rows)
+        export_span.finish(error)
+
+
+@router.get(
+    "/export",
+    summary="Export User Download History",
+    description=(
+        "Streams the whole download history of the currently authenticated "
+        "user, most recent first, as NDJSON (one entry per line) or CSV."
+    ),
+)
+async def export_user_history(
+    export_format: ExportFormat = Query(default="ndjson", alias="format"),
+    current_user: UserRead = Depends(get_current_user_from_token),
+):
+    """
+    Export the history of the logged-in user.
+
+    The user ID is taken from the authentication token, ensuring users
+    can only export their own history.
+    """
+    return StreamingResponse(
+        _export_history(current_user.id, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="history.{export_format}"'
+        },
     )
-    return history_records
 
 
 @router.delete(
@@ -42,7 +178,7 @@ async def get_user_history(
     description="Clears the download history for the currently authenticated user.",
 )
 async def clear_user_history(
-    db: AsyncSession = Depends(get_db_session),
+    db: "AsyncSession" = Depends(get_db_session),
     current_user: UserRead = Depends(get_current_user_from_token),
 ):
     """
@@ -68,7 +204,7 @@ async def clear_user_history(
 )
 async def delete_user_history_entry(
     history_id: UUID,
-    db: AsyncSession = Depends(get_db_session),
+    db: "AsyncSession" = Depends(get_db_session),
     current_user: UserRead = Depends(get_current_user_from_token),
 ):
     """
@@ -1,29 +1,72 @@
+import json
 import os
+from typing import TYPE_CHECKING, AsyncIterator, cast
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Request,
+    status,
+)
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import TypeAdapter
 
-import yt_dlp
-from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException
-from fastapi.responses import FileResponse
-from sqlalchemy.ext.asyncio import AsyncSession
 from yt_download_service.app.domain.schemas import (
+    DownloadJobRequest,
+    DownloadJobStatus,
     DownloadRequest,
+    DownloadResult,
     DownloadSampleRequest,
+    DownloadSamplesRequest,
+    FormatsBatchRequest,
+    FormatsBatchResponse,
     FormatsResponse,
     VideoURL,
 )
 from yt_download_service.app.use_cases.history_service import HistoryService
-from yt_download_service.app.use_cases.video_service import VideoService
+from yt_download_service.app.use_cases.history_writer import HistoryWriter
+from yt_download_service.app.use_cases.job_service import (
+    JobNotFoundError,
+    JobNotReadyError,
+    JobService,
+)
+from yt_download_service.app.use_cases.video_service import (
+    MAX_SAMPLE_DURATION_SECONDS,
+    VideoService,
+)
 from yt_download_service.app.utils.dependencies import get_current_user_from_token
+from yt_download_service.app.utils.ffmpeg_runner import FFmpegError
 from yt_download_service.app.utils.file_utils import sanitize_filename
+from yt_download_service.app.utils.lazy_import import lazy_import
+from yt_download_service.app.utils.progress import ProgressBroker, ProgressReporter
+from yt_download_service.app.utils.request_utils import cancel_on_disconnect
+from yt_download_service.app.utils.scheduler import SchedulerFullError
+from yt_download_service.app.utils.serialization import serialized_response
 from yt_download_service.domain.models.user import UserRead
-from yt_download_service.infrastructure.database.session import get_db_session
+from yt_download_service.settings import format_duration_limit
+
+if TYPE_CHECKING:
+    import yt_dlp
+else:
+    yt_dlp = lazy_import("yt_dlp")
 
 router = APIRouter()
 video_service = VideoService()
 history_service_instance = HistoryService()
+history_writer = HistoryWriter(history_service_instance)
+progress_broker = ProgressBroker()
+job_service = JobService(video_service, history_writer, progress_broker)
+
+FORMATS_ADAPTER = TypeAdapter(FormatsResponse)
+FORMATS_BATCH_ADAPTER = TypeAdapter(FormatsBatchResponse)
 
 
 @router.post("/formats", response_model=FormatsResponse)
 async def get_formats(
+    request: Request,
     video_url: VideoURL,
     current_user: UserRead = Depends(get_current_user_from_token),
     x_youtube_cookies: str | None = Header(default=None, alias="X-Youtube-Cookies"),
@@ -31,55 +74,106 @@ async def get_formats(
     """Endpoint to get processed and user-friendly video formats."""
     try:
         formats = await video_service.get_video_formats(
-            video_url.url, encoded_cookies=x_youtube_cookies
+            video_url.url,
+            encoded_cookies=x_youtube_cookies,
+            user_id=str(current_user.id),
+        )
+        return serialized_response(request, FORMATS_ADAPTER, formats)
+    except SchedulerFullError as e:
+        raise _too_many_requests(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/formats/batch", response_model=FormatsBatchResponse)
+async def get_formats_batch(
+    request: Request,
+    batch: FormatsBatchRequest,
+    current_user: UserRead = Depends(get_current_user_from_token),
+    x_youtube_cookies: str | None = Header(default=None, alias="X-Youtube-Cookies"),
+):
+    """
+    Get the formats of several videos in one request.
+
+    Every URL gets either its formats or an error, the batch itself only
+    fails if the request is invalid.
+    """
+    try:
+        results = await video_service.get_video_formats_batch(
+            batch.urls,
+            encoded_cookies=x_youtube_cookies,
+            user_id=str(current_user.id),
         )
-        return formats
     except ValueError as e:
+        # Undecodable cookies fail the whole batch.
         raise HTTPException(status_code=400, detail=str(e))
+    return serialized_response(
+        request, FORMATS_BATCH_ADAPTER, FormatsBatchResponse(results=results)
+    )
 
 
 @router.post("/download")
 async def download_full_video(
     request: DownloadRequest,
+    http_request: Request,
     background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db_session),
     current_user: UserRead = Depends(get_current_user_from_token),
     x_youtube_cookies: str | None = Header(default=None, alias="X-Youtube-Cookies"),
+    x_progress_id: str | None = Header(default=None, alias="X-Progress-Id"),
 ):
-    """Download a short video and returns it as a file attachment."""
+    """
+    Download a short video and returns it as a file attachment.
+
+    With an `X-Progress-Id` header, progress can be followed on
+    `/progress/{progress_id}`.
+    """
+    progress = progress_broker.open(x_progress_id, str(current_user.id))
+    if request.stream:
+        return await _stream_full_video(
+            request, http_request, current_user, x_youtube_cookies, progress
+        )
     try:
         # 1. Download the video. The service now returns the path and metadata.
-        (
-            file_path,
-            video_title,
-            final_format_id,
-            resolution,
-        ) = await video_service.download_full_video(
-            request.url, request.format_id, encoded_cookies=x_youtube_cookies
-        )
-
-        # 2. Add the history-saving task to the background
-        background_tasks.add_task(
-            history_service_instance.create_history_entry,
-            db,
+        result: DownloadResult = await cancel_on_disconnect(
+            http_request,
+            progress.track(
+                video_service.download_full_video(
+                    request.url,
+                    request.format_id,
+                    encoded_cookies=x_youtube_cookies,
+                    user_id=str(current_user.id),
+                    progress=progress,
+                )
+            ),
+        )
+
+        # 2. Queue the history entry, written in the background
+        history_writer.record(
             user_id=current_user.id,
             video_url=request.url,
-            video_title=video_title,
-            format_id=final_format_id,
-            resolution=resolution,
+            video_title=result.video_title,
+            format_id=result.final_format_id,
+            resolution=result.resolution,
         )
 
         # 3. Background task to delete the temporary file after sending.
-        background_tasks.add_task(os.remove, file_path)
+        background_tasks.add_task(os.remove, result.file_path)
 
         # 4. Return the file using FileResponse for efficient streaming.
-        safe_filename = sanitize_filename(video_title)
+        safe_filename = sanitize_filename(result.video_title)
         # The filename in the Content-Disposition header is a suggestion to the browser.
         return FileResponse(
-            path=file_path,
+            path=cast(str, result.file_path),
             media_type="application/octet-stream",  # A generic binary type is safest
             filename=f"{safe_filename}.mp4",
+            headers=_processing_headers(result),
         )
+    except HTTPException:
+        raise
+    except SchedulerFullError as e:
+        raise _too_many_requests(e)
+    except FFmpegError as e:
+        raise _processing_failed(e)
     except (ValueError, yt_dlp.utils.DownloadError) as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -89,65 +183,420 @@ async def download_full_video(
 @router.post("/download/sample")
 async def download_optimal_video_sample(
     request: DownloadSampleRequest,
+    http_request: Request,
     background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db_session),
     current_user: UserRead = Depends(get_current_user_from_token),
     x_youtube_cookies: str | None = Header(default=None, alias="X-Youtube-Cookies"),
+    x_progress_id: str | None = Header(default=None, alias="X-Progress-Id"),
 ):
-    """Download a specific time-range."""
-    start_seconds = video_service._time_str_to_seconds(request.start_time)
-    end_seconds = video_service._time_str_to_seconds(request.end_time)
+    """
+    Download a specific time-range.
 
-    if end_seconds - start_seconds > 180:  # Limit to 3 minutes
-        raise HTTPException(
-            status_code=400,
-            detail="The sample duration cannot exceed 3 minutes.",
-        )
-
-    if start_seconds >= end_seconds:
-        raise HTTPException(
-            status_code=400,
-            detail="Start time must be less than end time.",
+    With an `X-Progress-Id` header, progress can be followed on
+    `/progress/{progress_id}`.
+    """
+    _check_sample_range(request.start_time, request.end_time)
+    progress = progress_broker.open(x_progress_id, str(current_user.id))
+    if request.stream:
+        return await _stream_sample(
+            request, http_request, current_user, x_youtube_cookies, progress
         )
     try:
         # 1. Call the updated optimal download service method
-        (
-            file_path,
-            video_title,
-            final_format_id,
-            resolution,
-        ) = await video_service.download_optimal_sample(
-            url=request.url,
-            format_id=request.format_id,
-            start_time=request.start_time,
-            end_time=request.end_time,
-            encoded_cookies=x_youtube_cookies,
+        result = await cancel_on_disconnect(
+            http_request,
+            progress.track(
+                video_service.download_optimal_sample(
+                    url=request.url,
+                    format_id=request.format_id,
+                    start_time=request.start_time,
+                    end_time=request.end_time,
+                    encoded_cookies=x_youtube_cookies,
+                    user_id=str(current_user.id),
+                    progress=progress,
+                )
+            ),
         )
 
-        # 2. Background task for history logging
-        background_tasks.add_task(
-            history_service_instance.create_history_entry,
-            db,
+        # 2. Queue the history entry, written in the background
+        history_writer.record(
             user_id=current_user.id,
             video_url=request.url,
-            video_title=video_title,
-            format_id=final_format_id,
-            resolution=resolution,
+            video_title=result.video_title,
+            format_id=result.final_format_id,
+            resolution=result.resolution,
             start_time_str=request.start_time,
             end_time_str=request.end_time,
         )
 
         # 3. Add background task to delete the temporary file
-        background_tasks.add_task(os.remove, file_path)
+        background_tasks.add_task(os.remove, result.file_path)
 
         # 4. Return the file using FileResponse
-        safe_filename = f"{sanitize_filename(video_title)}_sample.mp4"
+        safe_filename = f"{sanitize_filename(result.video_title)}_sample.mp4"
         return FileResponse(
-            path=file_path,
+            path=cast(str, result.file_path),
             media_type="application/octet-stream",
             filename=safe_filename,
+            headers=_processing_headers(result),
         )
+    except HTTPException:
+        raise
+    except SchedulerFullError as e:
+        raise _too_many_requests(e)
+    except FFmpegError as e:
+        raise _processing_failed(e)
     except (ValueError, yt_dlp.utils.DownloadError) as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+
+
+@router.post("/download/samples")
+async def download_video_samples(
+    request: DownloadSamplesRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: UserRead = Depends(get_current_user_from_token),
+    x_youtube_cookies: str | None = Header(default=None, alias="X-Youtube-Cookies"),
+    x_progress_id: str | None = Header(default=None, alias="X-Progress-Id"),
+):
+    """
+    Download several time-ranges of the same video in one request.
+
+    The samples are streamed as a zip, or joined into a single MP4. A
+    single range is served exactly like `/download/sample`.
+    """
+    if len(request.ranges) == 1:
+        return await download_optimal_video_sample(
+            DownloadSampleRequest(
+                url=request.url,
+                format_id=request.format_id,
+                stream=request.stream,
+                start_time=request.ranges[0].start_time,
+                end_time=request.ranges[0].end_time,
+            ),
+            http_request,
+            background_tasks,
+            current_user,
+            x_youtube_cookies,
+            x_progress_id,
+        )
+
+    for sample_range in request.ranges:
+        _check_sample_range(sample_range.start_time, sample_range.end_time)
+
+    progress = progress_broker.open(x_progress_id, str(current_user.id))
+    try:
+        stream, result = await cancel_on_disconnect(
+            http_request,
+            progress.track(
+                video_service.stream_samples(
+                    request.url,
+                    [(r.start_time, r.end_time) for r in request.ranges],
+                    format_id=request.format_id,
+                    output=request.output,
+                    encoded_cookies=x_youtube_cookies,
+                    user_id=str(current_user.id),
+                    progress=progress,
+                ),
+                finish=False,
+            ),
+        )
+    except HTTPException:
+        raise
+    except SchedulerFullError as e:
+        raise _too_many_requests(e)
+    except FFmpegError as e:
+        raise _processing_failed(e)
+    except (ValueError, yt_dlp.utils.DownloadError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+
+    for sample_range in request.ranges:
+        history_writer.record(
+            user_id=current_user.id,
+            video_url=request.url,
+            video_title=result.video_title,
+            format_id=result.final_format_id,
+            resolution=result.resolution,
+            start_time_str=sample_range.start_time,
+            end_time_str=sample_range.end_time,
+        )
+    safe_filename = f"{sanitize_filename(result.video_title)}_samples"
+    if request.output == "zip":
+        return _attachment_response(
+            stream, f"{safe_filename}.zip", result, media_type="application/zip"
+        )
+    return _attachment_response(stream, f"{safe_filename}.mp4", result)
+
+
+@router.get("/progress/{progress_id}")
+async def follow_download_progress(
+    progress_id: str,
+    current_user: UserRead = Depends(get_current_user_from_token),
+):
+    """
+    Follow the progress of a download as Server-Sent Events.
+
+    `progress_id` is the `X-Progress-Id` sent with a download, or a job ID.
+    Subscribing may happen before the download starts. The stream ends
+    once the download is done or failed. Each user has their own IDs, so
+    another user's download under the same ID is never followed.
+    """
+    try:
+        subscription = progress_broker.subscribe(progress_id, str(current_user.id))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events() -> AsyncIterator[str]:
+        async for event in subscription:
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must not buffer the events.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/jobs",
+    response_model=DownloadJobStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_download_job(
+    request: DownloadJobRequest,
+    current_user: UserRead = Depends(get_current_user_from_token),
+    x_youtube_cookies: str | None = Header(default=None, alias="X-Youtube-Cookies"),
+):
+    """
+    Start a download in the background and return its job.
+
+    Poll the job until it succeeds, then fetch its file from
+    `/jobs/{job_id}/result`. Set both start and end times for a sample.
+    """
+    try:
+        return job_service.submit(
+            request, current_user.id, encoded_cookies=x_youtube_cookies
+        )
+    except SchedulerFullError as e:
+        raise _too_many_requests(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/jobs/{job_id}", response_model=DownloadJobStatus)
+async def get_download_job(
+    job_id: str,
+    current_user: UserRead = Depends(get_current_user_from_token),
+):
+    """Get the status of a download job."""
+    try:
+        return job_service.get_status(job_id, current_user.id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_download_job_result(
+    job_id: str,
+    current_user: UserRead = Depends(get_current_user_from_token),
+):
+    """Fetch the file of a succeeded job. It can be fetched until the job expires."""
+    try:
+        job = job_service.get(job_id, current_user.id)
+        result = job_service.get_result(job_id, current_user.id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except JobNotReadyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    suffix = "_sample" if job.is_sample else ""
+    return FileResponse(
+        path=cast(str, result.file_path),
+        media_type="application/octet-stream",
+        filename=f"{sanitize_filename(result.video_title)}{suffix}.mp4",
+        headers=_processing_headers(result),
+    )
+
+
+@router.delete("/jobs/{job_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_download_job(
+    job_id: str,
+    current_user: UserRead = Depends(get_current_user_from_token),
+):
+    """Cancel a download job, or discard its file if it already finished."""
+    try:
+        job_service.get(job_id, current_user.id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    job_service.discard(job_id)
+    return None
+
+
+def _too_many_requests(error: SchedulerFullError) -> HTTPException:
+    """Turn a full scheduler queue into a 429 telling when to retry."""
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+def _check_sample_range(start_time: str, end_time: str) -> None:
+    """Reject a time range that is empty, reversed or too long."""
+    start_seconds = video_service._time_str_to_seconds(start_time)
+    end_seconds = video_service._time_str_to_seconds(end_time)
+
+    if end_seconds - start_seconds > MAX_SAMPLE_DURATION_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail="The sample duration cannot exceed "
+            f"{format_duration_limit(MAX_SAMPLE_DURATION_SECONDS)}.",
+        )
+
+    if start_seconds >= end_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail="Start time must be less than end time.",
+        )
+
+
+def _processing_failed(error: FFmpegError) -> HTTPException:
+    """Answer a failed ffmpeg run, which usually means the media URL failed."""
+    return HTTPException(status_code=502, detail=str(error))
+
+
+def _processing_headers(result: DownloadResult) -> dict[str, str]:
+    """Tell the client how each track was processed, and if it was cached."""
+    return {
+        "X-Video-Processing": result.video_processing,
+        "X-Audio-Processing": result.audio_processing,
+        "X-Cache": "HIT" if result.from_cache else "MISS",
+    }
+
+
+def _attachment_response(
+    stream: AsyncIterator[bytes],
+    filename: str,
+    result: DownloadResult,
+    media_type: str = "application/octet-stream",
+):
+    """Wrap an ffmpeg output stream in a chunked attachment response."""
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            **_processing_headers(result),
+        },
+    )
+
+
+async def _stream_full_video(
+    request: DownloadRequest,
+    http_request: Request,
+    current_user: UserRead,
+    x_youtube_cookies: str | None,
+    progress: ProgressReporter,
+):
+    """
+    Stream a full video to the client while ffmpeg produces it.
+
+    The setup, up to ffmpeg's first chunk, is cancelled if the client
+    disconnects meanwhile.
+    """
+    try:
+        stream, result = await cancel_on_disconnect(
+            http_request,
+            progress.track(
+                video_service.stream_full_video(
+                    request.url,
+                    request.format_id,
+                    encoded_cookies=x_youtube_cookies,
+                    user_id=str(current_user.id),
+                    progress=progress,
+                ),
+                finish=False,
+            ),
+        )
+    except HTTPException:
+        raise
+    except SchedulerFullError as e:
+        raise _too_many_requests(e)
+    except FFmpegError as e:
+        raise _processing_failed(e)
+    except (ValueError, yt_dlp.utils.DownloadError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+
+    history_writer.record(
+        user_id=current_user.id,
+        video_url=request.url,
+        video_title=result.video_title,
+        format_id=result.final_format_id,
+        resolution=result.resolution,
+    )
+    return _attachment_response(
+        stream, f"{sanitize_filename(result.video_title)}.mp4", result
+    )
+
+
+async def _stream_sample(
+    request: DownloadSampleRequest,
+    http_request: Request,
+    current_user: UserRead,
+    x_youtube_cookies: str | None,
+    progress: ProgressReporter,
+):
+    """
+    Stream a video sample to the client while ffmpeg produces it.
+
+    The setup, including the encoding of the edges, is cancelled if the
+    client disconnects meanwhile.
+    """
+    try:
+        stream, result = await cancel_on_disconnect(
+            http_request,
+            progress.track(
+                video_service.stream_sample(
+                    url=request.url,
+                    format_id=request.format_id,
+                    start_time=request.start_time,
+                    end_time=request.end_time,
+                    encoded_cookies=x_youtube_cookies,
+                    user_id=str(current_user.id),
+                    progress=progress,
+                ),
+                finish=False,
+            ),
+        )
+    except HTTPException:
+        raise
+    except SchedulerFullError as e:
+        raise _too_many_requests(e)
+    except FFmpegError as e:
+        raise _processing_failed(e)
+    except (ValueError, yt_dlp.utils.DownloadError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+
+    history_writer.record(
+        user_id=current_user.id,
+        video_url=request.url,
+        video_title=result.video_title,
+        format_id=result.final_format_id,
+        resolution=result.resolution,
+        start_time_str=request.start_time,
+        end_time_str=request.end_time,
+    )
+    return _attachment_response(
+        stream, f"{sanitize_filename(result.video_title)}_sample.mp4", result
+    )
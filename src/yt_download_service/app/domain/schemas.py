@@ -1,8 +1,14 @@
-from io import BytesIO
-from typing import Annotated, List, Optional
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
+from yt_download_service.app.utils.ffmpeg_utils import ProcessingMode
+
+# Time in a video, HH:MM:SS. Checked here so a malformed time is a 422
+# rather than an error half-way through a request.
+TIME_PATTERN = r"^\d{1,2}:[0-5]\d:[0-5]\d$"
+
 
 class VideoURL(BaseModel):
     """Pydantic model for validating a YouTube video URL."""
@@ -26,19 +32,77 @@ class DownloadRequest(BaseModel):
 
     url: str
     format_id: Optional[str] = None
+    stream: Annotated[
+        bool,
+        Field(
+            description=(
+                "Stream the MP4 to the client while it is being produced, "
+                "instead of sending it once the file is complete."
+            )
+        ),
+    ] = False
 
 
 class DownloadSampleRequest(DownloadRequest):
     """Schema for downloading a video sample."""
 
     start_time: Annotated[
-        str, Field(description="Start time in HH:MM:SS", examples=["00:01:10"])
+        str,
+        Field(
+            description="Start time in HH:MM:SS",
+            pattern=TIME_PATTERN,
+            examples=["00:01:10"],
+        ),
+    ]
+    end_time: Annotated[
+        str,
+        Field(
+            description="End time in HH:MM:SS",
+            pattern=TIME_PATTERN,
+            examples=["00:01:25"],
+        ),
+    ]
+
+
+class SampleRange(BaseModel):
+    """A time-range of a video."""
+
+    start_time: Annotated[
+        str,
+        Field(
+            description="Start time in HH:MM:SS",
+            pattern=TIME_PATTERN,
+            examples=["00:01:10"],
+        ),
     ]
     end_time: Annotated[
-        str, Field(description="End time in HH:MM:SS", examples=["00:01:25"])
+        str,
+        Field(
+            description="End time in HH:MM:SS",
+            pattern=TIME_PATTERN,
+            examples=["00:01:25"],
+        ),
     ]
 
 
+SamplesOutput = Literal["zip", "concat"]
+
+
+class DownloadSamplesRequest(DownloadRequest):
+    """Schema for downloading several samples of the same video."""
+
+    ranges: Annotated[List[SampleRange], Field(min_length=1, max_length=20)]
+    output: Annotated[
+        SamplesOutput,
+        Field(
+            description=(
+                "Send the samples as a zip of one MP4 per range, or joined "
+                "into a single MP4."
+            )
+        ),
+    ] = "zip"
+
+
 # Formats models
 class ResolutionOption(BaseModel):
     """Model for a video resolution option."""
@@ -66,17 +130,86 @@ class FormatsResponse(BaseModel):
     audio_only: List[AudioOption]
 
 
+class FormatsBatchRequest(BaseModel):
+    """Request model for the formats of several videos at once."""
+
+    urls: Annotated[List[str], Field(min_length=1, max_length=50)]
+
+
+class FormatsBatchItem(BaseModel):
+    """Formats of one video of a batch, or why they could not be fetched."""
+
+    url: str
+    formats: Optional[FormatsResponse] = None
+    error: Optional[str] = None
+
+
+class FormatsBatchResponse(BaseModel):
+    """Response model for a batch of formats, in the order of the request."""
+
+    results: List[FormatsBatchItem]
+
+
 class DownloadResult(BaseModel):
     """Hold the result of a download operation, including metadata."""
 
-    file_buffer: BytesIO
+    file_path: Optional[str] = Field(
+        default=None, description="Temporary file holding the video, if any"
+    )
     video_title: str
     resolution: str | None
     final_format_id: str = Field(
         ..., description="The actual format_id used for the download"
     )
+    video_processing: ProcessingMode = Field(
+        ..., description="Whether the video track was copied or re-encoded"
+    )
+    audio_processing: ProcessingMode = Field(
+        ..., description="Whether the audio track was copied or re-encoded"
+    )
+    from_cache: bool = Field(
+        default=False, description="Whether the file was served from the result cache"
+    )
+
+
+# Download jobs models
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
 
-    class Config:
-        """Pydantic configuration to allow arbitrary types."""
 
-        arbitrary_types_allowed = True
+class DownloadJobRequest(BaseModel):
+    """Schema for submitting a background download of a video or a sample."""
+
+    url: str
+    format_id: Optional[str] = None
+    start_time: Annotated[
+        Optional[str],
+        Field(
+            description="Start time in HH:MM:SS, to download a sample",
+            pattern=TIME_PATTERN,
+            examples=["00:01:10"],
+        ),
+    ] = None
+    end_time: Annotated[
+        Optional[str],
+        Field(
+            description="End time in HH:MM:SS, to download a sample",
+            pattern=TIME_PATTERN,
+            examples=["00:01:25"],
+        ),
+    ] = None
+
+
+class DownloadJobStatus(BaseModel):
+    """Response model describing a download job."""
+
+    job_id: str
+    status: JobStatus
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = Field(
+        default=None, description="When the finished job and its file are discarded"
+    )
+    error: Optional[str] = None
+    video_title: Optional[str] = None
+    resolution: Optional[str] = None
+    final_format_id: Optional[str] = None
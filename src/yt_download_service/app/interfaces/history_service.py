@@ -1,34 +1,33 @@
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, Tuple
 from uuid import UUID
 
-from sqlalchemy.ext.asyncio import AsyncSession
 from yt_download_service.domain.models.history import (
     History,  # Use the Pydantic model
 )
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
 
 class IHistoryService(ABC):
     """Interface for history service, defining the contract for history operations."""
 
     @abstractmethod
-    async def create_history_entry(
-        self,
-        db: AsyncSession,
-        *,
-        user_id: UUID,
-        video_url: str,
-        video_title: str,
-        format_id: str,
-        resolution: str | None,
-        start_time_str: str | None = None,
-        end_time_str: str | None = None,
+    async def create_history_entries(
+        self, db: "AsyncSession", entries: Sequence[Dict[str, Any]]
     ) -> None:
-        """Contract for creating a new history record."""
+        """Contract for saving history records in one go."""
         pass
 
     @abstractmethod
-    async def get_history_by_user_id(
-        self, db: AsyncSession, user_id: UUID
-    ) -> list[History]:  # noqa: E501
-        """Contract for getting history records by user ID."""
+    async def get_history_page(
+        self,
+        db: "AsyncSession",
+        user_id: UUID,
+        *,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[list[History], Optional[str]]:
+        """Contract for getting a page of history records, and the next cursor."""
         pass
@@ -1,24 +1,27 @@
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 from uuid import UUID
 
-from sqlalchemy.ext.asyncio import AsyncSession
 from yt_download_service.domain.models.user import UserCreate, UserRead
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
 
 class IUserService(ABC):
     """Interface for user service, defining the contract for user operations."""
 
     @abstractmethod
-    async def create(self, db: AsyncSession, user_to_create: UserCreate) -> UserRead:
+    async def create(self, db: "AsyncSession", user_to_create: UserCreate) -> UserRead:
         """Create a new user."""
         pass
 
     @abstractmethod
-    async def get_by_id(self, db: AsyncSession, user_id: UUID) -> UserRead | None:
+    async def get_by_id(self, db: "AsyncSession", user_id: UUID) -> UserRead | None:
         """Get a user by their ID."""
         pass
 
     @abstractmethod
-    async def get_by_email(self, db: AsyncSession, email: str) -> UserRead | None:
+    async def get_by_email(self, db: "AsyncSession", email: str) -> UserRead | None:
         """Get a user by their email."""
         pass
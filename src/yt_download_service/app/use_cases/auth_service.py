@@ -1,7 +1,11 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import TYPE_CHECKING
+
 from yt_download_service.app.interfaces.user_service import IUserService
 from yt_download_service.domain.models.user import UserCreate, UserRead
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
 
 class AuthService:
     """Service for user authentication."""
@@ -9,7 +13,7 @@ class AuthService:
     def __init__(self, user_service: IUserService):
         self.user_service = user_service
 
-    async def authenticate_user(self, db: AsyncSession, user_info: dict) -> UserRead:
+    async def authenticate_user(self, db: "AsyncSession", user_info: dict) -> UserRead:
         """Authenticate user by finding them by email. Creating them if don't exist."""
         email = user_info.get("email")
         if not email:
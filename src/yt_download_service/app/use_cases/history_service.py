@@ -1,11 +1,81 @@
-from typing import cast
+import base64
+import binascii
+import datetime
+import logging
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
 from uuid import UUID
 
 from fastapi import HTTPException, status
-from sqlalchemy import delete, desc, select
-from sqlalchemy.ext.asyncio import AsyncSession
-from yt_download_service.domain.models.history import History
-from yt_download_service.infrastructure.database.models import DBHistory
+from pydantic import TypeAdapter
+from sqlalchemy import (
+    and_,
+    delete,
+    desc,
+    func,
+    insert,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from yt_download_service.app.utils.tracing import span
+from yt_download_service.domain.models.history import (
+    DailyHistoryStats,
+    History,
+    HistoryStats,
+    ResolutionHistoryStats,
+    VideoHistoryStats,
+)
+from yt_download_service.infrastructure.database.models import (
+    DBHistory,
+    DBHistoryStats,
+)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+logger = logging.getLogger(__name__)
+
+# Only the columns of the `History` model are selected, as plain rows:
+# building ORM objects and then validating them costs more than the query.
+HISTORY_COLUMNS = [getattr(DBHistory, name) for name in History.model_fields]
+HISTORY_LIST_ADAPTER = TypeAdapter(List[History])
+
+# Position after the last entry of a page: its `(created_at, id)`.
+HistoryCursor = Tuple[datetime.datetime, UUID]
+
+
+def encode_history_cursor(cursor: HistoryCursor) -> str:
+    """Encode a cursor as an opaque URL-safe string."""
+    created_at, history_id = cursor
+    raw = f"{created_at.isoformat()}|{history_id}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(value: str) -> HistoryCursor:
+    """
+    Decode a cursor made by `encode_history_cursor`.
+
+    Raises ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+        created_at, _, history_id = raw.decode("ascii").partition("|")
+        return datetime.datetime.fromisoformat(created_at), UUID(history_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid history cursor.")
 
 
 class HistoryService:
@@ -18,65 +88,194 @@ class HistoryService:
         parts = list(map(int, time_str.split(":")))
         return parts[0] * 3600 + parts[1] * 60 + parts[2]
 
-    async def create_history_entry(
-        self,
-        db: AsyncSession,
-        *,  # Make all subsequent arguments keyword-only for clarity
-        user_id: UUID,
-        video_url: str,
-        video_title: str,
-        format_id: str,
-        resolution: str | None,
-        start_time_str: str | None = None,
-        end_time_str: str | None = None,
+    def _clip_seconds(self, start_time: int | None, end_time: int | None) -> int:
+        """Return the length of a sample, 0 for a full video."""
+        if start_time is None or end_time is None:
+            return 0
+        return end_time - start_time
+
+    async def _add_to_stats(
+        self, db: "AsyncSession", rows: Sequence[Dict[str, Any]]
     ) -> None:
         """
-        Create and save a new history entry in the database.
+        Count new history rows in the `history_stats` counters.
 
-        Designed to be run in the background.
+        The rows are those inserted in the `history` table, the counters
+        are upserted in the caller's transaction, dated like `created_at`.
         """
-        try:
-            history_entry = DBHistory(
-                user_id=user_id,
-                yt_video_url=video_url,
-                video_title=video_title,
-                format_id=format_id,
-                resolution=resolution,
-                start_time=self._time_str_to_seconds(start_time_str),
-                end_time=self._time_str_to_seconds(end_time_str),
+        counters: Dict[Tuple[UUID, str, str], Dict[str, Any]] = {}
+        for row in rows:
+            key = (row["user_id"], row["yt_video_url"], row["resolution"] or "")
+            counter = counters.setdefault(
+                key,
+                {
+                    "user_id": key[0],
+                    "day": func.current_date(),
+                    "yt_video_url": key[1],
+                    "resolution": key[2],
+                    "downloads": 0,
+                    "clip_seconds": 0,
+                },
             )
-            db.add(history_entry)
-            await db.commit()
-            print(
-                f"Successfully saved history for user {user_id} and video '{video_title}'."  # noqa: E501
+            counter["video_title"] = row["video_title"]
+            counter["downloads"] += 1
+            counter["clip_seconds"] += self._clip_seconds(
+                row["start_time"], row["end_time"]
+            )
+        query = pg_insert(DBHistoryStats).values(list(counters.values()))
+        query = query.on_conflict_do_update(
+            index_elements=[
+                DBHistoryStats.user_id,
+                DBHistoryStats.day,
+                DBHistoryStats.yt_video_url,
+                DBHistoryStats.resolution,
+            ],
+            set_={
+                "video_title": query.excluded.video_title,
+                "downloads": DBHistoryStats.downloads + query.excluded.downloads,
+                "clip_seconds": (
+                    DBHistoryStats.clip_seconds + query.excluded.clip_seconds
+                ),
+            },
+        )
+        await db.execute(query)
+
+    async def _remove_from_stats(
+        self, db: "AsyncSession", db_history: DBHistory
+    ) -> None:
+        """Uncount a history entry about to be deleted from its counters."""
+        key = and_(
+            DBHistoryStats.user_id == db_history.user_id,
+            DBHistoryStats.day == cast(datetime.datetime, db_history.created_at).date(),
+            DBHistoryStats.yt_video_url == db_history.yt_video_url,
+            DBHistoryStats.resolution == (db_history.resolution or ""),
+        )
+        await db.execute(
+            update(DBHistoryStats)
+            .where(key)
+            .values(
+                downloads=DBHistoryStats.downloads - 1,
+                clip_seconds=DBHistoryStats.clip_seconds
+                - self._clip_seconds(db_history.start_time, db_history.end_time),
             )
-        except Exception as e:
-            # In a real app, you'd use a proper logger
-            print(f"Error saving history to DB: {e}")
+        )
+        await db.execute(
+            delete(DBHistoryStats).where(key, DBHistoryStats.downloads <= 0)
+        )
+
+    async def create_history_entries(
+        self, db: "AsyncSession", entries: Sequence[Dict[str, Any]]
+    ) -> None:
+        """
+        Save history entries with a single multi-row INSERT.
+
+        Each entry holds `user_id`, `video_url`, `video_title`, `format_id`
+        and optionally `resolution`, `start_time_str` and `end_time_str`,
+        as queued by HistoryWriter. Errors are raised after the rollback.
+        """
+        if not entries:
+            return
+        rows = [
+            {
+                "user_id": entry["user_id"],
+                "yt_video_url": entry["video_url"],
+                "video_title": entry["video_title"],
+                "format_id": entry["format_id"],
+                "resolution": entry.get("resolution"),
+                "start_time": self._time_str_to_seconds(entry.get("start_time_str")),
+                "end_time": self._time_str_to_seconds(entry.get("end_time_str")),
+            }
+            for entry in entries
+        ]
+        try:
+            with span("history_write", entries=len(rows)):
+                await db.execute(insert(DBHistory), rows)
+                await self._add_to_stats(db, rows)
+                await db.commit()
+        except Exception:
             await db.rollback()
+            raise
 
-    async def get_history_by_user_id(
-        self, db: AsyncSession, user_id: UUID
-    ) -> list[History]:
-        """Retrieve all history entries for a given user ID, ordered by most recent."""
+    async def get_history_page(
+        self,
+        db: "AsyncSession",
+        user_id: UUID,
+        *,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[list[History], Optional[str]]:
+        """
+        Retrieve a page of history entries for a user, most recent first.
+
+        Pages are keyset-paginated on `(created_at, id)`, which the
+        `ix_history_user_id_created_at_id` index serves directly, so every
+        page costs the same however deep it is. Raises ValueError if the
+        cursor is malformed.
+
+        Returns
+        -------
+            The entries, and the cursor of the next page, None on the last one.
+
+        """
+        after = decode_history_cursor(cursor) if cursor is not None else None
         try:
+            # Same order as the index: newest first, ties broken by ID.
             query = (
-                select(DBHistory)
+                select(*HISTORY_COLUMNS)
                 .where(DBHistory.user_id == user_id)
-                .order_by(desc(DBHistory.created_at))
+                .order_by(desc(DBHistory.created_at), DBHistory.id)
+                .limit(limit + 1)
             )
+            if after is not None:
+                created_at, history_id = after
+                query = query.where(
+                    or_(
+                        DBHistory.created_at < created_at,
+                        and_(
+                            DBHistory.created_at == created_at,
+                            DBHistory.id > history_id,
+                        ),
+                    )
+                )
             result = await db.execute(query)
-            db_histories = result.scalars().all()
+            rows = result.all()
 
-            # Map the DB objects to Pydantic models before returning
-            return [History.model_validate(db_obj) for db_obj in db_histories]
+            # One row more than asked tells whether there is a next page
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_history_cursor((rows[-1].created_at, rows[-1].id))
 
-        except Exception as e:
-            print(f"Error retrieving history for user {user_id}: {e}")
-            return []
+            # Map the rows to Pydantic models in a single pass
+            histories = HISTORY_LIST_ADAPTER.validate_python(rows, from_attributes=True)
+            return histories, next_cursor
+
+        except Exception:
+            logger.exception("Error retrieving history for user %s", user_id)
+            return [], None
+
+    async def stream_history(
+        self, db: "AsyncSession", user_id: UUID, *, batch_size: int
+    ) -> AsyncIterator[List[History]]:
+        """
+        Yield every history entry of a user, most recent first, in batches.
+
+        Rows are read through a server-side cursor, `batch_size` at a time,
+        so memory use does not depend on the size of the history. The
+        session must stay open until the iteration ends.
+        """
+        query = (
+            select(*HISTORY_COLUMNS)
+            .where(DBHistory.user_id == user_id)
+            .order_by(desc(DBHistory.created_at), DBHistory.id)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            yield HISTORY_LIST_ADAPTER.validate_python(rows, from_attributes=True)
 
     async def delete_history_by_id(
-        self, db: AsyncSession, *, history_id: UUID, user_id: UUID
+        self, db: "AsyncSession", *, history_id: UUID, user_id: UUID
     ) -> None:
         """
         Delete a specific history entry for a given user.
@@ -97,23 +296,22 @@ class HistoryService:
                 detail=f"History entry with id {history_id} not found for this user.",
             )
 
-        # 3. Delete and commit
+        # 3. Delete, along with its counters, and commit
         try:
+            await self._remove_from_stats(db, db_history)
             await db.delete(db_history)
             await db.commit()
-            print(
-                f"Successfully deleted history entry {history_id} for user {user_id}."
-            )
-        except Exception as e:
+            logger.debug("Deleted history entry %s for user %s.", history_id, user_id)
+        except Exception:
             await db.rollback()
-            print(f"Error deleting history entry {history_id}: {e}")
+            logger.exception("Error deleting history entry %s", history_id)
             # Re-raise as a server error
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Could not delete history entry.",
             )
 
-    async def clear_history_by_user_id(self, db: AsyncSession, user_id: UUID) -> int:
+    async def clear_history_by_user_id(self, db: "AsyncSession", user_id: UUID) -> int:
         """
         Clear all history entries for a given user ID using a single bulk delete.
 
@@ -123,20 +321,116 @@ class HistoryService:
             # 1. Create a single bulk delete statement
             query = delete(DBHistory).where(DBHistory.user_id == user_id)
 
-            # 2. Execute it
+            # 2. Execute it, clearing the counters too
             result = await db.execute(query)
+            await db.execute(
+                delete(DBHistoryStats).where(DBHistoryStats.user_id == user_id)
+            )
             await db.commit()
 
             deleted_count = result.rowcount
-            print(
-                f"Successfully cleared {deleted_count} history entries for user {user_id}."  # noqa: E501
+            logger.debug(
+                "Cleared %s history entries for user %s.", deleted_count, user_id
             )
             return cast(int, deleted_count)
 
-        except Exception as e:
+        except Exception:
             await db.rollback()
-            print(f"Error clearing history for user {user_id}: {e}")
+            logger.exception("Error clearing history for user %s", user_id)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Could not clear user history.",
             )
+
+    async def get_history_stats(
+        self, db: "AsyncSession", user_id: UUID, *, days: int, top: int
+    ) -> HistoryStats:
+        """
+        Aggregate the history of a user from its `history_stats` counters.
+
+        Totals and top lists cover the whole history, the daily series
+        the last `days` days, today included. The counters hold at most a
+        row per day, video and resolution, so heavy users with many
+        repeated downloads cost far less than scanning their history.
+        """
+        try:
+            with span("history_stats", days=days):
+                of_user = DBHistoryStats.user_id == user_id
+                today = cast(
+                    datetime.date, await db.scalar(select(func.current_date()))
+                )
+                first_day = today - datetime.timedelta(days=days - 1)
+
+                totals = (
+                    await db.execute(
+                        select(
+                            func.coalesce(func.sum(DBHistoryStats.downloads), 0),
+                            func.coalesce(func.sum(DBHistoryStats.clip_seconds), 0),
+                        ).where(of_user)
+                    )
+                ).one()
+
+                per_day = await db.execute(
+                    select(
+                        DBHistoryStats.day,
+                        func.sum(DBHistoryStats.downloads),
+                        func.sum(DBHistoryStats.clip_seconds),
+                    )
+                    .where(of_user, DBHistoryStats.day >= first_day)
+                    .group_by(DBHistoryStats.day)
+                )
+                by_day = {day: (count, seconds) for day, count, seconds in per_day}
+
+                video_downloads = func.sum(DBHistoryStats.downloads)
+                top_videos = await db.execute(
+                    select(
+                        DBHistoryStats.yt_video_url,
+                        func.max(DBHistoryStats.video_title),
+                        video_downloads,
+                    )
+                    .where(of_user)
+                    .group_by(DBHistoryStats.yt_video_url)
+                    .order_by(desc(video_downloads), DBHistoryStats.yt_video_url)
+                    .limit(top)
+                )
+
+                resolution_downloads = func.sum(DBHistoryStats.downloads)
+                top_resolutions = await db.execute(
+                    select(DBHistoryStats.resolution, resolution_downloads)
+                    .where(of_user)
+                    .group_by(DBHistoryStats.resolution)
+                    .order_by(desc(resolution_downloads), DBHistoryStats.resolution)
+                    .limit(top)
+                )
+
+            daily = []
+            for offset in range(days):
+                day = first_day + datetime.timedelta(days=offset)
+                count, seconds = by_day.get(day, (0, 0))
+                daily.append(
+                    DailyHistoryStats(day=day, downloads=count, clip_seconds=seconds)
+                )
+            return HistoryStats(
+                total_downloads=totals[0],
+                total_clip_seconds=totals[1],
+                daily=daily,
+                top_videos=[
+                    VideoHistoryStats(
+                        yt_video_url=url, video_title=title, downloads=count
+                    )
+                    for url, title, count in top_videos
+                ],
+                top_resolutions=[
+                    ResolutionHistoryStats(
+                        resolution=resolution or None, downloads=count
+                    )
+                    for resolution, count in top_resolutions
+                ],
+            )
+
+        except Exception:
+            logger.exception("Error computing history stats for user %s", user_id)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Could not compute history statistics.",
+            )
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from yt_download_service.app.use_cases.history_service import HistoryService
+from yt_download_service.infrastructure.database.session import (
+    get_session_factory,
+)
+from yt_download_service.settings import get_settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Entries written by a single INSERT.
+HISTORY_BATCH_SIZE = get_settings().history_batch_size
+# How long an entry may wait for its batch to fill up.
+HISTORY_FLUSH_INTERVAL_SECONDS = get_settings().history_flush_interval_seconds
+# Entries kept in memory when the database falls behind, newer ones are dropped.
+HISTORY_MAX_PENDING = get_settings().history_max_pending
+
+
+class HistoryWriter:
+    """
+    Write-behind buffer for history entries.
+
+    Requests only append their entries to an in-memory list, and a
+    background task writes them in multi-row INSERTs, whenever a batch
+    is full or `flush_interval` seconds after its first entry. Each batch
+    uses its own session, independent of any request.
+
+    Entries are lost if the process dies before they are written, which
+    is acceptable for a download history. `close` writes what is left.
+    Sessions come from `session_factory`, the application's by default.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        history_service: HistoryService,
+        session_factory: Optional[Callable[[], "AsyncSession"]] = None,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL_SECONDS,
+        max_pending: int = HISTORY_MAX_PENDING,
+    ) -> None:
+        self.history_service = history_service
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._has_entries = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def record(
+        self,
+        *,
+        user_id: UUID,
+        video_url: str,
+        video_title: str,
+        format_id: str,
+        resolution: str | None,
+        start_time_str: str | None = None,
+        end_time_str: str | None = None,
+    ) -> None:
+        """Queue a history entry, to be written shortly."""
+        if len(self._pending) >= self.max_pending:
+            logger.warning("History writer is full, dropping an entry.")
+            return
+        self._pending.append(
+            {
+                "user_id": user_id,
+                "video_url": video_url,
+                "video_title": video_title,
+                "format_id": format_id,
+                "resolution": resolution,
+                "start_time_str": start_time_str,
+                "end_time_str": end_time_str,
+            }
+        )
+        self._has_entries.set()
+        if len(self._pending) >= self.batch_size:
+            self._batch_full.set()
+        if not self._closing and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """Write batches as they fill up or time out, until closed."""
+        while not self._closing:
+            await self._has_entries.wait()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write every pending entry now, one batch at a time."""
+        session_factory = self.session_factory or get_session_factory()
+        while self._pending:
+            batch = self._pending[: self.batch_size]
+            del self._pending[: self.batch_size]
+            try:
+                async with session_factory() as db:
+                    await self.history_service.create_history_entries(db, batch)
+            except Exception:
+                logger.exception("Could not save %d history entries", len(batch))
+        self._has_entries.clear()
+        self._batch_full.clear()
+
+    async def close(self) -> None:
+        """Stop the background task and write the remaining entries."""
+        # The task is not cancelled, so that a batch being written is not
+        # interrupted halfway. It is woken up instead, flushes and exits.
+        self._closing = True
+        self._has_entries.set()
+        self._batch_full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
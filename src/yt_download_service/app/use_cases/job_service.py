@@ -0,0 +1,257 @@
+import asyncio
+import datetime
+import os
+import uuid
+from typing import Dict, Optional
+from uuid import UUID
+
+from yt_download_service.app.domain.schemas import (
+    DownloadJobRequest,
+    DownloadJobStatus,
+    DownloadResult,
+    JobStatus,
+)
+from yt_download_service.app.use_cases.history_writer import HistoryWriter
+from yt_download_service.app.use_cases.video_service import (
+    MAX_SAMPLE_DURATION_SECONDS,
+    VideoService,
+)
+from yt_download_service.app.utils.metrics import record_error
+from yt_download_service.app.utils.progress import ProgressBroker, ProgressReporter
+from yt_download_service.app.utils.scheduler import SchedulerFullError
+from yt_download_service.app.utils.video_utils import is_valid_youtube_url
+from yt_download_service.settings import format_duration_limit, get_settings
+
+# How long finished jobs, and their files, are kept for the client to fetch.
+JOB_RESULT_TTL_SECONDS = get_settings().job_result_ttl_seconds
+# Unfinished jobs a single user may have at once.
+JOB_MAX_PENDING_PER_USER = get_settings().job_max_pending_per_user
+
+
+class JobNotFoundError(LookupError):
+    """Raised when a job does not exist, or belongs to another user."""
+
+
+class JobNotReadyError(Exception):
+    """Raised when the file of a job is asked for before the job succeeded."""
+
+
+class DownloadJob:
+    """State of a submitted download, kept in memory."""
+
+    def __init__(self, user_id: UUID, request: DownloadJobRequest) -> None:
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.request = request
+        self.status: JobStatus = "queued"
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.finished_at: Optional[datetime.datetime] = None
+        self.error: Optional[str] = None
+        self.result: Optional[DownloadResult] = None
+        self.task: Optional[asyncio.Task] = None
+        self.expiry_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def is_sample(self) -> bool:
+        """Return whether the job downloads a time range only."""
+        return self.request.start_time is not None
+
+    @property
+    def is_finished(self) -> bool:
+        """Return whether the job succeeded or failed."""
+        return self.status in ("succeeded", "failed")
+
+    def to_status(self, result_ttl: float) -> DownloadJobStatus:
+        """Describe the job to its owner."""
+        return DownloadJobStatus(
+            job_id=self.id,
+            status=self.status,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+            expires_at=(
+                self.finished_at + datetime.timedelta(seconds=result_ttl)
+                if self.finished_at
+                else None
+            ),
+            error=self.error,
+            video_title=self.result.video_title if self.result else None,
+            resolution=self.result.resolution if self.result else None,
+            final_format_id=self.result.final_format_id if self.result else None,
+        )
+
+
+class JobService:
+    """
+    Run downloads in the background, for clients to poll and fetch later.
+
+    Jobs and their files live in memory and on local disk, so they are
+    only visible on the instance that accepted them, and are lost on
+    restart. Finished jobs are discarded after `result_ttl` seconds.
+    Progress is reported to `progress_broker` under the job ID.
+    """
+
+    def __init__(
+        self,
+        video_service: VideoService,
+        history_writer: HistoryWriter,
+        progress_broker: ProgressBroker,
+        result_ttl: float = JOB_RESULT_TTL_SECONDS,
+        max_pending_per_user: int = JOB_MAX_PENDING_PER_USER,
+    ) -> None:
+        self.video_service = video_service
+        self.history_writer = history_writer
+        self.progress_broker = progress_broker
+        self.result_ttl = result_ttl
+        self.max_pending_per_user = max_pending_per_user
+        self._jobs: Dict[str, DownloadJob] = {}
+
+    def _validate(self, request: DownloadJobRequest) -> None:
+        """Reject obviously invalid jobs before accepting them."""
+        if not is_valid_youtube_url(request.url):
+            raise ValueError("Invalid YouTube URL")
+        if (request.start_time is None) != (request.end_time is None):
+            raise ValueError("Both start_time and end_time are needed for a sample.")
+        if request.start_time is not None and request.end_time is not None:
+            start_seconds = self.video_service._time_str_to_seconds(request.start_time)
+            end_seconds = self.video_service._time_str_to_seconds(request.end_time)
+            if start_seconds >= end_seconds:
+                raise ValueError("Start time must be less than end time.")
+            if end_seconds - start_seconds > MAX_SAMPLE_DURATION_SECONDS:
+                raise ValueError(
+                    "The sample duration cannot exceed "
+                    f"{format_duration_limit(MAX_SAMPLE_DURATION_SECONDS)}."
+                )
+
+    def submit(
+        self,
+        request: DownloadJobRequest,
+        user_id: UUID,
+        encoded_cookies: str | None = None,
+    ) -> DownloadJobStatus:
+        """
+        Accept a download and start it in the background.
+
+        Raises ValueError for invalid requests, and SchedulerFullError when
+        the user already has too many unfinished jobs.
+        """
+        self._validate(request)
+        pending = sum(
+            1
+            for job in self._jobs.values()
+            if job.user_id == user_id and not job.is_finished
+        )
+        if pending >= self.max_pending_per_user:
+            raise SchedulerFullError("jobs", retry_after=30)
+
+        job = DownloadJob(user_id, request)
+        self._jobs[job.id] = job
+        progress = self.progress_broker.open(job.id, str(user_id))
+        # Cookies are only held by the task, they are never stored on the job.
+        job.task = asyncio.create_task(self._run(job, encoded_cookies, progress))
+        return job.to_status(self.result_ttl)
+
+    async def _download(
+        self, job: DownloadJob, encoded_cookies: str | None, progress: ProgressReporter
+    ) -> DownloadResult:
+        user_id = str(job.user_id)
+        if job.is_sample:
+            return await self.video_service.download_optimal_sample(
+                job.request.url,
+                start_time=str(job.request.start_time),
+                end_time=str(job.request.end_time),
+                format_id=job.request.format_id,
+                encoded_cookies=encoded_cookies,
+                user_id=user_id,
+                progress=progress,
+            )
+        return await self.video_service.download_full_video(
+            job.request.url,
+            job.request.format_id,
+            encoded_cookies=encoded_cookies,
+            user_id=user_id,
+            progress=progress,
+        )
+
+    async def _run(
+        self, job: DownloadJob, encoded_cookies: str | None, progress: ProgressReporter
+    ) -> None:
+        """Run a job to completion, waiting for room when the server is busy."""
+        try:
+            while True:
+                job.status = "running"
+                try:
+                    job.result = await self._download(job, encoded_cookies, progress)
+                    break
+                except SchedulerFullError as e:
+                    # Unlike a request, a job can simply wait its turn.
+                    job.status = "queued"
+                    progress.publish("queued")
+                    await asyncio.sleep(e.retry_after)
+            job.status = "succeeded"
+            progress.finish()
+        except asyncio.CancelledError:
+            progress.fail("The download was cancelled.")
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            record_error(e)
+            progress.fail(e)
+        finally:
+            job.finished_at = datetime.datetime.now(datetime.timezone.utc)
+            job.expiry_handle = asyncio.get_running_loop().call_later(
+                self.result_ttl, self.discard, job.id
+            )
+
+        if job.result is not None:
+            self.history_writer.record(
+                user_id=job.user_id,
+                video_url=job.request.url,
+                video_title=job.result.video_title,
+                format_id=job.result.final_format_id,
+                resolution=job.result.resolution,
+                start_time_str=job.request.start_time,
+                end_time_str=job.request.end_time,
+            )
+
+    def get(self, job_id: str, user_id: UUID) -> DownloadJob:
+        """Return a job of the given user, raising JobNotFoundError otherwise."""
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            raise JobNotFoundError(f"Job {job_id} not found.")
+        return job
+
+    def get_status(self, job_id: str, user_id: UUID) -> DownloadJobStatus:
+        """Describe a job of the given user."""
+        return self.get(job_id, user_id).to_status(self.result_ttl)
+
+    def get_result(self, job_id: str, user_id: UUID) -> DownloadResult:
+        """Return the result of a succeeded job, raising JobNotReadyError until then."""
+        job = self.get(job_id, user_id)
+        if job.status != "succeeded" or job.result is None:
+            raise JobNotReadyError(f"Job {job_id} is {job.status}, no file to fetch.")
+        return job.result
+
+    def discard(self, job_id: str) -> None:
+        """Forget a job, cancelling it if needed and deleting its file."""
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return
+        if job.expiry_handle is not None:
+            job.expiry_handle.cancel()
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+        if job.result is not None and job.result.file_path:
+            if os.path.exists(job.result.file_path):
+                os.remove(job.result.file_path)
+
+    async def close(self) -> None:
+        """Discard every job, waiting for the unfinished ones to be cancelled."""
+        tasks = [
+            job.task
+            for job in self._jobs.values()
+            if job.task is not None and not job.task.done()
+        ]
+        for job_id in list(self._jobs):
+            self.discard(job_id)
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,290 @@
+import asyncio
+import os
+from typing import Callable, List, Optional, Tuple
+
+from yt_download_service.app.utils.async_utils import gather_or_cancel
+from yt_download_service.app.utils.ffmpeg_runner import run_ffmpeg, run_ffprobe
+from yt_download_service.app.utils.ffmpeg_utils import (
+    FFMPEG_PRESET,
+    FFMPEG_THREADS,
+    ProcessingMode,
+    build_merge_command,
+    concat_input_args,
+    format_seconds,
+    get_codec_args,
+    get_h264_profile,
+    is_mp4_audio_codec,
+    is_mp4_video_codec,
+    write_concat_list,
+    x264_threads_args,
+)
+
+# Takes up to the given number of extra transcode slots, among those free
+# right now, and returns the functions giving them back.
+TrySlots = Callable[[int], List[Callable[[], None]]]
+# (start, duration, x264 profile or None for a stream copy) of a segment.
+Segment = Tuple[float, float, Optional[str]]
+
+# Samples are joined by stream copy, which needs every clip to share the
+# video track's timescale whichever way it was cut.
+SAMPLE_TIMESCALE_ARGS = ["-video_track_timescale", "90000"]
+
+
+class SampleCutter:
+    """
+    Cut samples out of direct media URLs ("smart cut").
+
+    Inputs are fast-seeked, so only the requested range is fetched. The
+    GOPs lying fully inside the range are stream-copied, and only the two
+    partial GOPs at its edges are re-encoded. When the video codec cannot
+    be copied, or the range does not contain a whole GOP, the range is
+    re-encoded in a single pass instead.
+
+    The caller holds one transcode slot, on which the segments are cut one
+    after the other. They run side by side only on the extra slots that
+    `try_slots` hands out.
+    """
+
+    def __init__(
+        self,
+        preset: str = FFMPEG_PRESET,
+        threads: int = FFMPEG_THREADS,
+        max_gop_seconds: float = 10,
+    ) -> None:
+        self.preset = preset
+        self.threads = threads
+        # How far past `start` we look for the first keyframe inside the range.
+        self.max_gop_seconds = max_gop_seconds
+
+    async def find_cut_keyframes(
+        self, video_url: str, start_seconds: float, end_seconds: float
+    ) -> Optional[Tuple[float, float]]:
+        """
+        Find the first and last keyframes inside `[start, end]`.
+
+        Only packet headers around the two edges are read, nothing is
+        decoded. Returns None if the range does not contain a whole GOP.
+        """
+        read_intervals = (
+            f"{format_seconds(start_seconds)}%+{format_seconds(self.max_gop_seconds)},"
+            f"{format_seconds(end_seconds)}%+#1"
+        )
+        output = await run_ffprobe(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-select_streams",
+                "v:0",
+                "-show_entries",
+                "packet=pts_time,flags",
+                "-of",
+                "csv=p=0",
+                "-read_intervals",
+                read_intervals,
+                video_url,
+            ]
+        )
+        keyframes = []
+        for line in output.splitlines():
+            pts_time, _, flags = line.partition(",")
+            if flags.startswith("K") and pts_time not in ("", "N/A"):
+                keyframes.append(float(pts_time))
+
+        first = min((k for k in keyframes if k >= start_seconds), default=None)
+        last = max((k for k in keyframes if k <= end_seconds), default=None)
+        if first is None or last is None or first >= last:
+            return None
+        return first, last
+
+    def plan_segments(
+        self,
+        start_seconds: float,
+        end_seconds: float,
+        keyframes: Tuple[float, float],
+        profile: str,
+    ) -> List[Segment]:
+        """
+        Split a range at its first and last keyframes.
+
+        The whole GOPs between them are copied, the partial ones at the
+        edges encoded with `profile`. Empty edges are left out.
+        """
+        first_keyframe, last_keyframe = keyframes
+        segments: List[Segment] = [
+            (start_seconds, first_keyframe - start_seconds, profile),
+            (first_keyframe, last_keyframe - first_keyframe, None),
+            (last_keyframe, end_seconds - last_keyframe, profile),
+        ]
+        return [segment for segment in segments if segment[1] > 0]
+
+    async def _run_segment_commands(
+        self, commands: List[List[str]], try_slots: TrySlots
+    ) -> None:
+        """Run the segment commands, as many at once as slots are held."""
+        releases = try_slots(len(commands) - 1)
+        semaphore = asyncio.Semaphore(1 + len(releases))
+
+        async def run(command: List[str]) -> None:
+            async with semaphore:
+                await run_ffmpeg(command)
+
+        try:
+            await gather_or_cancel(*(run(command) for command in commands))
+        finally:
+            for release in releases:
+                release()
+
+    def _segment_command(
+        self,
+        video_url: str,
+        start_seconds: float,
+        duration: float,
+        output: str,
+        encode_profile: Optional[str] = None,
+    ) -> list[str]:
+        """Build the command cutting a video-only MPEG-TS segment."""
+        if encode_profile is None:
+            codec_args = ["-c:v", "copy"]
+        else:
+            codec_args = [
+                "-c:v",
+                "libx264",
+                "-preset",
+                self.preset,
+                *x264_threads_args(self.threads),
+                "-profile:v",
+                encode_profile,
+                "-pix_fmt",
+                "yuv420p",
+                # Repeat SPS/PPS before every keyframe, the concatenated
+                # stream switches between our parameter sets and the source's.
+                "-x264-params",
+                "repeat-headers=1",
+            ]
+        # MPEG-TS carries the parameter sets in-band, so segments encoded
+        # here can be concatenated with the copied ones.
+        return [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-ss",
+            format_seconds(start_seconds),
+            "-i",
+            video_url,
+            "-t",
+            format_seconds(duration),
+            "-map",
+            "0:v:0",
+            "-an",
+            *codec_args,
+            "-f",
+            "mpegts",
+            output,
+        ]
+
+    async def build_command(
+        self,
+        video_format: dict,
+        audio_format: dict,
+        start_seconds: float,
+        end_seconds: float,
+        work_dir: str,
+        output: str,
+        try_slots: TrySlots = lambda count: [],
+    ) -> Tuple[list[str], ProcessingMode, ProcessingMode]:
+        """
+        Prepare a sample and return the ffmpeg command that produces it.
+
+        Edge segments are written to `work_dir`, which must outlive the
+        returned command. Returns the command, then the processing mode of
+        the video and of the audio track.
+        """
+        duration = end_seconds - start_seconds
+        video_url, audio_url = video_format["url"], audio_format["url"]
+
+        keyframes = None
+        if is_mp4_video_codec(video_format.get("vcodec")):
+            keyframes = await self.find_cut_keyframes(
+                video_url, start_seconds, end_seconds
+            )
+        if keyframes is None:
+            # Re-encoding after an input seek is frame accurate, and only
+            # costs the length of the sample.
+            codec_args, _, _ = get_codec_args(None, None, self.preset, self.threads)
+            # In-band SPS/PPS and the smart cut's timescale, so samples can
+            # be joined.
+            codec_args += [
+                "-x264-params",
+                "repeat-headers=1",
+                *SAMPLE_TIMESCALE_ARGS,
+            ]
+            command = build_merge_command(
+                video_url,
+                audio_url,
+                output,
+                codec_args,
+                start_seconds=start_seconds,
+                duration=duration,
+            )
+            return command, "transcode", "transcode"
+
+        segments = self.plan_segments(
+            start_seconds,
+            end_seconds,
+            keyframes,
+            get_h264_profile(video_format.get("vcodec")),
+        )
+        segment_paths = []
+        commands = []
+        for index, (segment_start, segment_duration, encode_profile) in enumerate(
+            segments
+        ):
+            segment_path = os.path.join(work_dir, f"segment_{index}.ts")
+            segment_paths.append(segment_path)
+            commands.append(
+                self._segment_command(
+                    video_url,
+                    segment_start,
+                    segment_duration,
+                    segment_path,
+                    encode_profile,
+                )
+            )
+        await self._run_segment_commands(commands, try_slots)
+
+        concat_list_path = os.path.join(work_dir, "segments.txt")
+        write_concat_list(concat_list_path, segment_paths)
+
+        audio_mode: ProcessingMode = (
+            "copy" if is_mp4_audio_codec(audio_format.get("acodec")) else "transcode"
+        )
+        command = [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            *concat_input_args(concat_list_path),
+            "-ss",
+            format_seconds(start_seconds),
+            "-i",
+            audio_url,
+            "-t",
+            format_seconds(duration),
+            "-map",
+            "0:v:0",
+            "-map",
+            "1:a:0",
+            "-c:v",
+            "copy",
+            "-c:a",
+            "copy" if audio_mode == "copy" else "aac",
+            *SAMPLE_TIMESCALE_ARGS,
+            "-movflags",
+            "frag_keyframe+empty_moov",
+            "-f",
+            "mp4",
+            output,
+        ]
+        return command, "smart_cut", audio_mode
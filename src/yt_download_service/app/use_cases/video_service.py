@@ -1,69 +1,142 @@
 import asyncio
-import base64
 import datetime
+import functools
+import logging
 import os
 import re
-import subprocess
+import shutil
 import tempfile
-from contextlib import contextmanager
-from typing import Any, Dict, Generator, Optional, Tuple, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+    cast,
+)
 
-import yt_dlp
 from yt_download_service.app.domain.schemas import (
     AudioOption,
     DownloadResult,
+    FormatsBatchItem,
     FormatsResponse,
     ResolutionOption,
+    SamplesOutput,
+)
+from yt_download_service.app.use_cases.sample_cutter import SampleCutter
+from yt_download_service.app.utils.async_utils import (
+    gather_or_cancel,
+    start_generator,
+)
+from yt_download_service.app.utils.cookie_jars import CookieJarCache
+from yt_download_service.app.utils.ffmpeg_runner import (
+    FFmpegError,
+    run_ffmpeg,
+    stream_ffmpeg,
+)
+from yt_download_service.app.utils.ffmpeg_utils import (
+    ProcessingMode,
+    build_concat_command,
+    build_merge_command,
+    get_codec_args,
+    heaviest_processing_mode,
+    is_mp4_audio_codec,
+    is_mp4_video_codec,
+    write_concat_list,
+)
+from yt_download_service.app.utils.file_utils import sanitize_filename
+from yt_download_service.app.utils.info_cache import (
+    VideoInfoCache,
+    make_info_cache_key,
+)
+from yt_download_service.app.utils.lazy_import import lazy_import
+from yt_download_service.app.utils.metrics import (
+    EXTRACTION_SECONDS,
+    record_error,
+    track_slot_pools,
+)
+from yt_download_service.app.utils.progress import NO_PROGRESS, ProgressReporter
+from yt_download_service.app.utils.result_cache import (
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_MAX_BYTES,
+    ResultCache,
+    ResultCacheKey,
+    is_shareable_result,
+    make_result_cache_key,
 )
+from yt_download_service.app.utils.scheduler import (
+    PER_USER_LIMIT,
+    JobScheduler,
+    SchedulerFullError,
+)
+from yt_download_service.app.utils.tracing import Span, span
 from yt_download_service.app.utils.video_utils import is_valid_youtube_url
+from yt_download_service.app.utils.ydl_pool import (
+    YDL_POOL_MAX_IDLE_PER_KEY,
+    YoutubeDLPool,
+)
+from yt_download_service.app.utils.zip_stream import stream_zip
+from yt_download_service.settings import format_duration_limit, get_settings
+
+if TYPE_CHECKING:
+    import yt_dlp
+else:
+    yt_dlp = lazy_import("yt_dlp")
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+# Extractions a single batch runs at once. More would only wait in the
+# scheduler's queue, behind the user's per-user limit.
+FORMATS_BATCH_CONCURRENCY = settings.formats_batch_concurrency or PER_USER_LIMIT
+MAX_VIDEO_DURATION_SECONDS = settings.max_video_duration_seconds
+MAX_SAMPLE_DURATION_SECONDS = settings.max_sample_duration_seconds
+# Total length of the samples of a multi-range download.
+MAX_SAMPLES_TOTAL_SECONDS = settings.max_samples_total_seconds
+# Samples of a multi-range download cut at once.
+SAMPLES_CUT_CONCURRENCY = settings.samples_cut_concurrency
+# Where downloads and samples are written, None for the system default.
+SCRATCH_DIR = settings.scratch_dir
 
 
 class VideoService:
     """Service for downloading YouTube video segments."""
 
     def __init__(self) -> None:
-        pass
-
-    @contextmanager
-    def _get_cookie_file_path(
-        self, encoded_cookies: str | None
-    ) -> Generator[str | None, None, None]:
-        """Decode cookies."""
-        """Decodes base64 cookies, writes them to a temporary
-        file, yields the file path, and securely cleans up afterwards.
-        """
-        if not encoded_cookies:
-            yield None
-            return
-
-        cookie_file_path = None
-        try:
-            # Decode the Base64 string back to the original text content
-            decoded_cookies = base64.b64decode(encoded_cookies).decode("utf-8")
-
-            # Create a temporary file that is deleted on close
-            with tempfile.NamedTemporaryFile(
-                mode="w", delete=False, suffix=".txt", encoding="utf-8"
-            ) as temp_cookie_file:
-                temp_cookie_file.write(decoded_cookies)
-                cookie_file_path = temp_cookie_file.name
-
-            yield cookie_file_path  # The path is used by the 'with' block
+        self._info_cache = VideoInfoCache(
+            maxsize=settings.info_cache_size,
+            default_ttl=settings.info_cache_default_ttl_seconds,
+            max_ttl=settings.info_cache_max_ttl_seconds,
+            expiry_margin=settings.info_cache_expiry_margin_seconds,
+        )
+        self._sample_cutter = SampleCutter()
+        self._cookie_jars = CookieJarCache()
+        self._ydl_pool = YoutubeDLPool(self._create_ydl_options(), self._cookie_jars)
+        self._result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
+        self._scheduler = JobScheduler()
+        track_slot_pools((self._scheduler.extraction, self._scheduler.transcoding))
+
+    def warm_up(self) -> None:
+        """Build the yt-dlp instances the extraction workers will use first."""
+        self._ydl_pool.warm_up(
+            min(settings.scheduler_extraction_workers, YDL_POOL_MAX_IDLE_PER_KEY)
+        )
 
-        finally:
-            # Securely clean up the file after the 'with' block is exited
-            if cookie_file_path and os.path.exists(cookie_file_path):
-                os.remove(cookie_file_path)
+    def close(self) -> None:
+        """Release the yt-dlp instances kept for reuse, and the cookie jars."""
+        self._ydl_pool.close()
+        self._cookie_jars.clear()
 
-    def _create_ydl_options(self, cookie_path: str | None = None) -> Dict[str, Any]:
+    def _create_ydl_options(self) -> Dict[str, Any]:
         """Create a consistent dictionary of yt-dlp options."""
         # Use Dict[str, Any] to satisfy the type checker.
         ydl_opts: Dict[str, Any] = {
             "quiet": True,
             "no_warnings": True,
         }
-        if cookie_path:
-            ydl_opts["cookiefile"] = cookie_path
         return ydl_opts
 
     def _time_str_to_seconds(self, time_str: str) -> int:
@@ -79,28 +152,248 @@ class VideoService:
         return 0
 
     def _get_video_info(self, url: str, encoded_cookies: str | None = None) -> dict:
-        """Fetch video metadata without downloading."""
-        with self._get_cookie_file_path(encoded_cookies) as cookie_path:
-            ydl_opts = self._create_ydl_options(cookie_path)
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        """
+        Fetch video metadata without downloading.
+
+        Results are cached per video ID and cookies until the media URLs
+        expire. The returned dict is shared, callers must not mutate it.
+        """
+        return self._info_cache.get_or_extract(
+            make_info_cache_key(url, encoded_cookies),
+            lambda: self._extract_video_info(url, encoded_cookies),
+        )
+
+    def _get_video_info_reporting(
+        self, url: str, encoded_cookies: str | None, progress: ProgressReporter
+    ) -> dict:
+        """Fetch video metadata on a worker thread, reporting when it starts."""
+        progress.publish("extracting")
+        return self._get_video_info(url, encoded_cookies)
+
+    def _extract_video_info(self, url: str, encoded_cookies: str | None = None) -> dict:
+        """Run a full yt-dlp extraction, bypassing the cache."""
+        with EXTRACTION_SECONDS.time(), span("extraction"):
+            with self._ydl_pool.checkout(encoded_cookies) as ydl:
                 return cast(dict, ydl.extract_info(url, download=False))
 
+    def _invalidate_info_on_failure(
+        self, error: BaseException, url: str, encoded_cookies: str | None
+    ) -> None:
+        """Drop cached metadata whose media URLs ffmpeg failed to read."""
+        if isinstance(error, FFmpegError):
+            self._info_cache.invalidate(make_info_cache_key(url, encoded_cookies))
+
+    async def _get_cached_result(self, key: ResultCacheKey) -> Optional[DownloadResult]:
+        """Return a previously produced clip, if the result cache holds one."""
+        loop = asyncio.get_event_loop()
+        cached = await loop.run_in_executor(None, self._result_cache.get, key)
+        if cached is None:
+            return None
+        file_path, metadata = cached
+        return DownloadResult(file_path=file_path, from_cache=True, **metadata)
+
+    async def _cache_result(
+        self,
+        key: ResultCacheKey,
+        result: DownloadResult,
+        info_dict: dict,
+        encoded_cookies: str | None,
+    ) -> None:
+        """Store a produced clip, unless it may not be served to other users."""
+        if not is_shareable_result(info_dict, has_cookies=bool(encoded_cookies)):
+            return
+        metadata = result.model_dump(exclude={"file_path", "from_cache"})
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(
+                None,
+                self._result_cache.put,
+                key,
+                cast(str, result.file_path),
+                metadata,
+            )
+        except OSError:
+            # The clip was produced fine, failing to cache it is not an error.
+            pass
+
+    def _select_full_download_formats(
+        self, info_dict: dict, format_id: Optional[str] = None
+    ) -> Tuple[dict, dict]:
+        """Validate a full download and pick the video and audio formats to merge."""
+        with span("format_selection", format_id=format_id or "best"):
+            formats = info_dict.get("formats", [])
+            video_duration_seconds = info_dict.get("duration")
+
+            if video_duration_seconds is None:
+                raise ValueError(
+                    "Cannot determine video duration. Might be a live stream."
+                )
+
+            if video_duration_seconds > MAX_VIDEO_DURATION_SECONDS:
+                raise ValueError(
+                    "The video duration cannot exceed "
+                    f"{format_duration_limit(MAX_VIDEO_DURATION_SECONDS)}."
+                )
+
+            # 1. Find the requested video format.
+            if format_id:
+                video_format = next(
+                    (f for f in formats if f.get("format_id") == format_id), None
+                )
+                if not video_format:
+                    raise ValueError(f"Format ID {format_id} not found.")
+            else:
+                # If no format_id is provided, we must select the best one.
+                video_only_formats = [
+                    f
+                    for f in formats
+                    if f.get("vcodec") != "none" and f.get("acodec") == "none"
+                ]
+                if not video_only_formats:
+                    raise ValueError("No suitable video-only format found for merging.")
+                # Select the one with the greatest height (resolution).
+                video_format = max(video_only_formats, key=lambda f: f.get("height", 0))
+
+            # 2. Find the best audio format.
+            return video_format, self._select_best_audio_format(formats)
+
+    def _select_best_audio_format(self, formats: list[dict]) -> dict:
+        """
+        Pick the audio-only format with the highest bitrate.
+
+        M4A is preferred, since it is stream-copied into the MP4 output,
+        whereas Opus or Vorbis would have to be re-encoded.
+        """
+        audio_streams = [
+            f
+            for f in formats
+            if f.get("acodec") != "none" and f.get("vcodec") == "none"
+        ]
+        if not audio_streams:
+            raise ValueError("No compatible audio stream found to merge.")
+        m4a_streams = [f for f in audio_streams if is_mp4_audio_codec(f.get("acodec"))]
+
+        def get_bitrate(fmt):
+            abr = fmt.get("abr")
+            return int(abr) if abr is not None else 0
+
+        return max(m4a_streams or audio_streams, key=get_bitrate)
+
+    def _validate_sample_range(
+        self, info_dict: dict, start_time: str, end_time: str
+    ) -> Tuple[int, int]:
+        """Check a sample range against the video and return it in seconds."""
+        video_duration_seconds = info_dict.get("duration")
+
+        start_seconds = self._time_str_to_seconds(start_time)
+        end_seconds = self._time_str_to_seconds(end_time)
+        duration = end_seconds - start_seconds
+
+        if video_duration_seconds is None:
+            raise ValueError("Cannot determine video duration. Might be a live stream.")
+        if start_seconds < 0 or end_seconds > video_duration_seconds or duration <= 0:
+            raise ValueError("Invalid start or end time.")
+        if duration > MAX_SAMPLE_DURATION_SECONDS:
+            raise ValueError(
+                "The sample duration cannot exceed "
+                f"{format_duration_limit(MAX_SAMPLE_DURATION_SECONDS)}."
+            )
+        return start_seconds, end_seconds
+
+    def _select_sample_formats(
+        self, info_dict: dict, format_id: Optional[str]
+    ) -> Tuple[dict, dict]:
+        """
+        Pick the video and audio formats to cut a sample from.
+
+        The requested format sets the resolution. At that height an H.264
+        format is preferred, since it can be stream-copied, and the swap is
+        logged.
+        """
+        with span("format_selection", format_id=format_id):
+            formats = info_dict.get("formats", [])
+            video_format = next(
+                (f for f in formats if f.get("format_id") == format_id), None
+            )
+            if not video_format:
+                raise ValueError(f"Video format ID {format_id} not found.")
+
+            if not is_mp4_video_codec(video_format.get("vcodec")):
+                same_height_mp4 = [
+                    f
+                    for f in formats
+                    if f.get("height") == video_format.get("height")
+                    and f.get("acodec") == "none"
+                    and is_mp4_video_codec(f.get("vcodec"))
+                    and f.get("protocol") not in ("m3u8", "m3u8_native")
+                ]
+                if same_height_mp4:
+                    requested_format = video_format
+                    video_format = max(same_height_mp4, key=lambda f: f.get("tbr") or 0)
+                    logger.info(
+                        "Cutting the sample from H.264 format %s instead of %s "
+                        "(%s), at the same height.",
+                        video_format.get("format_id"),
+                        format_id,
+                        requested_format.get("vcodec"),
+                    )
+
+            return video_format, self._select_best_audio_format(formats)
+
     # ---FORMATS---
 
     async def get_video_formats(
-        self, url: str, encoded_cookies: str | None = None
+        self,
+        url: str,
+        encoded_cookies: str | None = None,
+        user_id: Optional[str] = None,
     ) -> FormatsResponse:
         """Get video formats using yt-dlp."""
         if not is_valid_youtube_url(url):
             raise ValueError("Invalid YouTube URL")
 
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, self._get_formats_sync, url, encoded_cookies
+        return await self._scheduler.run_extraction(
+            user_id, self._get_formats_sync, url, encoded_cookies
         )
 
+    async def get_video_formats_batch(
+        self,
+        urls: list[str],
+        encoded_cookies: str | None = None,
+        user_id: Optional[str] = None,
+        max_concurrency: int = FORMATS_BATCH_CONCURRENCY,
+    ) -> list[FormatsBatchItem]:
+        """
+        Get the formats of several videos, at most `max_concurrency` at once.
+
+        Each URL gets its own result or error, in the order of `urls`.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def get_item(url: str) -> FormatsBatchItem:
+            if not is_valid_youtube_url(url):
+                return FormatsBatchItem(url=url, error="Invalid YouTube URL")
+            try:
+                async with semaphore:
+                    formats = await self._scheduler.run_extraction(
+                        user_id,
+                        self._get_formats_sync,
+                        url,
+                        encoded_cookies,
+                    )
+                return FormatsBatchItem(url=url, formats=formats)
+            except (ValueError, SchedulerFullError) as e:
+                return FormatsBatchItem(url=url, error=str(e))
+
+        # Undecodable cookies fail the whole batch, before any extraction.
+        if encoded_cookies:
+            self._cookie_jars.decode(encoded_cookies)
+        return list(await asyncio.gather(*(get_item(url) for url in urls)))
+
     def _get_formats_sync(  # noqa: C901
-        self, url: str, encoded_cookies: str | None = None
+        self,
+        url: str,
+        encoded_cookies: str | None = None,
     ) -> FormatsResponse:  # noqa: C901
         """Get video formats."""
         try:
@@ -207,118 +500,67 @@ class VideoService:
         url: str,
         format_id: Optional[str] = None,
         encoded_cookies: str | None = None,
+        user_id: Optional[str] = None,
+        progress: ProgressReporter = NO_PROGRESS,
     ) -> DownloadResult:
-        """Async wrapper for the download process."""
+        """Download a full video to a temporary file."""
         if not is_valid_youtube_url(url):
             raise ValueError("Invalid YouTube URL")
 
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, self._download_full_sync, url, format_id, encoded_cookies
-        )
+        cache_key = make_result_cache_key(url, format_id)
+        cached_result = await self._get_cached_result(cache_key)
+        if cached_result is not None:
+            return cached_result
 
-    def _download_full_sync(
-        self,
-        url: str,
-        format_id: Optional[str] = None,
-        encoded_cookies: str | None = None,
-    ) -> DownloadResult:
-        """Download a full video."""
         # 1. Get all video metadata without downloading.
-        info_dict = self._get_video_info(url, encoded_cookies=encoded_cookies)
+        info_dict = await self._scheduler.run_extraction(
+            user_id, self._get_video_info_reporting, url, encoded_cookies, progress
+        )
         video_title = info_dict.get("title", "Untitled")
-        formats = info_dict.get("formats", [])
-        video_duration_seconds = info_dict.get("duration")
-
-        if video_duration_seconds is None:
-            raise ValueError("Cannot determine video duration. Might be a live stream.")
 
-        if video_duration_seconds > 180:  # Limit to 3 minutes
-            raise ValueError("The video duration cannot exceed 3 minutes.")
-
-        # 2. Find the direct URL for the requested video format.
-        if format_id:
-            video_format = next(
-                (f for f in formats if f.get("format_id") == format_id), None
-            )
-            if not video_format:
-                raise ValueError(f"Format ID {format_id} not found.")
-        else:
-            # If no format_id is provided, we must select the best one.
-            video_only_formats = [
-                f
-                for f in formats
-                if f.get("vcodec") != "none" and f.get("acodec") == "none"
-            ]
-            if not video_only_formats:
-                raise ValueError("No suitable video-only format found for merging.")
-            # Select the one with the greatest height (resolution).
-            video_format = max(video_only_formats, key=lambda f: f.get("height", 0))
-
-        video_url = video_format.get("url")
-        resolution = video_format.get("resolution")
-        final_format_id = video_format.get("format_id")  # Use the determined format_id
-
-        # 3. Find the direct URL for the best audio format. (Same as optimal_sample)
-        audio_streams = [
-            f
-            for f in formats
-            if f.get("acodec") != "none" and f.get("vcodec") == "none"
-        ]
-        if not audio_streams:
-            raise ValueError("No compatible audio stream found to merge.")
-
-        def get_bitrate(fmt):
-            abr = fmt.get("abr")
-            return int(abr) if abr is not None else 0
+        # 2. Find the direct URLs for the video and best audio formats.
+        video_format, audio_format = self._select_full_download_formats(
+            info_dict, format_id
+        )
 
-        audio_streams.sort(key=lambda x: get_bitrate(x), reverse=True)
-        best_audio_url = audio_streams[0].get("url")
+        # 3. Only re-encode the tracks that cannot be copied into an MP4.
+        codec_args, video_processing, audio_processing = get_codec_args(
+            video_format.get("vcodec"), audio_format.get("acodec")
+        )
 
-        # 4. Construct the explicit ffmpeg command
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
+        # 4. Run ffmpeg straight into a temporary file, stdout is discarded.
+        with tempfile.NamedTemporaryFile(
+            suffix=".mp4", delete=False, dir=SCRATCH_DIR
+        ) as temp_file:
             output_path = temp_file.name
 
-        ffmpeg_command = [
-            "ffmpeg",
-            "-loglevel",
-            "error",
-            "-i",
-            video_url,
-            "-i",
-            best_audio_url,
-            "-map",
-            "0:v:0",
-            "-map",
-            "1:a:0",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "veryfast",
-            "-c:a",
-            "aac",
-            "-movflags",
-            "frag_keyframe+empty_moov",
-            "-f",
-            "mp4",
-            "pipe:1",
-            "-y",  # Overwrite output file if it exists
-            output_path,  # Direct output to our temporary file
-        ]
-
+        ffmpeg_command = build_merge_command(
+            video_format["url"], audio_format["url"], output_path, codec_args
+        )
+        progress.duration = info_dict.get("duration")
+        progress.publish("queued")
         try:
-            subprocess.run(ffmpeg_command, check=True, capture_output=True)
-        except subprocess.CalledProcessError as e:
-            # If ffmpeg fails, clean up the temp file before raising the error
+            async with self._scheduler.transcode_slot(user_id):
+                progress.publish("transcoding")
+                with span("download", video_processing=video_processing):
+                    await run_ffmpeg(ffmpeg_command, progress.ffmpeg_callback)
+        except BaseException as e:
+            # If ffmpeg fails or the request is cancelled, clean up the temp file
             if os.path.exists(output_path):
                 os.remove(output_path)
-            error_message = (
-                e.stderr.decode("utf-8") if e.stderr else "Unknown FFmpeg error"
-            )
-            raise ValueError(f"FFmpeg failed: {error_message}")
-
-        # --- Return the path and metadata instead of a buffer ---
-        return output_path, video_title, final_format_id, resolution
+            self._invalidate_info_on_failure(e, url, encoded_cookies)
+            raise
+
+        result = DownloadResult(
+            file_path=output_path,
+            video_title=video_title,
+            resolution=video_format.get("resolution"),
+            final_format_id=video_format["format_id"],
+            video_processing=video_processing,
+            audio_processing=audio_processing,
+        )
+        await self._cache_result(cache_key, result, info_dict, encoded_cookies)
+        return result
 
     # --- OPTIMAL VIDEO SAMPLE DOWNLOAD ---
     async def download_optimal_sample(
@@ -328,117 +570,373 @@ class VideoService:
         end_time: str,
         format_id: Optional[str] = None,
         encoded_cookies: str | None = None,
-    ) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
-        """Async wrapper for the OPTIMAL video sample download."""
+        user_id: Optional[str] = None,
+        progress: ProgressReporter = NO_PROGRESS,
+    ) -> DownloadResult:
+        """Cut a video sample to a temporary file."""
         if not is_valid_youtube_url(url):
             raise ValueError("Invalid YouTube URL")
 
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            self._download_optimal_sample_sync_to_file,
+        cache_key = make_result_cache_key(
             url,
-            start_time,
-            end_time,
             format_id,
-            encoded_cookies,
+            self._time_str_to_seconds(start_time),
+            self._time_str_to_seconds(end_time),
         )
+        cached_result = await self._get_cached_result(cache_key)
+        if cached_result is not None:
+            return cached_result
 
-    def _download_optimal_sample_sync_to_file(  # noqa: C901
+        info_dict = await self._scheduler.run_extraction(
+            user_id, self._get_video_info_reporting, url, encoded_cookies, progress
+        )
+        start_seconds, end_seconds = self._validate_sample_range(
+            info_dict, start_time, end_time
+        )
+        video_format, audio_format = self._select_sample_formats(info_dict, format_id)
+
+        with tempfile.NamedTemporaryFile(
+            suffix=".mp4", delete=False, dir=SCRATCH_DIR
+        ) as temp_file:
+            output_path = temp_file.name
+
+        progress.duration = end_seconds - start_seconds
+        progress.publish("queued")
+        try:
+            async with self._scheduler.transcode_slot(user_id):
+                progress.publish("transcoding")
+                with (
+                    span("transcode") as step,
+                    tempfile.TemporaryDirectory(dir=SCRATCH_DIR) as work_dir,
+                ):
+                    (
+                        command,
+                        video_processing,
+                        audio_processing,
+                    ) = await self._sample_cutter.build_command(
+                        video_format,
+                        audio_format,
+                        start_seconds,
+                        end_seconds,
+                        work_dir,
+                        output_path,
+                        functools.partial(
+                            self._scheduler.try_acquire_transcode_slots, user_id
+                        ),
+                    )
+                    step.set(video_processing=video_processing)
+                    await run_ffmpeg(command, progress.ffmpeg_callback)
+        except BaseException as e:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            self._invalidate_info_on_failure(e, url, encoded_cookies)
+            raise
+
+        result = DownloadResult(
+            file_path=output_path,
+            video_title=info_dict.get("title", "Unknown Title"),
+            resolution=video_format.get("resolution"),
+            final_format_id=video_format["format_id"],
+            video_processing=video_processing,
+            audio_processing=audio_processing,
+        )
+        await self._cache_result(cache_key, result, info_dict, encoded_cookies)
+        return result
+
+    # --- STREAMING DOWNLOADS ---
+    async def stream_full_video(
+        self,
+        url: str,
+        format_id: Optional[str] = None,
+        encoded_cookies: str | None = None,
+        user_id: Optional[str] = None,
+        progress: ProgressReporter = NO_PROGRESS,
+    ) -> Tuple[AsyncIterator[bytes], DownloadResult]:
+        """
+        Start a full download and return ffmpeg's output as it is produced.
+
+        Returns the byte stream along with the download metadata.
+        """
+        if not is_valid_youtube_url(url):
+            raise ValueError("Invalid YouTube URL")
+
+        info_dict = await self._scheduler.run_extraction(
+            user_id, self._get_video_info_reporting, url, encoded_cookies, progress
+        )
+        video_format, audio_format = self._select_full_download_formats(
+            info_dict, format_id
+        )
+        codec_args, video_processing, audio_processing = get_codec_args(
+            video_format.get("vcodec"), audio_format.get("acodec")
+        )
+        command = build_merge_command(
+            video_format["url"], audio_format["url"], "pipe:1", codec_args
+        )
+        progress.duration = info_dict.get("duration")
+        progress.publish("queued")
+        # The slot is held until the stream is exhausted or closed.
+        release_slot = await self._scheduler.acquire_transcode_slot(user_id)
+        progress.publish("transcoding")
+        step = span("download", video_processing=video_processing)
+        try:
+            stream = await stream_ffmpeg(command, on_progress=progress.ffmpeg_callback)
+        except BaseException as e:
+            release_slot()
+            step.finish(e)
+            self._invalidate_info_on_failure(e, url, encoded_cookies)
+            raise
+        stream = await start_generator(
+            self._stream_then_cleanup(stream, release_slot, progress, step)
+        )
+        return stream, DownloadResult(
+            video_title=info_dict.get("title", "Untitled"),
+            resolution=video_format.get("resolution"),
+            final_format_id=video_format["format_id"],
+            video_processing=video_processing,
+            audio_processing=audio_processing,
+        )
+
+    async def stream_sample(
         self,
         url: str,
         start_time: str,
         end_time: str,
-        video_format_id: Optional[str] = None,
+        format_id: Optional[str] = None,
         encoded_cookies: str | None = None,
-    ) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
-        """Download and trims video segment to a temporary file."""
-        info_dict = self._get_video_info(url, encoded_cookies=encoded_cookies)
-        video_title = info_dict.get("title", "Unknown Title")
-        formats = info_dict.get("formats", [])
-        video_duration_seconds = info_dict.get("duration")
+        user_id: Optional[str] = None,
+        progress: ProgressReporter = NO_PROGRESS,
+    ) -> Tuple[AsyncIterator[bytes], DownloadResult]:
+        """
+        Start a sample download and return ffmpeg's output as it is produced.
 
-        start_seconds = self._time_str_to_seconds(start_time)
-        end_seconds = self._time_str_to_seconds(end_time)
-        duration = end_seconds - start_seconds
+        The edges of the sample are prepared first, then the final mux is
+        streamed while it runs.
+        """
+        if not is_valid_youtube_url(url):
+            raise ValueError("Invalid YouTube URL")
 
-        if video_duration_seconds is None:
-            raise ValueError("Cannot determine video duration. Might be a live stream.")
-        if start_seconds < 0 or end_seconds > video_duration_seconds or duration <= 0:
-            raise ValueError("Invalid start or end time.")
-        if duration > 180:  # Limit sample duration to 3 minutes
-            raise ValueError("The sample duration cannot exceed 3 minutes.")
+        info_dict = await self._scheduler.run_extraction(
+            user_id, self._get_video_info_reporting, url, encoded_cookies, progress
+        )
+        start_seconds, end_seconds = self._validate_sample_range(
+            info_dict, start_time, end_time
+        )
+        video_format, audio_format = self._select_sample_formats(info_dict, format_id)
 
-        # 1. Get the resolution from the selected video format for the final response
-        video_format = next(
-            (f for f in formats if f.get("format_id") == video_format_id), None
+        progress.duration = end_seconds - start_seconds
+        progress.publish("queued")
+        release_slot = await self._scheduler.acquire_transcode_slot(user_id)
+        progress.publish("transcoding")
+        step = span("transcode")
+        work_dir = tempfile.mkdtemp(dir=SCRATCH_DIR)
+
+        def cleanup() -> None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            release_slot()
+
+        try:
+            (
+                command,
+                video_processing,
+                audio_processing,
+            ) = await self._sample_cutter.build_command(
+                video_format,
+                audio_format,
+                start_seconds,
+                end_seconds,
+                work_dir,
+                "pipe:1",
+                functools.partial(self._scheduler.try_acquire_transcode_slots, user_id),
+            )
+            step.set(video_processing=video_processing)
+            stream = await stream_ffmpeg(command, on_progress=progress.ffmpeg_callback)
+        except BaseException as e:
+            cleanup()
+            step.finish(e)
+            self._invalidate_info_on_failure(e, url, encoded_cookies)
+            raise
+
+        stream = await start_generator(
+            self._stream_then_cleanup(stream, cleanup, progress, step)
+        )
+        return stream, DownloadResult(
+            video_title=info_dict.get("title", "Unknown Title"),
+            resolution=video_format.get("resolution"),
+            final_format_id=video_format["format_id"],
+            video_processing=video_processing,
+            audio_processing=audio_processing,
         )
 
-        if not video_format:
-            raise ValueError(f"Video format ID {video_format_id} not found.")
+    async def stream_samples(
+        self,
+        url: str,
+        ranges: list[Tuple[str, str]],
+        format_id: Optional[str] = None,
+        output: SamplesOutput = "zip",
+        encoded_cookies: str | None = None,
+        user_id: Optional[str] = None,
+        progress: ProgressReporter = NO_PROGRESS,
+    ) -> Tuple[AsyncIterator[bytes], DownloadResult]:
+        """
+        Cut several samples of a video, and stream them as a zip or one MP4.
 
-        # We get the height to honor the user's resolution choice.
-        height = video_format.get("height")
-        resolution = video_format.get("resolution")
+        The video is extracted once and every sample is cut from the same
+        media URLs. Samples are cut one at a time on the transcode slot
+        held, and side by side on the extra slots free at that moment.
+        They are ready before the archive, or their concatenation, starts
+        streaming.
+        """
+        if not is_valid_youtube_url(url):
+            raise ValueError("Invalid YouTube URL")
 
-        # 2. Build a robust format selector for yt-dlp.
-        # Find the best MP4 video at this height and the best M4A audio.
-        # If that fails, find the best of any format and let ffmpeg convert it to MP4.
-        # More resilient than picking a specific format ID
-        format_selector = (
-            f"bestvideo[height={height}][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best"
+        info_dict = await self._scheduler.run_extraction(
+            user_id, self._get_video_info_reporting, url, encoded_cookies, progress
         )
+        seconds_ranges = [
+            self._validate_sample_range(info_dict, start_time, end_time)
+            for start_time, end_time in ranges
+        ]
+        total_seconds = sum(end - start for start, end in seconds_ranges)
+        if total_seconds > MAX_SAMPLES_TOTAL_SECONDS:
+            raise ValueError(
+                "The samples cannot exceed "
+                f"{format_duration_limit(MAX_SAMPLES_TOTAL_SECONDS)} in total."
+            )
+        video_format, audio_format = self._select_sample_formats(info_dict, format_id)
+        video_title = info_dict.get("title", "Unknown Title")
 
-        # 3. Create a temporary file path for yt-dlp to write to
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
-            output_path = temp_file.name
+        progress.duration = total_seconds
+        progress.publish("queued")
+        release_slot = await self._scheduler.acquire_transcode_slot(user_id)
+        progress.publish("transcoding")
+        step = span("transcode")
+        work_dir = tempfile.mkdtemp(dir=SCRATCH_DIR)
 
-        with self._get_cookie_file_path(encoded_cookies) as cookie_path:
-            # Step 5: Use the consistent helper to create the base options
-            ydl_opts = self._create_ydl_options(cookie_path)
-
-            # 4. Configure yt-dlp with smart selector.
-            ydl_opts.update(
-                {
-                    "format": format_selector,
-                    "download_ranges": yt_dlp.utils.download_range_func(
-                        None,
-                        [
-                            (
-                                self._time_str_to_seconds(start_time),
-                                self._time_str_to_seconds(end_time),
-                            )
-                        ],
+        clip_slot_releases = self._scheduler.try_acquire_transcode_slots(
+            user_id, min(SAMPLES_CUT_CONCURRENCY, len(seconds_ranges)) - 1
+        )
+
+        def release_clip_slots() -> None:
+            for release_clip_slot in clip_slot_releases:
+                release_clip_slot()
+
+        def cleanup() -> None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            release_clip_slots()
+            release_slot()
+
+        semaphore = asyncio.Semaphore(1 + len(clip_slot_releases))
+        clips_done = 0
+
+        async def cut_clip(
+            index: int, start_seconds: int, end_seconds: int
+        ) -> Tuple[str, ProcessingMode, ProcessingMode]:
+            nonlocal clips_done
+            clip_work_dir = os.path.join(work_dir, f"clip_{index}")
+            os.mkdir(clip_work_dir)
+            clip_path = os.path.join(work_dir, f"clip_{index}.mp4")
+            async with semaphore:
+                (
+                    command,
+                    video_processing,
+                    audio_processing,
+                ) = await self._sample_cutter.build_command(
+                    video_format,
+                    audio_format,
+                    start_seconds,
+                    end_seconds,
+                    clip_work_dir,
+                    clip_path,
+                    functools.partial(
+                        self._scheduler.try_acquire_transcode_slots, user_id
                     ),
-                    "outtmpl": output_path,
-                    "merge_output_format": "mp4",
-                    "overwrites": True,
-                }
+                )
+                await run_ffmpeg(command)
+            clips_done += 1
+            progress.publish(
+                "transcoding", clips_done=clips_done, clips_total=len(seconds_ranges)
             )
+            return clip_path, video_processing, audio_processing
 
-            # 5. Execute the download with error handling
-            try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    # Re-extract info with the new options to get the final format ID
-                    result_info = ydl.extract_info(url, download=True)
-                    # The format ID might be different from the one requested
-                    # As yt-dlp found the best working one.
-                    result_info.get("format_id")
-            except yt_dlp.utils.DownloadError as e:
-                if os.path.exists(output_path):
-                    os.remove(output_path)
-                # Check for the specific "not available" error
-                if "requested format is not available" in str(e).lower():
-                    raise ValueError(
-                        f"No working video format could be found for {resolution}."
+        try:
+            clips = await gather_or_cancel(
+                *(
+                    cut_clip(index, start, end)
+                    for index, (start, end) in enumerate(seconds_ranges)
+                )
+            )
+            release_clip_slots()
+            clip_paths = [clip_path for clip_path, _, _ in clips]
+            stream: AsyncIterator[bytes]
+            if output == "zip":
+                safe_title = sanitize_filename(video_title)
+                stream = stream_zip(
+                    (f"{safe_title}_{index + 1:02d}_{start}s-{end}s.mp4", clip_path)
+                    for index, ((start, end), clip_path) in enumerate(
+                        zip(seconds_ranges, clip_paths)
                     )
-                raise ValueError(
-                    f"yt-dlp failed to download or process the sample: {e}"
                 )
-            except Exception as e:
-                if os.path.exists(output_path):
-                    os.remove(output_path)
-                raise e
+            else:
+                concat_list_path = os.path.join(work_dir, "clips.txt")
+                write_concat_list(concat_list_path, clip_paths)
+                stream = await stream_ffmpeg(
+                    build_concat_command(concat_list_path, "pipe:1"),
+                    on_progress=progress.ffmpeg_callback,
+                )
+        except BaseException as e:
+            cleanup()
+            step.finish(e)
+            self._invalidate_info_on_failure(e, url, encoded_cookies)
+            raise
+
+        stream = await start_generator(
+            self._stream_then_cleanup(stream, cleanup, progress, step)
+        )
+        return stream, DownloadResult(
+            video_title=video_title,
+            resolution=video_format.get("resolution"),
+            final_format_id=video_format["format_id"],
+            video_processing=heaviest_processing_mode(mode for _, mode, _ in clips),
+            audio_processing=heaviest_processing_mode(mode for _, _, mode in clips),
+        )
 
-        # --- Return the path and metadata ---
-        return output_path, video_title, video_format_id, resolution
+    async def _stream_then_cleanup(
+        self,
+        stream: AsyncIterator[bytes],
+        cleanup: Callable[[], None],
+        progress: ProgressReporter = NO_PROGRESS,
+        step: Optional[Span] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Relay an ffmpeg stream, then run `cleanup` however it ends.
+
+        Must be started with `start_generator`, so that dropping it unread
+        also runs `cleanup`, which releases the transcode slot even if
+        closing the stream fails or is cancelled. The end of the stream is
+        also the end of the download's progress, and of the `step` span
+        producing it.
+        """
+        try:
+            yield b""  # Consumed by start_generator.
+            async for chunk in stream:
+                yield chunk
+            progress.finish()
+            if step is not None:
+                step.finish()
+        except (GeneratorExit, asyncio.CancelledError) as e:
+            progress.fail("The download was cancelled.")
+            if step is not None:
+                step.finish(e)
+            raise
+        except Exception as e:
+            # Headers are already sent, the error never reaches a handler.
+            record_error(e)
+            progress.fail(e)
+            if step is not None:
+                step.finish(e)
+            raise
+        finally:
+            try:
+                await cast(AsyncGenerator[bytes, None], stream).aclose()
+            finally:
+                cleanup()
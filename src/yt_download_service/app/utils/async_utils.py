@@ -0,0 +1,35 @@
+import asyncio
+from typing import AsyncGenerator, Awaitable, List, TypeVar
+
+T = TypeVar("T")
+
+
+async def gather_or_cancel(*awaitables: Awaitable[T]) -> List[T]:
+    """
+    Await all `awaitables` concurrently, like `asyncio.gather`.
+
+    If one fails, or the caller is cancelled, the others are cancelled
+    and awaited before the error propagates, so no ffmpeg is left running.
+    """
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def start_generator(
+    generator: AsyncGenerator[T, None],
+) -> AsyncGenerator[T, None]:
+    """
+    Run a generator up to its first `yield`, discarding the value.
+
+    A generator that never started does not run its `finally` blocks when
+    it is closed or garbage collected. Generators owning a process or a
+    scheduler slot yield once before their first value, and are started
+    before being handed out, so their cleanup runs however they end.
+    """
+    await anext(generator)
+    return generator
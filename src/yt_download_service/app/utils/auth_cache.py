@@ -0,0 +1,90 @@
+import hashlib
+import time
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from yt_download_service.app.utils.jwt_handler import decode_access_token
+from yt_download_service.app.utils.ttl_cache import TTLCache
+from yt_download_service.domain.models.user import UserRead
+from yt_download_service.settings import get_settings
+
+# Decoded tokens, and users, kept in memory.
+AUTH_CACHE_SIZE = get_settings().auth_cache_size
+# How long a user is served from memory. Changes made by other instances
+# are seen after at most this long.
+AUTH_USER_CACHE_TTL_SECONDS = get_settings().auth_user_cache_ttl_seconds
+
+# ("email", address) or ("id", user ID)
+UserCacheKey = Tuple[str, str]
+
+
+class AuthCache:
+    """
+    In-process cache of decoded access tokens and of authenticated users.
+
+    Tokens are keyed by their digest and kept until they expire, so a
+    cached token is never accepted past its `exp`. Users are kept for
+    `user_ttl` seconds under both their email and ID, and must be
+    invalidated when they are created or updated.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = AUTH_CACHE_SIZE,
+        user_ttl: float = AUTH_USER_CACHE_TTL_SECONDS,
+    ) -> None:
+        self._claims: TTLCache[str, Dict[str, Any]] = TTLCache(maxsize, 0)
+        self._users: TTLCache[UserCacheKey, UserRead] = TTLCache(maxsize, user_ttl)
+
+    def decode_token(self, token: str) -> Dict[str, Any]:
+        """
+        Return the claims of a token, decoding it on a miss.
+
+        Raises JWTError if the token is invalid or expired.
+        """
+        digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        claims = self._claims.get(digest)
+        if claims is not None:
+            return claims
+        claims = decode_access_token(token)
+        expires_at = claims.get("exp")
+        if isinstance(expires_at, (int, float)):
+            self._claims.set(digest, claims, ttl=expires_at - time.time())
+        return claims
+
+    def get_user_by_email(self, email: str) -> Optional[UserRead]:
+        """Return the cached user with this email, if any."""
+        return self._users.get(("email", email))
+
+    def get_user_by_id(self, user_id: UUID) -> Optional[UserRead]:
+        """Return the cached user with this ID, if any."""
+        return self._users.get(("id", str(user_id)))
+
+    def set_user(self, user: UserRead) -> None:
+        """Cache a user freshly read from the database."""
+        self._users.set(("email", user.email), user)
+        self._users.set(("id", str(user.id)), user)
+
+    def invalidate_user(
+        self, email: Optional[str] = None, user_id: Optional[UUID] = None
+    ) -> None:
+        """Forget a user, after it was created or changed."""
+        keys = []
+        if email is not None:
+            keys.append(("email", email))
+        if user_id is not None:
+            keys.append(("id", str(user_id)))
+        for key in keys:
+            user = self._users.pop(key)
+            if user is not None:
+                # The other key may be stale too, e.g. after an email change.
+                self._users.pop(("email", user.email))
+                self._users.pop(("id", str(user.id)))
+
+    def clear(self) -> None:
+        """Forget every token and user."""
+        self._claims.clear()
+        self._users.clear()
+
+
+auth_cache = AuthCache()
@@ -0,0 +1,58 @@
+import base64
+import hashlib
+import io
+from typing import Optional
+
+from yt_download_service.app.utils.ttl_cache import TTLCache
+from yt_download_service.settings import get_settings
+
+# Decoded cookie jars kept in memory, one per distinct X-Youtube-Cookies.
+COOKIE_JAR_CACHE_SIZE = get_settings().cookie_jar_cache_size
+# How long a jar is kept after its last use.
+COOKIE_JAR_TTL_SECONDS = get_settings().cookie_jar_ttl_seconds
+
+
+def cookie_jar_key(encoded_cookies: str) -> str:
+    """Return the digest identifying the jar sent in a header."""
+    return hashlib.sha256(encoded_cookies.encode("utf-8")).hexdigest()
+
+
+class CookieJarCache:
+    """
+    In-memory cache of the cookie jars sent in `X-Youtube-Cookies`.
+
+    Jars are keyed by the digest of the header, so the raw cookies never
+    serve as a key, and decoded once instead of on every extraction.
+    Each use gets its own in-memory file: yt-dlp rewrites its cookie file
+    when it closes, which would race between concurrent extractions on a
+    shared file. Nothing is written to disk, so nothing is left behind.
+    """
+
+    def __init__(
+        self, maxsize: int = COOKIE_JAR_CACHE_SIZE, ttl: float = COOKIE_JAR_TTL_SECONDS
+    ) -> None:
+        self._jars: TTLCache[str, str] = TTLCache(maxsize, ttl)
+
+    def decode(self, encoded_cookies: str) -> str:
+        """
+        Return the Netscape cookie file sent base64-encoded in the header.
+
+        Raises ValueError if the header is not valid base64 or UTF-8.
+        """
+        digest = cookie_jar_key(encoded_cookies)
+        jar = self._jars.get(digest)
+        if jar is None:
+            jar = base64.b64decode(encoded_cookies).decode("utf-8")
+        # Set again on every use, so that jars in use do not expire.
+        self._jars.set(digest, jar)
+        return jar
+
+    def open(self, encoded_cookies: Optional[str]) -> Optional[io.StringIO]:
+        """Return a private file holding the jar, for yt-dlp's `cookiefile`."""
+        if not encoded_cookies:
+            return None
+        return io.StringIO(self.decode(encoded_cookies))
+
+    def clear(self) -> None:
+        """Forget every jar."""
+        self._jars.clear()
@@ -1,15 +1,24 @@
+from typing import TYPE_CHECKING
+
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError
 from pydantic import ValidationError
-from sqlalchemy.ext.asyncio import AsyncSession
+
 from yt_download_service.app.interfaces.user_service import IUserService
 from yt_download_service.app.use_cases.auth_service import AuthService
-from yt_download_service.app.utils.jwt_handler import decode_access_token
+from yt_download_service.app.utils.auth_cache import auth_cache
+from yt_download_service.app.utils.lazy_import import lazy_import
+from yt_download_service.app.utils.tracing import span
 from yt_download_service.domain.models.user import UserRead
 from yt_download_service.infrastructure.database.session import get_db_session
 from yt_download_service.infrastructure.services.user_service import UserService
 
+if TYPE_CHECKING:
+    from jose import exceptions as jose_exceptions
+    from sqlalchemy.ext.asyncio import AsyncSession
+else:
+    jose_exceptions = lazy_import("jose.exceptions")
+
 
 async def get_current_user(request: Request) -> UserRead:
     """
@@ -41,7 +50,7 @@ user_service = UserService()
 
 async def get_current_user_from_token(
     auth_credentials: HTTPAuthorizationCredentials | None = Depends(security_scheme),
-    db: AsyncSession = Depends(get_db_session),
+    db: "AsyncSession" = Depends(get_db_session),
 ) -> UserRead:
     """Get the current user from a JWT token in the Authorization header."""
     credentials_exception = HTTPException(
@@ -57,19 +66,20 @@ async def get_current_user_from_token(
     # 2. The token is in the `credentials` attribute
     token = auth_credentials.credentials
 
-    try:
-        payload = decode_access_token(token)
-        email: str | None = payload.get("sub")
-        if email is None:
+    with span("auth_lookup"):
+        try:
+            payload = auth_cache.decode_token(token)
+            email: str | None = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+        except jose_exceptions.JWTError:
+            # This catches invalid signature, expired token, etc.
             raise credentials_exception
-    except JWTError:
-        # This catches invalid signature, expired token, etc.
-        raise credentials_exception
 
-    user = await user_service.get_by_email(db, email=email)
-    if user is None:
-        # This catches the case where the user from a valid token was deleted
-        raise credentials_exception
+        user = await user_service.get_by_email(db, email=email)
+        if user is None:
+            # This catches the case where the user from a valid token was deleted
+            raise credentials_exception
 
     return user
 
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import re
+import signal
+import time
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, Optional, cast
+
+from yt_download_service.app.utils.async_utils import start_generator
+from yt_download_service.app.utils.metrics import FFMPEG_ACTIVE, FFMPEG_SECONDS
+
+# Size of the reads from ffmpeg's stdout when streaming to the client.
+STREAM_CHUNK_SIZE = 64 * 1024
+# Only the tail of stderr is kept, to build error messages.
+STDERR_MAX_LINES = 50
+STDERR_MAX_LINE_LENGTH = 1024
+_STDERR_READ_SIZE = 4096
+# How long a killed process gets to be reaped, before it is given up on.
+KILL_TIMEOUT_SECONDS = 5.0
+
+ProgressCallback = Callable[[Dict[str, str]], None]
+
+# Lines of ffmpeg's `-progress` output, e.g. "out_time_us=1500000".
+_PROGRESS_LINE_PATTERN = re.compile(r"^([a-z_0-9]+)=(.*)$")
+
+
+class FFmpegError(RuntimeError):
+    """
+    Raised when ffmpeg exits with a non-zero status.
+
+    Not a ValueError: the request was valid, processing it failed, which
+    the controllers answer with a 502 rather than a 400.
+    """
+
+
+class FFmpegProcess:
+    """
+    A running ffmpeg process whose memory footprint stays bounded.
+
+    stdout is either discarded or read incrementally by the caller, and
+    stderr is drained into a small ring buffer of its last lines. When
+    ffmpeg reports its progress on stderr, each block of progress lines is
+    handed to `on_progress` instead.
+    """
+
+    def __init__(
+        self,
+        process: asyncio.subprocess.Process,
+        on_progress: Optional[ProgressCallback] = None,
+        program: str = "ffmpeg",
+    ) -> None:
+        self.process = process
+        self.on_progress = on_progress
+        self.program = program
+        self._started_at = time.perf_counter()
+        self._reaped = False
+        FFMPEG_ACTIVE.inc(program=program)
+        self.stderr_tail: deque[str] = deque(maxlen=STDERR_MAX_LINES)
+        self._progress_block: Dict[str, str] = {}
+        self._stderr_task = asyncio.create_task(
+            self._drain_stderr(cast(asyncio.StreamReader, process.stderr))
+        )
+
+    @classmethod
+    async def start(
+        cls,
+        command: list[str],
+        capture_stdout: bool = False,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> "FFmpegProcess":
+        """
+        Start ffmpeg, piping stdout only if the caller wants to read it.
+
+        With `on_progress`, ffmpeg is asked to report its progress on
+        stderr, since stdout may carry the output.
+        """
+        if on_progress is not None:
+            command = [command[0], "-progress", "pipe:2", "-nostats", *command[1:]]
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=(
+                asyncio.subprocess.PIPE
+                if capture_stdout
+                else asyncio.subprocess.DEVNULL
+            ),
+            stderr=asyncio.subprocess.PIPE,
+        )
+        return cls(process, on_progress, os.path.basename(command[0]))
+
+    async def _drain_stderr(self, stderr: asyncio.StreamReader) -> None:
+        """Read stderr until EOF, keeping only its last lines."""
+        pending = b""
+        while chunk := await stderr.read(_STDERR_READ_SIZE):
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()[-STDERR_MAX_LINE_LENGTH:]
+            for line in lines:
+                self._on_stderr_line(line)
+        if pending:
+            self._on_stderr_line(pending)
+
+    def _on_stderr_line(self, line: bytes) -> None:
+        text = line[:STDERR_MAX_LINE_LENGTH].decode("utf-8", errors="replace")
+        if self.on_progress is not None:
+            progress_match = _PROGRESS_LINE_PATTERN.match(text.strip())
+            if progress_match:
+                key, value = progress_match.groups()
+                self._progress_block[key] = value.strip()
+                # "progress=continue|end" closes each block.
+                if key == "progress":
+                    self.on_progress(self._progress_block)
+                    self._progress_block = {}
+                return
+        if text.strip():
+            self.stderr_tail.append(text.rstrip())
+
+    @property
+    def error_message(self) -> str:
+        """Return the captured end of stderr, or how the process exited."""
+        if self.stderr_tail:
+            return "\n".join(self.stderr_tail)
+        return_code = self.process.returncode
+        if return_code is not None and return_code < 0:
+            try:
+                signal_name = signal.Signals(-return_code).name
+            except ValueError:
+                signal_name = f"signal {-return_code}"
+            return (
+                f"{self.program} was killed by {signal_name} (exit code {return_code})"
+            )
+        return f"{self.program} exited with code {return_code} and no error output"
+
+    async def iter_stdout(
+        self, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """Yield stdout chunks as ffmpeg produces them."""
+        stdout = cast(asyncio.StreamReader, self.process.stdout)
+        while chunk := await stdout.read(chunk_size):
+            yield chunk
+
+    async def wait(self) -> None:
+        """Wait for ffmpeg to exit, raising FFmpegError on failure."""
+        return_code = await self.process.wait()
+        await self._stderr_task
+        if return_code != 0:
+            raise FFmpegError(f"FFmpeg failed: {self.error_message}")
+
+    async def _discard_stdout(self) -> None:
+        """Read stdout to EOF, throwing the data away."""
+        stdout = self.process.stdout
+        if stdout is not None:
+            while await stdout.read(STREAM_CHUNK_SIZE):
+                pass
+
+    async def kill(self, timeout: float = KILL_TIMEOUT_SECONDS) -> None:
+        """
+        Kill ffmpeg if it is still running and reap it.
+
+        The process only counts as exited once its pipes reach EOF, which
+        a stdout left unread never does, so what is left of it is read
+        and discarded. Waits at most `timeout` seconds, and the process
+        stops being counted as active whatever happens.
+        """
+        try:
+            if self.process.returncode is None:
+                self.process.kill()
+            await asyncio.wait_for(
+                asyncio.gather(self._discard_stdout(), self.process.wait()),
+                timeout,
+            )
+        except (ProcessLookupError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._stderr_task.cancel()
+            if not self._reaped:
+                self._reaped = True
+                FFMPEG_ACTIVE.dec(program=self.program)
+                FFMPEG_SECONDS.observe(
+                    time.perf_counter() - self._started_at, program=self.program
+                )
+
+
+async def run_ffmpeg(
+    command: list[str], on_progress: Optional[ProgressCallback] = None
+) -> None:
+    """
+    Run an ffmpeg command that writes its output to a file.
+
+    stdout is discarded. If the awaiting task is cancelled, e.g. because
+    the client went away, ffmpeg is killed.
+    """
+    ffmpeg = await FFmpegProcess.start(command, on_progress=on_progress)
+    try:
+        await ffmpeg.wait()
+    finally:
+        await ffmpeg.kill()
+
+
+async def stream_ffmpeg(
+    command: list[str],
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    on_progress: Optional[ProgressCallback] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Start an ffmpeg command writing to `pipe:1` and return its output stream.
+
+    The first chunk is awaited here, so a failing command raises before
+    any response header is sent. Closing the iterator early, e.g. when
+    the client disconnects, or dropping it unread, kills ffmpeg.
+    """
+    ffmpeg = await FFmpegProcess.start(
+        command, capture_stdout=True, on_progress=on_progress
+    )
+    chunks = ffmpeg.iter_stdout(chunk_size)
+    try:
+        first_chunk: Optional[bytes] = await anext(chunks, None)
+        if first_chunk is None:
+            await ffmpeg.wait()
+            raise FFmpegError("FFmpeg failed: no output was produced")
+    except BaseException:
+        await ffmpeg.kill()
+        raise
+
+    async def iterate() -> AsyncGenerator[bytes, None]:
+        try:
+            yield b""  # Consumed by start_generator.
+            yield cast(bytes, first_chunk)
+            async for chunk in chunks:
+                yield chunk
+            await ffmpeg.wait()
+        finally:
+            await ffmpeg.kill()
+
+    return await start_generator(iterate())
+
+
+async def run_ffprobe(command: list[str]) -> str:
+    """Run an ffprobe command and return its (small) stdout as text."""
+    ffprobe = await FFmpegProcess.start(command, capture_stdout=True)
+    try:
+        output = b"".join([chunk async for chunk in ffprobe.iter_stdout()])
+        await ffprobe.wait()
+    finally:
+        await ffprobe.kill()
+    return output.decode("utf-8", errors="replace")
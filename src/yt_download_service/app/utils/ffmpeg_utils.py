@@ -0,0 +1,163 @@
+from typing import Iterable, Literal, Optional, Tuple
+
+from yt_download_service.settings import get_settings
+
+ProcessingMode = Literal["copy", "transcode", "smart_cut"]
+
+# x264 speed/quality trade-off of every encode.
+FFMPEG_PRESET = get_settings().ffmpeg_preset
+# Threads of each encode, 0 lets ffmpeg decide.
+FFMPEG_THREADS = get_settings().ffmpeg_threads
+
+# From cheapest to most expensive, to summarize several clips.
+_PROCESSING_COST = {"copy": 0, "smart_cut": 1, "transcode": 2}
+
+# H.264 and AAC are what the transcoding path produces, so copying them
+# keeps the output playable everywhere the transcoded file was.
+MP4_VIDEO_CODEC_PREFIXES = ("avc1", "avc3", "h264")
+MP4_AUDIO_CODEC_PREFIXES = ("mp4a", "aac")
+
+# profile_idc found in "avc1.PPCCLL" codec strings, mapped to x264 profiles.
+_H264_PROFILES = {"42": "baseline", "4d": "main", "64": "high"}
+
+
+def is_mp4_video_codec(vcodec: Optional[str]) -> bool:
+    """Check whether a yt-dlp `vcodec` can be copied as is into an MP4."""
+    return vcodec is not None and vcodec.lower().startswith(MP4_VIDEO_CODEC_PREFIXES)
+
+
+def is_mp4_audio_codec(acodec: Optional[str]) -> bool:
+    """Check whether a yt-dlp `acodec` can be copied as is into an MP4."""
+    return acodec is not None and acodec.lower().startswith(MP4_AUDIO_CODEC_PREFIXES)
+
+
+def get_h264_profile(vcodec: Optional[str]) -> str:
+    """Return the x264 profile matching an "avc1.PPCCLL" codec string."""
+    if vcodec and "." in vcodec:
+        profile_idc = vcodec.split(".", 1)[1][:2].lower()
+        return _H264_PROFILES.get(profile_idc, "high")
+    return "high"
+
+
+def x264_threads_args(threads: int) -> list[str]:
+    """Build the arguments limiting an encode to `threads` threads, 0 for auto."""
+    return ["-threads", str(threads)] if threads > 0 else []
+
+
+def get_codec_args(
+    vcodec: Optional[str],
+    acodec: Optional[str],
+    preset: str = FFMPEG_PRESET,
+    threads: int = FFMPEG_THREADS,
+) -> Tuple[list[str], ProcessingMode, ProcessingMode]:
+    """
+    Build the ffmpeg codec arguments for merging two streams into an MP4.
+
+    Each track is stream-copied when its codec is MP4 compatible and
+    re-encoded otherwise.
+
+    Returns
+    -------
+        The ffmpeg arguments, then the processing mode of the video and
+        of the audio track.
+
+    """
+    video_mode: ProcessingMode = "copy" if is_mp4_video_codec(vcodec) else "transcode"
+    audio_mode: ProcessingMode = "copy" if is_mp4_audio_codec(acodec) else "transcode"
+
+    if video_mode == "copy" and audio_mode == "copy":
+        return ["-c", "copy"], video_mode, audio_mode
+
+    args = (
+        ["-c:v", "copy"]
+        if video_mode == "copy"
+        else ["-c:v", "libx264", "-preset", preset, *x264_threads_args(threads)]
+    )
+    args += ["-c:a", "copy"] if audio_mode == "copy" else ["-c:a", "aac"]
+    return args, video_mode, audio_mode
+
+
+def heaviest_processing_mode(modes: Iterable[ProcessingMode]) -> ProcessingMode:
+    """Return the most expensive of several processing modes."""
+    return max(modes, key=_PROCESSING_COST.__getitem__)
+
+
+def format_seconds(seconds: float) -> str:
+    """Format a timestamp for ffmpeg with millisecond precision."""
+    return f"{seconds:.3f}"
+
+
+def build_merge_command(
+    video_url: str,
+    audio_url: str,
+    output: str,
+    codec_args: Optional[list[str]] = None,
+    start_seconds: Optional[float] = None,
+    duration: Optional[float] = None,
+) -> list[str]:
+    """
+    Build the ffmpeg command merging a video and an audio stream to MP4.
+
+    Both tracks are re-encoded unless `codec_args` says otherwise.
+    When `start_seconds` is given, both inputs are fast-seeked before
+    being opened, and `duration` limits the length of the output.
+    """
+    if codec_args is None:
+        codec_args, _, _ = get_codec_args(None, None)
+    seek = ["-ss", format_seconds(start_seconds)] if start_seconds is not None else []
+    command = ["ffmpeg", "-y", "-loglevel", "error"]
+    command += [*seek, "-i", video_url, *seek, "-i", audio_url]
+    if duration is not None:
+        command += ["-t", format_seconds(duration)]
+    command += [
+        "-map",
+        "0:v:0",
+        "-map",
+        "1:a:0",
+        *codec_args,
+        # Fragmented MP4 can be written to a pipe and played while received
+        "-movflags",
+        "frag_keyframe+empty_moov",
+        "-f",
+        "mp4",
+        output,
+    ]
+    return command
+
+
+def write_concat_list(path: str, files: Iterable[str]) -> None:
+    """Write the file list read by ffmpeg's concat demuxer."""
+    with open(path, "w", encoding="utf-8") as concat_list:
+        concat_list.writelines(f"file '{file}'\n" for file in files)
+
+
+def concat_input_args(concat_list_path: str) -> list[str]:
+    """Build the input arguments reading the files of a concat list in turn."""
+    return ["-f", "concat", "-safe", "0", "-i", concat_list_path]
+
+
+def build_concat_command(concat_list_path: str, output: str) -> list[str]:
+    """
+    Build the ffmpeg command joining MP4 files without re-encoding.
+
+    The files must share their codecs, and carry their H.264 parameter
+    sets in-band, as the samples cut by this service do.
+    """
+    return [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        *concat_input_args(concat_list_path),
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0",
+        "-c",
+        "copy",
+        "-movflags",
+        "frag_keyframe+empty_moov",
+        "-f",
+        "mp4",
+        output,
+    ]
@@ -0,0 +1,132 @@
+import hashlib
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, cast
+from urllib.parse import parse_qs, urlparse
+
+from yt_download_service.app.utils.ttl_cache import TTLCache
+from yt_download_service.app.utils.video_utils import extract_video_id
+
+InfoCacheKey = Tuple[str, Optional[str]]
+
+# Some googlevideo URLs (e.g. DASH manifests) carry the expiry in the path.
+_PATH_EXPIRE_PATTERN = re.compile(r"/expire/(\d+)")
+
+
+def make_info_cache_key(url: str, encoded_cookies: str | None = None) -> InfoCacheKey:
+    """
+    Build the cache key for a video URL.
+
+    The key is the canonical video ID plus a digest of the cookies, so
+    anonymous and cookie-bearing results never share an entry.
+    """
+    video_id = extract_video_id(url) or url
+    cookies_digest = (
+        hashlib.sha256(encoded_cookies.encode("utf-8")).hexdigest()
+        if encoded_cookies
+        else None
+    )
+    return video_id, cookies_digest
+
+
+def get_media_urls_expiry(info_dict: Dict[str, Any]) -> float | None:
+    """Return the earliest `expire` timestamp of the resolved media URLs."""
+    expiries = []
+    for fmt in info_dict.get("formats") or []:
+        media_url = fmt.get("url")
+        if not media_url:
+            continue
+        parsed = urlparse(media_url)
+        expire = parse_qs(parsed.query).get("expire", [None])[0]
+        if expire is None:
+            path_match = _PATH_EXPIRE_PATTERN.search(parsed.path)
+            expire = path_match.group(1) if path_match else None
+        if expire and expire.isdigit():
+            expiries.append(float(expire))
+    return min(expiries) if expiries else None
+
+
+class _Flight:
+    """An extraction in progress, shared by every caller asking for the same key."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Dict[str, Any] | None = None
+        self.error: BaseException | None = None
+
+
+class VideoInfoCache:
+    """
+    In-process cache of yt-dlp info dicts.
+
+    Entries live until shortly before the resolved media URLs expire, and
+    concurrent misses for the same key share a single extraction.
+    Cached info dicts are shared between callers and must be treated as
+    read-only.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        default_ttl: float = 300,
+        max_ttl: float = 3 * 3600,
+        expiry_margin: float = 600,
+    ) -> None:
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self.expiry_margin = expiry_margin
+        self._cache: TTLCache[InfoCacheKey, Dict[str, Any]] = TTLCache(
+            maxsize, default_ttl
+        )
+        self._flights: Dict[InfoCacheKey, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _ttl_for(self, info_dict: Dict[str, Any]) -> float:
+        """Compute how long an info dict can be served from the cache."""
+        expiry = get_media_urls_expiry(info_dict)
+        if expiry is None:
+            return self.default_ttl
+        return min(expiry - time.time() - self.expiry_margin, self.max_ttl)
+
+    def get_or_extract(
+        self, key: InfoCacheKey, extract: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Return the cached info dict for `key`, extracting it on a miss."""
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            # A flight may have landed between the lookup above and the lock.
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return cast(Dict[str, Any], flight.result)
+
+        try:
+            info_dict = extract()
+            self._cache.set(key, info_dict, ttl=self._ttl_for(info_dict))
+            flight.result = info_dict
+            return info_dict
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key: InfoCacheKey) -> None:
+        """Drop a cached entry, e.g. after its media URLs were rejected."""
+        self._cache.pop(key)
@@ -1,14 +1,21 @@
 import os
 from datetime import datetime, timedelta, timezone
-from typing import Any, cast
+from typing import TYPE_CHECKING, Any, cast
 
-from jose import JWTError, jwt
 from pydantic import BaseModel
 
+from yt_download_service.app.utils.lazy_import import lazy_import
+from yt_download_service.settings import get_settings
+
+if TYPE_CHECKING:
+    from jose import jwt
+else:
+    jwt = lazy_import("jose.jwt")
+
 # --- Configuration ---
 SECRET_KEY = os.getenv("SECRET_KEY", "fallback-dev-secret-key")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = get_settings().access_token_expire_minutes
 
 
 class TokenResponse(BaseModel):
@@ -38,9 +45,4 @@ def decode_access_token(token: str) -> dict[str, Any]:
 
     Raises JWTError if the token is invalid or expired.
     """
-    try:
-        return cast(
-            dict[str, Any], jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        )
-    except JWTError as e:
-        raise e
+    return cast(dict[str, Any], jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]))
@@ -0,0 +1,35 @@
+import importlib
+from types import ModuleType
+from typing import Any, List
+
+# Modules imported lazily, in the order they were declared.
+LAZY_MODULES: List[str] = []
+
+
+class _LazyModule(ModuleType):
+    """Stand-in for a module, importing it on first attribute access."""
+
+    def __getattr__(self, name: str) -> Any:
+        """Return an attribute of the real module, importing it if needed."""
+        # Always delegated rather than cached, so that patching the real
+        # module is seen. After the first import this is a dict lookup.
+        return getattr(importlib.import_module(self.__name__), name)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return a module that is only imported once one of its attributes is used.
+
+    Keeps heavy dependencies out of the import of the application, so the
+    process starts serving sooner. The warm-up imports them right after
+    with `preload_lazy_modules`. Importing is thread-safe, so the first
+    access may come from any thread.
+    """
+    LAZY_MODULES.append(name)
+    return _LazyModule(name)
+
+
+def preload_lazy_modules() -> None:
+    """Import every lazily imported module now."""
+    for name in LAZY_MODULES:
+        importlib.import_module(name)
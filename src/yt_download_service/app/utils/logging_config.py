@@ -0,0 +1,136 @@
+import copy
+import datetime
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from yt_download_service.app.utils.tracing import RequestIdFilter
+from yt_download_service.settings import get_settings
+
+# Level of every logger without its own level.
+LOG_LEVEL = get_settings().log_level
+# Per-logger levels, e.g. "sqlalchemy.engine=INFO,yt_download_service.span=DEBUG".
+# SQL statements are logged by `sqlalchemy.engine` at INFO, spans by
+# `yt_download_service.span.<name>`.
+LOG_LEVELS = get_settings().log_levels
+
+# Loggers quieter than LOG_LEVEL unless LOG_LEVELS says otherwise.
+_DEFAULT_LEVELS = {"sqlalchemy.engine": "WARNING", "uvicorn.access": "WARNING"}
+
+# Attributes every LogRecord has, anything else was passed through `extra`.
+_RECORD_ATTRIBUTES = {
+    *logging.LogRecord("", 0, "", 0, "", (), None).__dict__,
+    "message",
+    "asctime",
+    "request_id",
+    "taskName",
+}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Serialize the record along with its `extra` fields."""
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps the `extra` fields of records.
+
+    The stock handler merges the traceback into the message, this one
+    only renders what cannot cross threads: the message arguments and the
+    traceback, kept as text.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Return a copy of the record that is safe to format later."""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_log_levels(spec: str) -> Dict[str, str]:
+    """Parse a "logger=LEVEL,other.logger=LEVEL" list of levels."""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(
+    level: str = LOG_LEVEL, levels: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    Send all logs as JSON lines to stderr, without blocking the caller.
+
+    Records are put on a queue and written by a background thread, so a
+    slow terminal or log collector never stalls the event loop. The
+    request ID is attached before the record leaves the caller's context.
+    Safe to call more than once, the previous setup is replaced.
+    """
+    global _listener
+    stop_logging()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    queue_handler = _StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    all_levels = {**_DEFAULT_LEVELS, **parse_log_levels(LOG_LEVELS)}
+    all_levels.update(levels or {})
+    for name, logger_level in all_levels.items():
+        logging.getLogger(name).setLevel(logger_level)
+    # Uvicorn's loggers have their own handlers, route them through ours.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Write out the queued records and stop the background thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
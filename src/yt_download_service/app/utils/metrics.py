@@ -0,0 +1,434 @@
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Tuple
+
+# Seconds, from a cached lookup up to a long full download.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+_PATH_PARAM_PATTERN = re.compile(r"{(\w+)(?::\w+)?}")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base of the metric types: a name, help text and label names."""
+
+    kind = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        # Observations come from worker threads as well as the event loop.
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Return the `(name suffix, labels, value)` samples to expose."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. a number of bytes served."""
+
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Add `amount` to the counter of the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Return one sample per set of labels."""
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            ("_total", _format_labels(self.labelnames, key), value)
+            for key, value in sorted(values)
+        ]
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down.
+
+    Gauges are either set by the code, or read from a callback returning
+    the value of each set of labels when the metrics are rendered.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        callback: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Add `amount` to the gauge of the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        """Subtract `amount` from the gauge of the given labels."""
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge of the given labels to `value`."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_callback(self, callback: Callable[[], Dict[LabelValues, float]]) -> None:
+        """Read the gauge from `callback` from now on."""
+        self._callback = callback
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Return one sample per set of labels."""
+        if self._callback is not None:
+            values = list(self._callback().items())
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [
+            ("", _format_labels(self.labelnames, key), value)
+            for key, value in sorted(values)
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, e.g. durations, in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> (count per bucket, sum of the observations)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation for the given labels."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Generator[None, None, None]:
+        """Observe how long the `with` block takes, even when it raises."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Return the buckets, sum and count of each set of labels."""
+        with self._lock:
+            values = [
+                (key, (list(counts), total))
+                for key, (counts, total) in self._values.items()
+            ]
+        samples = []
+        for key, (counts, total) in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    (*self.labelnames, "le"), (*key, _format_value(bound))
+                )
+                samples.append(("_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    The set of metrics exposed by the `/metrics` endpoint.
+
+    Metrics live in the memory of the process. Under several workers each
+    one has its own, and `/metrics` shows whichever worker answered, so
+    run one worker per container and let Prometheus scrape each of them.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        """Expose a metric, rejecting duplicate names."""
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()
+    ) -> Counter:
+        """Create and register a counter."""
+        metric = Counter(name, documentation, labelnames)
+        self.register(metric)
+        return metric
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()
+    ) -> Gauge:
+        """Create and register a gauge."""
+        metric = Gauge(name, documentation, labelnames)
+        self.register(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Create and register a histogram."""
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.register(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+EXTRACTION_SECONDS = REGISTRY.histogram(
+    "ytds_extraction_duration_seconds",
+    "Time spent extracting video metadata with yt-dlp, cache misses only.",
+)
+FFMPEG_SECONDS = REGISTRY.histogram(
+    "ytds_ffmpeg_duration_seconds",
+    "Lifetime of ffmpeg and ffprobe processes.",
+    ("program",),
+)
+FFMPEG_ACTIVE = REGISTRY.gauge(
+    "ytds_ffmpeg_active_processes",
+    "ffmpeg and ffprobe processes currently running.",
+    ("program",),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "ytds_http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ("method", "route", "status"),
+)
+BYTES_SERVED = REGISTRY.counter(
+    "ytds_http_response_bytes",
+    "Bytes of response bodies sent to clients.",
+    ("route",),
+)
+ERRORS = REGISTRY.counter(
+    "ytds_errors",
+    "Failed requests, streams and jobs, by exception type.",
+    ("type",),
+)
+SCHEDULER_QUEUED = REGISTRY.gauge(
+    "ytds_scheduler_queued_requests",
+    "Requests waiting for a scheduler slot.",
+    ("pool",),
+)
+SCHEDULER_ACTIVE = REGISTRY.gauge(
+    "ytds_scheduler_active_slots",
+    "Scheduler slots currently held.",
+    ("pool",),
+)
+DB_POOL_CONNECTIONS = REGISTRY.gauge(
+    "ytds_db_pool_connections",
+    "Database pool connections, by state.",
+    ("state",),
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+    "ytds_startup_seconds",
+    "Time from the process start to each startup milestone: imported, "
+    "ready and first_request.",
+    ("milestone",),
+)
+
+# Routes polled by orchestrators and scrapers, not by users.
+_PROBE_ROUTES = {"/health", "/ready", "/metrics"}
+_first_request_served = False
+
+
+def _process_age() -> float:
+    """
+    Return how long ago the process started, 0 if unknown.
+
+    Read from /proc on Linux, so that starting the interpreter and
+    importing the application count too.
+    """
+    try:
+        with open("/proc/self/stat") as stat_file:
+            stat = stat_file.read()
+        # Fields after the command name, which may contain spaces.
+        fields = stat[stat.rindex(")") + 2 :].split()
+        started_at = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return max(time.clock_gettime(time.CLOCK_BOOTTIME) - started_at, 0.0)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+
+_PROCESS_STARTED_AT = time.perf_counter() - _process_age()
+
+
+def process_uptime() -> float:
+    """Return the seconds since the process started."""
+    return time.perf_counter() - _PROCESS_STARTED_AT
+
+
+def record_startup_milestone(milestone: str) -> None:
+    """Record how long after the process start a milestone was reached."""
+    STARTUP_SECONDS.set(process_uptime(), milestone=milestone)
+
+
+def record_error(error: BaseException) -> None:
+    """Count a failure under the name of its exception type."""
+    ERRORS.inc(type=type(error).__name__)
+
+
+def _route_label(scope: dict) -> str:
+    """Return the template of the route that handled a request."""
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Routes of included routers only know their path below the router's
+    # prefix, which is found back from the request path.
+    path_params = scope.get("path_params", {})
+    route_path = str(getattr(route, "path", ""))
+    matched_path = _PATH_PARAM_PATTERN.sub(
+        lambda match: str(path_params.get(match[1], match[0])), route_path
+    )
+    path = scope["path"]
+    if not path.endswith(matched_path):
+        return route_path
+    return path[: len(path) - len(matched_path)] + route_path
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing requests and counting the bytes they send.
+
+    Requests are timed until the last byte of the response, so streamed
+    downloads count in full. They are labelled with their route template
+    rather than their path, which would make one series per video.
+    """
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """Handle a request, recording its metrics however it ends."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status_code = 500
+        body_bytes = 0
+
+        async def send_and_measure(message: dict) -> None:
+            nonlocal status_code, body_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_measure)
+        except Exception as e:
+            record_error(e)
+            raise
+        finally:
+            route = _route_label(scope)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started_at,
+                method=scope["method"],
+                route=route,
+                status=str(status_code),
+            )
+            BYTES_SERVED.inc(body_bytes, route=route)
+            _record_first_request(route)
+
+
+def _record_first_request(route: str) -> None:
+    """Record when the first request from a user was served."""
+    global _first_request_served
+    if not _first_request_served and route not in _PROBE_ROUTES:
+        _first_request_served = True
+        record_startup_milestone("first_request")
+
+
+def track_slot_pools(pools: Iterable) -> None:
+    """Read the scheduler gauges from the given SlotPools."""
+    pools = list(pools)
+    SCHEDULER_QUEUED.set_callback(lambda: {(pool.name,): pool.queued for pool in pools})
+    SCHEDULER_ACTIVE.set_callback(lambda: {(pool.name,): pool.active for pool in pools})
@@ -0,0 +1,241 @@
+import asyncio
+import re
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+ProgressStage = Literal["queued", "extracting", "transcoding", "done", "failed"]
+
+PROGRESS_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# How long the last event of a finished download stays available, so a
+# client subscribing late still learns how it ended.
+FINISHED_RETENTION_SECONDS = 60.0
+# Events buffered per subscriber. Only the latest state matters, so a slow
+# subscriber loses intermediate events rather than holding memory.
+SUBSCRIBER_QUEUE_SIZE = 16
+
+_FINAL_STAGES = ("done", "failed")
+
+# Channels are keyed by user and progress ID.
+_ChannelKey = Tuple[str, str]
+
+
+def parse_ffmpeg_progress(
+    block: Dict[str, str], duration: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Turn a block of ffmpeg `-progress` key=value pairs into an event.
+
+    `duration` is the expected output length, used to compute a percentage.
+    """
+    event: Dict[str, Any] = {}
+    out_time_us = block.get("out_time_us") or block.get("out_time_ms")
+    if out_time_us and out_time_us.lstrip("-").isdigit():
+        out_time_seconds = max(int(out_time_us), 0) / 1_000_000
+        event["out_time_seconds"] = round(out_time_seconds, 3)
+        if duration:
+            event["percent"] = round(min(out_time_seconds / duration, 1.0) * 100, 1)
+    total_size = block.get("total_size", "")
+    if total_size.isdigit():
+        event["bytes_written"] = int(total_size)
+    speed = block.get("speed", "").rstrip("x").strip()
+    try:
+        event["speed"] = float(speed)
+    except ValueError:
+        pass
+    return event
+
+
+class _Channel:
+    """Progress of one download: its last event and subscribers."""
+
+    def __init__(self) -> None:
+        self.last_event: Optional[Dict[str, Any]] = None
+        self.subscribers: List[asyncio.Queue[Dict[str, Any]]] = []
+        self.finished = False
+
+
+class ProgressReporter:
+    """
+    Publishes the progress of a single download.
+
+    Methods are safe to call from any thread: events are handed over to
+    the event loop with `call_soon_threadsafe`, so a worker thread never
+    blocks on a slow subscriber. A reporter without a broker does nothing.
+    """
+
+    def __init__(
+        self,
+        broker: Optional["ProgressBroker"] = None,
+        channel_key: Optional[_ChannelKey] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        self._broker = broker
+        self._channel_key = channel_key
+        self._loop = loop
+        # Expected output length, to turn ffmpeg's position into a percentage.
+        self.duration: Optional[float] = None
+
+    @property
+    def ffmpeg_callback(self) -> Optional[Callable[[Dict[str, str]], None]]:
+        """Return the `on_progress` callback for ffmpeg, None when disabled."""
+        return self.on_ffmpeg_progress if self._broker is not None else None
+
+    def publish(self, stage: ProgressStage, **fields: Any) -> None:
+        """Publish an event for the download."""
+        if self._broker is None or self._loop is None or self._loop.is_closed():
+            return
+        event = {"stage": stage, **fields}
+        self._loop.call_soon_threadsafe(
+            self._broker._dispatch, self._channel_key, event
+        )
+
+    def on_ffmpeg_progress(self, block: Dict[str, str]) -> None:
+        """Publish a block of ffmpeg `-progress` output."""
+        self.publish("transcoding", **parse_ffmpeg_progress(block, self.duration))
+
+    def finish(self) -> None:
+        """Publish the end of a successful download."""
+        self.publish("done")
+
+    def fail(self, error: BaseException | str) -> None:
+        """Publish the end of a failed download."""
+        self.publish("failed", error=str(error))
+
+    async def track(self, awaitable: Awaitable[T], finish: bool = True) -> T:
+        """
+        Await a download, publishing its failure and, with `finish`, its end.
+
+        Streamed downloads pass `finish=False`, since they only end once
+        the stream has been consumed.
+        """
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            self.fail("The download was cancelled.")
+            raise
+        except Exception as e:
+            self.fail(e)
+            raise
+        if finish:
+            self.finish()
+        return result
+
+
+NO_PROGRESS = ProgressReporter()
+
+
+class ProgressBroker:
+    """
+    Fan-out of download progress events to Server-Sent Events subscribers.
+
+    Progress IDs are chosen by clients, so each user has their own: a
+    user can neither follow nor take over another user's download by
+    reusing its ID. Subscribers first get the last event, then every new
+    one until the download is done or failed. Must be used from the event
+    loop, except for ProgressReporter methods.
+    """
+
+    def __init__(self, finished_retention: float = FINISHED_RETENTION_SECONDS) -> None:
+        self.finished_retention = finished_retention
+        self._channels: Dict[_ChannelKey, _Channel] = {}
+
+    def open(self, progress_id: Optional[str], user_id: str) -> ProgressReporter:
+        """
+        Start reporting the progress of a download.
+
+        Returns a no-op reporter if `progress_id` is missing or malformed.
+        """
+        if not progress_id or not PROGRESS_ID_PATTERN.match(progress_id):
+            return NO_PROGRESS
+        key = (user_id, progress_id)
+        channel = self._channels.get(key)
+        # Clients may subscribe before starting the download, in which case
+        # the channel already exists and its subscribers are kept.
+        if channel is None or channel.finished:
+            self._channels[key] = _Channel()
+        reporter = ProgressReporter(self, key, asyncio.get_running_loop())
+        reporter.publish("queued")
+        return reporter
+
+    def _dispatch(self, key: _ChannelKey, event: Dict[str, Any]) -> None:
+        channel = self._channels.get(key)
+        if channel is None or channel.finished:
+            return
+        channel.last_event = event
+        for queue in channel.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+        if event["stage"] in _FINAL_STAGES:
+            channel.finished = True
+            asyncio.get_running_loop().call_later(
+                self.finished_retention, self._expire, key, channel
+            )
+
+    def _expire(self, key: _ChannelKey, channel: _Channel) -> None:
+        if self._channels.get(key) is channel:
+            del self._channels[key]
+
+    def subscribe(
+        self, progress_id: str, user_id: str, heartbeat_interval: float = 15.0
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Subscribe to the events of a download, until it ends.
+
+        The download may start after the subscription. None is yielded
+        every `heartbeat_interval` seconds without events, to keep the
+        connection alive. A malformed `progress_id` raises ValueError right
+        away, rather than once the events are iterated.
+        """
+        if not PROGRESS_ID_PATTERN.match(progress_id):
+            raise ValueError(
+                "Progress IDs are 1 to 64 letters, digits, dashes or underscores."
+            )
+        return self._events((user_id, progress_id), heartbeat_interval)
+
+    async def _events(
+        self, key: _ChannelKey, heartbeat_interval: float
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = _Channel()
+            self._channels[key] = channel
+        if channel.last_event is not None:
+            yield channel.last_event
+        if channel.finished:
+            return
+
+        queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        channel.subscribers.append(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["stage"] in _FINAL_STAGES:
+                    return
+        finally:
+            channel.subscribers.remove(queue)
+            # Nobody reported under this ID, drop the channel with its last
+            # subscriber.
+            if (
+                not channel.subscribers
+                and channel.last_event is None
+                and self._channels.get(key) is channel
+            ):
+                del self._channels[key]
@@ -0,0 +1,35 @@
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import HTTPException, Request
+
+T = TypeVar("T")
+
+# Status code used by nginx when the client closed the connection early.
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def cancel_on_disconnect(
+    request: Request, awaitable: Awaitable[T], poll_interval: float = 1.0
+) -> T:
+    """
+    Await `awaitable`, cancelling it if the client disconnects meanwhile.
+
+    Cancelling a download kills its ffmpeg process, so an abandoned request
+    stops consuming CPU and bandwidth.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise HTTPException(
+                    status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected."
+                )
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from yt_download_service.app.utils.video_utils import extract_video_id
+from yt_download_service.settings import get_settings
+
+RESULT_CACHE_DIR = get_settings().result_cache_dir
+# Total size of the cached clips. 0 disables the cache.
+RESULT_CACHE_MAX_BYTES = get_settings().result_cache_max_bytes
+
+# Files of `tmp` and `served` older than this were left by a crashed
+# process: far longer than writing or serving a clip takes.
+LEFTOVER_MAX_AGE_SECONDS = 6 * 3600
+
+# Bump when the produced files change (codecs, container, cutting logic), so
+# results made by an older version are never served.
+OUTPUT_PROFILE = "mp4-frag-v2"
+
+# (video ID, format ID, start seconds, end seconds, output profile)
+ResultCacheKey = Tuple[str, str, Optional[int], Optional[int], str]
+
+_MEDIA_SUFFIX = ".mp4"
+_METADATA_SUFFIX = ".json"
+
+
+def make_result_cache_key(
+    url: str,
+    format_id: Optional[str] = None,
+    start_seconds: Optional[int] = None,
+    end_seconds: Optional[int] = None,
+) -> ResultCacheKey:
+    """
+    Build the cache key of a produced clip.
+
+    Full downloads have no start and end, and a missing format ID stands
+    for the best format.
+    """
+    return (
+        extract_video_id(url) or url,
+        format_id or "best",
+        start_seconds,
+        end_seconds,
+        OUTPUT_PROFILE,
+    )
+
+
+def is_shareable_result(info_dict: Dict[str, Any], has_cookies: bool) -> bool:
+    """
+    Check whether a clip can be served to other users.
+
+    Anonymous results are always shareable. Results made with cookies are
+    only shareable when the video is reachable without them, i.e. it is
+    neither private, members-only nor age-restricted.
+    """
+    if not has_cookies:
+        return True
+    return info_dict.get("availability") in ("public", "unlisted") and not (
+        info_dict.get("age_limit") or 0
+    )
+
+
+class ResultCache:
+    """
+    Disk cache of produced clips, evicted in LRU order under a byte budget.
+
+    Each entry is a media file plus a JSON sidecar holding its metadata,
+    both named after the digest of the cache key. Files are written under
+    a temporary name and renamed into place, so readers never see partial
+    entries. Hits are hard links into the cache directory, which the
+    caller deletes once served without affecting the cached entry.
+
+    The directory is the only state, so worker processes may share it.
+    Recency is the modification time of the media files, refreshed by
+    hits, and the budget is enforced from a scan of the directory after
+    each write. Leftovers of interrupted writes and of clips being served
+    are only deleted once older than LEFTOVER_MAX_AGE_SECONDS, since they
+    may belong to another process.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._tmp_dir = os.path.join(directory, "tmp")
+        self._served_dir = os.path.join(directory, "served")
+        # Only serializes the evictions of this process.
+        self._lock = threading.Lock()
+        if self.enabled:
+            self._load()
+
+    @property
+    def enabled(self) -> bool:
+        """Return whether results are cached at all."""
+        return self.max_bytes > 0
+
+    def _path(self, digest: str, suffix: str) -> str:
+        return os.path.join(self.directory, digest + suffix)
+
+    def _load(self) -> None:
+        """Create the cache directory, and delete what crashed processes left."""
+        for directory in (self.directory, self._tmp_dir, self._served_dir):
+            os.makedirs(directory, exist_ok=True)
+        max_mtime = time.time() - LEFTOVER_MAX_AGE_SECONDS
+        for directory in (self._tmp_dir, self._served_dir):
+            for name in os.listdir(directory):
+                _remove_if_older(os.path.join(directory, name), max_mtime)
+        # Sidecars are written first, one without its media file is either
+        # being written or a leftover.
+        for name in os.listdir(self.directory):
+            digest, suffix = os.path.splitext(name)
+            if suffix == _METADATA_SUFFIX and not os.path.exists(
+                self._path(digest, _MEDIA_SUFFIX)
+            ):
+                _remove_if_older(self._path(digest, _METADATA_SUFFIX), max_mtime)
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def _digest(key: ResultCacheKey) -> str:
+        return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+    def get(self, key: ResultCacheKey) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Look up a clip.
+
+        Returns
+        -------
+            A path to the clip, which the caller must delete once done
+            with it, and the metadata stored along with it; or None on a
+            miss.
+
+        """
+        if not self.enabled:
+            return None
+        digest = self._digest(key)
+        served_path = os.path.join(self._served_dir, uuid.uuid4().hex + _MEDIA_SUFFIX)
+        try:
+            with open(self._path(digest, _METADATA_SUFFIX), encoding="utf-8") as f:
+                metadata = json.load(f)
+            os.link(self._path(digest, _MEDIA_SUFFIX), served_path)
+        except FileNotFoundError:
+            # Not cached, or being written or evicted by another process.
+            return None
+        except (OSError, ValueError):
+            self._drop(digest)
+            return None
+        # The link shares the entry's inode: this marks it recently used.
+        os.utime(served_path)
+        return served_path, metadata
+
+    def put(self, key: ResultCacheKey, path: str, metadata: Dict[str, Any]) -> None:
+        """
+        Store a copy of the clip at `path` along with its metadata.
+
+        The clip is hard-linked when possible, so `path` stays owned by the
+        caller. Clips larger than the whole budget are not stored.
+        """
+        if not self.enabled:
+            return
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return
+
+        digest = self._digest(key)
+        tmp_name = uuid.uuid4().hex
+        tmp_media_path = os.path.join(self._tmp_dir, tmp_name + _MEDIA_SUFFIX)
+        tmp_metadata_path = os.path.join(self._tmp_dir, tmp_name + _METADATA_SUFFIX)
+        try:
+            try:
+                os.link(path, tmp_media_path)
+            except OSError:
+                # Different filesystem, fall back to a copy.
+                shutil.copyfile(path, tmp_media_path)
+            with open(tmp_metadata_path, "w", encoding="utf-8") as f:
+                json.dump(metadata, f)
+
+            # The sidecar goes first, a media file without one is never served.
+            os.replace(tmp_metadata_path, self._path(digest, _METADATA_SUFFIX))
+            os.replace(tmp_media_path, self._path(digest, _MEDIA_SUFFIX))
+            with self._lock:
+                self._evict()
+        finally:
+            _remove_quietly(tmp_media_path)
+            _remove_quietly(tmp_metadata_path)
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the budget is met."""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                digest, suffix = os.path.splitext(entry.name)
+                if suffix != _MEDIA_SUFFIX:
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, digest, stat.st_size))
+        total_bytes = sum(size for _, _, size in entries)
+        for _, digest, size in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self._drop(digest)
+            total_bytes -= size
+
+    def _drop(self, digest: str) -> None:
+        _remove_quietly(self._path(digest, _MEDIA_SUFFIX))
+        _remove_quietly(self._path(digest, _METADATA_SUFFIX))
+
+
+def _remove_if_older(path: str, max_mtime: float) -> None:
+    try:
+        if os.stat(path).st_mtime < max_mtime:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,261 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import math
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, Tuple, TypeVar
+
+from yt_download_service.settings import get_settings
+
+T = TypeVar("T")
+
+# yt-dlp extractions running at once, each one holds a worker thread.
+EXTRACTION_WORKERS = get_settings().scheduler_extraction_workers
+# ffmpeg jobs running at once.
+TRANSCODE_SLOTS = get_settings().scheduler_transcode_slots
+# Slots a single user may hold at once in each pool.
+PER_USER_LIMIT = get_settings().scheduler_per_user_limit
+# Requests allowed to wait for a slot in each pool before rejecting new ones.
+MAX_QUEUE = get_settings().scheduler_max_queue
+
+ANONYMOUS_USER = "anonymous"
+
+
+class SchedulerFullError(Exception):
+    """Raised when a pool's queue is full. Callers should retry later."""
+
+    def __init__(self, pool_name: str, retry_after: int) -> None:
+        super().__init__(
+            f"The server is busy ({pool_name} queue is full), "
+            f"retry in {retry_after} seconds."
+        )
+        self.retry_after = retry_after
+
+
+class SlotPool:
+    """
+    Fixed number of slots, shared fairly between users.
+
+    A request runs right away when a slot is free and its user is under
+    the per-user limit. Otherwise it waits in a bounded FIFO queue, and is
+    rejected with SchedulerFullError when the queue is full.
+
+    Must be used from the event loop thread.
+    """
+
+    def __init__(
+        self, name: str, limit: int, per_user_limit: int, max_queue: int
+    ) -> None:
+        self.name = name
+        self.limit = limit
+        self.per_user_limit = per_user_limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._active_by_user: Counter[str] = Counter()
+        self._waiters: deque[Tuple[str, asyncio.Future[None]]] = deque()
+        # Moving average of how long a slot is held, to compute Retry-After.
+        self._average_hold_seconds = 10.0
+
+    @property
+    def queued(self) -> int:
+        """Return the number of requests waiting for a slot."""
+        return len(self._waiters)
+
+    def _can_run(self, user_id: str) -> bool:
+        return (
+            self.active < self.limit
+            and self._active_by_user[user_id] < self.per_user_limit
+        )
+
+    def _take(self, user_id: str) -> None:
+        self.active += 1
+        self._active_by_user[user_id] += 1
+
+    def retry_after(self) -> int:
+        """Estimate, in seconds, when the queue should have room again."""
+        return max(
+            1,
+            math.ceil(
+                self._average_hold_seconds * (self.queued + 1) / max(self.limit, 1)
+            ),
+        )
+
+    def try_acquire(self, user_id: str) -> bool:
+        """Take a slot only if the user could run right now, without queueing."""
+        if not self._can_run(user_id):
+            return False
+        self._take(user_id)
+        return True
+
+    async def acquire(self, user_id: str) -> None:
+        """Wait for a slot, raising SchedulerFullError if the queue is full."""
+        if self._can_run(user_id):
+            self._take(user_id)
+            return
+        if self.queued >= self.max_queue:
+            raise SchedulerFullError(self.name, self.retry_after())
+
+        waiter: Tuple[str, asyncio.Future[None]] = (
+            user_id,
+            asyncio.get_running_loop().create_future(),
+        )
+        self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter[1].done() and not waiter[1].cancelled():
+                # The slot was handed over just before the cancellation.
+                self.release(user_id)
+            raise
+
+    def release(self, user_id: str, held_seconds: Optional[float] = None) -> None:
+        """Give a slot back and hand it over to the first eligible waiter."""
+        self.active -= 1
+        self._active_by_user[user_id] -= 1
+        if self._active_by_user[user_id] <= 0:
+            del self._active_by_user[user_id]
+        if held_seconds is not None:
+            self._average_hold_seconds = (
+                0.8 * self._average_hold_seconds + 0.2 * held_seconds
+            )
+
+        for waiter in list(self._waiters):
+            if self.active >= self.limit:
+                break
+            waiting_user, future = waiter
+            if future.done():
+                self._waiters.remove(waiter)
+            elif self._can_run(waiting_user):
+                self._waiters.remove(waiter)
+                self._take(waiting_user)
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, user_id: str) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the `async with` block."""
+        await self.acquire(user_id)
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user_id, time.monotonic() - started_at)
+
+
+class JobScheduler:
+    """
+    Bounds the work done on behalf of requests.
+
+    Extractions run on a dedicated thread pool instead of the loop's
+    default executor, and ffmpeg jobs hold a transcode slot while they
+    run. Both pools enforce a global and a per-user limit.
+    """
+
+    def __init__(
+        self,
+        extraction_workers: int = EXTRACTION_WORKERS,
+        transcode_slots: int = TRANSCODE_SLOTS,
+        per_user_limit: int = PER_USER_LIMIT,
+        max_queue: int = MAX_QUEUE,
+    ) -> None:
+        self.extraction = SlotPool(
+            "extraction", extraction_workers, per_user_limit, max_queue
+        )
+        self.transcoding = SlotPool(
+            "transcoding", transcode_slots, per_user_limit, max_queue
+        )
+        self._extraction_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=extraction_workers, thread_name_prefix="yt-extract"
+        )
+
+    async def run_extraction(
+        self, user_id: Optional[str], func: Callable[..., T], *args
+    ) -> T:
+        """
+        Run a blocking yt-dlp call on the extraction pool.
+
+        The slot is held until the call returns, even when the caller is
+        cancelled first: the thread keeps running the call regardless.
+        """
+        user_id = user_id or ANONYMOUS_USER
+        await self.extraction.acquire(user_id)
+        loop = asyncio.get_running_loop()
+        started_at = time.monotonic()
+
+        def release(_: concurrent.futures.Future[T]) -> None:
+            # Called from the worker thread, or from the loop when the call
+            # is cancelled before it started.
+            held_seconds = time.monotonic() - started_at
+            try:
+                loop.call_soon_threadsafe(
+                    self.extraction.release, user_id, held_seconds
+                )
+            except RuntimeError:
+                pass  # The loop is closed, and its pools with it.
+
+        # Unlike `asyncio.to_thread`, executors do not carry context
+        # variables over, and the request ID must follow the call.
+        call = functools.partial(contextvars.copy_context().run, func, *args)
+        try:
+            future = self._extraction_executor.submit(call)
+        except BaseException:
+            self.extraction.release(user_id)
+            raise
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def transcode_slot(self, user_id: Optional[str]):
+        """Hold a transcode slot for the duration of an `async with` block."""
+        return self.transcoding.slot(user_id or ANONYMOUS_USER)
+
+    async def acquire_transcode_slot(
+        self, user_id: Optional[str]
+    ) -> Callable[[], None]:
+        """
+        Take a transcode slot that outlives the caller, e.g. for a stream.
+
+        Returns
+        -------
+            The function giving the slot back, safe to call more than once.
+
+        """
+        user_id = user_id or ANONYMOUS_USER
+        await self.transcoding.acquire(user_id)
+        return self._transcode_slot_release(user_id)
+
+    def try_acquire_transcode_slots(
+        self, user_id: Optional[str], count: int
+    ) -> List[Callable[[], None]]:
+        """
+        Take up to `count` more transcode slots, among those free right now.
+
+        For requests running ffmpeg processes side by side, on top of the
+        slot they already hold. Never waits: two requests each holding a
+        slot and waiting for another one could block each other forever.
+
+        Returns
+        -------
+            The functions giving each slot taken back.
+
+        """
+        user_id = user_id or ANONYMOUS_USER
+        releases = []
+        while len(releases) < count and self.transcoding.try_acquire(user_id):
+            releases.append(self._transcode_slot_release(user_id))
+        return releases
+
+    def _transcode_slot_release(self, user_id: str) -> Callable[[], None]:
+        started_at = time.monotonic()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.transcoding.release(user_id, time.monotonic() - started_at)
+
+        return release
@@ -0,0 +1,62 @@
+from typing import Any, Dict, Optional, TypeVar
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+try:
+    import msgpack
+except ImportError:  # The `msgpack` extra, responses are JSON without it.
+    msgpack = None
+
+T = TypeVar("T")
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Older clients still send the unregistered names.
+_MSGPACK_MEDIA_TYPES = {
+    MSGPACK_MEDIA_TYPE,
+    "application/x-msgpack",
+    "application/vnd.msgpack",
+}
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """Whether an Accept header asks for MessagePack, ignoring q=0 entries."""
+    if not accept:
+        return False
+    for item in accept.split(","):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        if media_type.lower() not in _MSGPACK_MEDIA_TYPES:
+            continue
+        if any(param.replace(" ", "") in ("q=0", "q=0.0") for param in params):
+            continue
+        return True
+    return False
+
+
+def serialized_response(
+    request: Request,
+    adapter: TypeAdapter[T],
+    value: T,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Serialize `value` in one pass, as MessagePack if asked for, else JSON.
+
+    `value` must already be valid for `adapter`: returning a Response skips
+    the validation FastAPI runs on the `response_model`, and pydantic's
+    serializer is much faster than `jsonable_encoder`. MessagePack is only
+    used when the optional `msgpack` extra is installed.
+    """
+    content: Any
+    if msgpack is not None and accepts_msgpack(request.headers.get("accept")):
+        content = msgpack.packb(adapter.dump_python(value, mode="json"))
+        media_type = MSGPACK_MEDIA_TYPE
+    else:
+        content = adapter.dump_json(value)
+        media_type = JSON_MEDIA_TYPE
+    return Response(
+        content,
+        media_type=media_type,
+        headers={**(headers or {}), "Vary": "Accept"},
+    )
@@ -0,0 +1,151 @@
+import logging
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from types import TracebackType
+from typing import Any, Callable, Optional, Type
+
+# Spans are logged by `yt_download_service.span.<name>` loggers, so the
+# level of each span can be set on its own.
+SPAN_LOGGER = "yt_download_service.span"
+REQUEST_ID_HEADER = "x-request-id"
+
+# Request IDs sent by clients or proxies are kept if they look sane.
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+class Span:
+    """
+    A timed step of a request, logged once it ends.
+
+    Use it as a context manager, or call `finish` when the step ends
+    outside of the block that started it, e.g. in a stream. Fields passed
+    at creation or through `set` are added to the log record.
+    """
+
+    def __init__(self, name: str, **fields: Any) -> None:
+        self.name = name
+        self.fields = fields
+        self.logger = logging.getLogger(f"{SPAN_LOGGER}.{name}")
+        self._started_at = time.perf_counter()
+        self._finished = False
+
+    def set(self, **fields: Any) -> None:
+        """Add fields to the span's log record."""
+        self.fields.update(fields)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Log the span, only the first time it is called."""
+        if self._finished:
+            return
+        self._finished = True
+        level = logging.WARNING if error is not None else logging.INFO
+        if not self.logger.isEnabledFor(level):
+            return
+        duration_ms = round((time.perf_counter() - self._started_at) * 1000, 3)
+        extra = {
+            **self.fields,
+            "span": self.name,
+            "duration_ms": duration_ms,
+            "outcome": "error" if error is not None else "ok",
+        }
+        if error is not None:
+            extra["error_type"] = type(error).__name__
+        self.logger.log(level, "%s took %.1f ms", self.name, duration_ms, extra=extra)
+
+    def __enter__(self) -> "Span":
+        """Return the span, already started."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Log the span, as failed if the block raised."""
+        self.finish(exc)
+
+
+def span(name: str, **fields: Any) -> Span:
+    """Start a span, to be used as a context manager around the step."""
+    return Span(name, **fields)
+
+
+class RequestIdFilter(logging.Filter):
+    """Add the ID of the current request to log records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Tag the record, never dropping it."""
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware giving each request an ID, and logging how it went.
+
+    The ID is taken from the `X-Request-ID` header when valid, generated
+    otherwise, and returned in the response headers. The `request` span
+    covers the whole request, `response_send` the time from the response
+    headers to its last byte, which is most of a streamed download.
+    """
+
+    def __init__(self, app: Callable) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """Handle a request within its own logging context."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = next(
+            (
+                value.decode("latin-1")
+                for key, value in scope["headers"]
+                if key == REQUEST_ID_HEADER.encode()
+            ),
+            "",
+        )
+        if not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        request_span = span("request", method=scope["method"], path=scope["path"])
+        send_span: Optional[Span] = None
+
+        async def send_with_request_id(message: dict) -> None:
+            nonlocal send_span
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER.encode(), request_id.encode()),
+                ]
+                request_span.set(status=message["status"])
+                send_span = span("response_send")
+            await send(message)
+            if (
+                message["type"] == "http.response.body"
+                and not message.get("more_body", False)
+                and send_span is not None
+            ):
+                send_span.finish()
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except BaseException as e:
+            if send_span is not None:
+                send_span.finish(e)
+            request_span.finish(e)
+            raise
+        else:
+            if send_span is not None:
+                # Already done, unless the response ended without a body.
+                send_span.finish()
+            request_span.finish()
+        finally:
+            request_id_var.reset(token)
@@ -1,5 +1,9 @@
 import re
 
+YOUTUBE_URL_PATTERN = re.compile(
+    r"^(https?:\/\/)?(www\.)?(youtube\.com|youtu\.be|youtube-nocookie\.com)\/(watch\?v=|embed\/|v\/|shorts\/|.+\?v=)?([a-zA-Z0-9_-]{11})"  # noqa: E501
+)
+
 
 def is_valid_youtube_url(url: str) -> bool:
     """
@@ -14,5 +18,24 @@ def is_valid_youtube_url(url: str) -> bool:
         True if the URL is a valid YouTube URL, False otherwise.
 
     """
-    pattern = r"^(https?:\/\/)?(www\.)?(youtube\.com|youtu\.be|youtube-nocookie\.com)\/(watch\?v=|embed\/|v\/|shorts\/|.+\?v=)?([a-zA-Z0-9_-]{11})"  # noqa: E501
-    return re.match(pattern, url) is not None
+    return YOUTUBE_URL_PATTERN.match(url) is not None
+
+
+def extract_video_id(url: str) -> str | None:
+    """
+    Extract the canonical 11 characters video ID from a YouTube URL.
+
+    Every URL shape accepted by `is_valid_youtube_url` (watch, youtu.be,
+    shorts, embed, ...) resolves to the same ID for the same video.
+
+    Args:
+    ----
+        url: The URL to parse.
+
+    Returns:
+    -------
+        The video ID, or None if the URL is not a valid YouTube URL.
+
+    """
+    match = YOUTUBE_URL_PATTERN.match(url)
+    return match.group(5) if match else None
@@ -0,0 +1,153 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from yt_download_service.app.utils.cookie_jars import CookieJarCache, cookie_jar_key
+from yt_download_service.app.utils.lazy_import import lazy_import
+from yt_download_service.settings import get_settings
+
+# Idle instances kept for reuse, per cookie jar and in total.
+YDL_POOL_MAX_IDLE_PER_KEY = get_settings().ydl_pool_max_idle_per_key
+YDL_POOL_MAX_IDLE = get_settings().ydl_pool_max_idle
+# Idle instances unused for this long are closed.
+YDL_POOL_IDLE_TTL_SECONDS = get_settings().ydl_pool_idle_ttl_seconds
+
+# Key of the instances used without cookies.
+_ANONYMOUS = ""
+
+if TYPE_CHECKING:
+    import yt_dlp
+else:
+    yt_dlp = lazy_import("yt_dlp")
+
+
+class YoutubeDLPool:
+    """
+    Thread-safe pool of long-lived `YoutubeDL` instances.
+
+    Building a `YoutubeDL` loads the extractors and a new HTTP opener,
+    which costs about as much as a cached extraction. Instances are keyed
+    by their cookie jar, since cookies are the only option that differs
+    between calls, and checked out by one job at a time.
+
+    Instances without cookies are shared by every user, so the cookies
+    YouTube sets on them are dropped when they are given back. Instances
+    whose call raised are closed rather than reused.
+    """
+
+    def __init__(
+        self,
+        params: Dict[str, Any],
+        cookie_jars: CookieJarCache,
+        max_idle_per_key: int = YDL_POOL_MAX_IDLE_PER_KEY,
+        max_idle: int = YDL_POOL_MAX_IDLE,
+        idle_ttl: float = YDL_POOL_IDLE_TTL_SECONDS,
+    ) -> None:
+        self.params = params
+        self.cookie_jars = cookie_jars
+        self.max_idle_per_key = max_idle_per_key
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+        # Idle instances of each key, with when they were given back.
+        self._idle: Dict[str, List[Tuple[float, "yt_dlp.YoutubeDL"]]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self, encoded_cookies: Optional[str]) -> Iterator["yt_dlp.YoutubeDL"]:
+        """
+        Lend an instance using these cookies, building one if none is idle.
+
+        Raises ValueError if the cookies cannot be decoded.
+        """
+        key = cookie_jar_key(encoded_cookies) if encoded_cookies else _ANONYMOUS
+        ydl = self._take(key)
+        if ydl is None:
+            params = dict(self.params)
+            cookie_file = self.cookie_jars.open(encoded_cookies)
+            if cookie_file is not None:
+                params["cookiefile"] = cookie_file
+            ydl = yt_dlp.YoutubeDL(params)
+        try:
+            yield ydl
+        except BaseException:
+            ydl.close()
+            raise
+        self._give_back(key, ydl)
+
+    def _take(self, key: str) -> Optional["yt_dlp.YoutubeDL"]:
+        """Return the most recently used idle instance of a key, if any."""
+        with self._lock:
+            expired = self._pop_expired()
+            idle = self._idle.get(key)
+            ydl = idle.pop()[1] if idle else None
+            if idle is not None and not idle:
+                del self._idle[key]
+        for stale in expired:
+            stale.close()
+        return ydl
+
+    def _give_back(self, key: str, ydl: "yt_dlp.YoutubeDL") -> None:
+        """Keep an instance for reuse, or close it if the pool is full."""
+        if key == _ANONYMOUS:
+            ydl.cookiejar.clear()
+        evicted = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) >= self.max_idle_per_key:
+                evicted.append(ydl)
+            else:
+                idle.append((time.monotonic(), ydl))
+                evicted.extend(self._pop_oldest(self._idle_count() - self.max_idle))
+            if not idle:
+                del self._idle[key]
+        for stale in evicted:
+            stale.close()
+
+    def _idle_count(self) -> int:
+        """Return the number of idle instances. Must hold the lock."""
+        return sum(len(idle) for idle in self._idle.values())
+
+    def _pop_expired(self) -> List["yt_dlp.YoutubeDL"]:
+        """Remove the instances idle for too long. Must hold the lock."""
+        deadline = time.monotonic() - self.idle_ttl
+        expired = []
+        for key, idle in list(self._idle.items()):
+            expired.extend(ydl for given_back, ydl in idle if given_back <= deadline)
+            idle[:] = [entry for entry in idle if entry[0] > deadline]
+            if not idle:
+                del self._idle[key]
+        return expired
+
+    def _pop_oldest(self, count: int) -> List["yt_dlp.YoutubeDL"]:
+        """Remove the `count` least recently used instances. Must hold the lock."""
+        oldest = []
+        for _ in range(max(count, 0)):
+            key = min(self._idle, key=lambda k: self._idle[k][0][0])
+            oldest.append(self._idle[key].pop(0)[1])
+            if not self._idle[key]:
+                del self._idle[key]
+        return oldest
+
+    def warm_up(self, count: int) -> None:
+        """
+        Build `count` instances without cookies, ahead of the first requests.
+
+        Also loads the YouTube extractor, the first use of which imports
+        and compiles most of what an extraction needs.
+        """
+        built = []
+        for _ in range(count):
+            ydl = yt_dlp.YoutubeDL(dict(self.params))
+            ydl.get_info_extractor("Youtube")
+            built.append(ydl)
+        for ydl in built:
+            self._give_back(_ANONYMOUS, ydl)
+
+    def close(self) -> None:
+        """Close every idle instance."""
+        with self._lock:
+            idle = [ydl for entries in self._idle.values() for _, ydl in entries]
+            self._idle.clear()
+        for ydl in idle:
+            ydl.close()
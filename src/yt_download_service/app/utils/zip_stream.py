@@ -0,0 +1,67 @@
+import asyncio
+import zipfile
+from typing import AsyncIterator, Iterable, Tuple
+
+ZIP_READ_SIZE = 1024 * 1024
+
+
+class _ChunkBuffer:
+    """Unseekable file object collecting what zipfile writes to it."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._offset = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # zipfile uses the position to write the central directory offsets.
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        """Return and forget what was written since the last call."""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_zip(
+    files: Iterable[Tuple[str, str]], chunk_size: int = ZIP_READ_SIZE
+) -> AsyncIterator[bytes]:
+    """
+    Stream a zip archive of `(name in archive, path)` files as it is built.
+
+    Entries are stored without compression, videos would not shrink, so
+    the archive costs a copy and no CPU. Nothing is buffered beyond one
+    chunk, and files are read off the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(
+        buffer,  # type: ignore[arg-type]
+        mode="w",
+        compression=zipfile.ZIP_STORED,
+    ) as archive:
+        for arcname, path in files:
+            with (
+                open(path, "rb") as source,
+                archive.open(arcname, mode="w", force_zip64=True) as entry,
+            ):
+                while chunk := await loop.run_in_executor(
+                    None, source.read, chunk_size
+                ):
+                    entry.write(chunk)
+                    if data := buffer.take():
+                        yield data
+            # Closing an entry writes its data descriptor.
+            if data := buffer.take():
+                yield data
+    # Closing the archive writes its central directory.
+    if data := buffer.take():
+        yield data
@@ -1,6 +1,8 @@
+from datetime import date
 from uuid import UUID
 
-from pydantic import ConfigDict
+from pydantic import BaseModel, ConfigDict
+
 from yt_download_service.domain.models.commons.base_models import (
     TimedObjectModel,
     UUIdentifiedObjectModel,
@@ -20,3 +22,37 @@ class History(UUIdentifiedObjectModel, TimedObjectModel):
 
     # Ok to create the model from object attributes
     model_config = ConfigDict(from_attributes=True)
+
+
+class DailyHistoryStats(BaseModel):
+    """Downloads of a user on one day."""
+
+    day: date
+    downloads: int
+    clip_seconds: int
+
+
+class VideoHistoryStats(BaseModel):
+    """How many times a user downloaded a video."""
+
+    yt_video_url: str
+    video_title: str
+    downloads: int
+
+
+class ResolutionHistoryStats(BaseModel):
+    """How many times a user downloaded a resolution."""
+
+    resolution: str | None  # None for audio-only
+    downloads: int
+
+
+class HistoryStats(BaseModel):
+    """Aggregates of the download history of a user."""
+
+    total_downloads: int
+    total_clip_seconds: int
+    # Every day of the window, oldest first, including days without downloads.
+    daily: list[DailyHistoryStats]
+    top_videos: list[VideoHistoryStats]
+    top_resolutions: list[ResolutionHistoryStats]
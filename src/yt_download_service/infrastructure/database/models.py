@@ -1,9 +1,10 @@
 """Database models for the application."""
 
+from datetime import date
 from typing import Any
 from uuid import uuid4
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import Date, DateTime, ForeignKey, Index, Integer, String, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, declarative_base, mapped_column, relationship
 
@@ -60,3 +61,35 @@ class DBHistory(Base):
     )
 
     user: Mapped["DBUser"] = relationship("DBUser", back_populates="history")
+
+
+# Serves the history pages of a user, newest first, see `get_history_page`.
+Index(
+    "ix_history_user_id_created_at_id",
+    DBHistory.user_id,
+    DBHistory.created_at.desc(),
+    DBHistory.id,
+)
+
+
+class DBHistoryStats(Base):
+    """
+    Download counters of a user, per day, video and resolution.
+
+    Kept up to date along with the history table, so that statistics are
+    computed from these rows instead of the whole history of the user.
+    """
+
+    __tablename__ = "history_stats"
+
+    user_id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("user.id"), primary_key=True
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    yt_video_url: Mapped[str] = mapped_column(String, primary_key=True)
+    # Empty for audio-only downloads, primary key columns cannot be null.
+    resolution: Mapped[str] = mapped_column(String, primary_key=True)
+    video_title: Mapped[str] = mapped_column(String, nullable=False)
+    downloads: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Total length of the samples, full videos count for nothing.
+    clip_seconds: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -1,11 +1,15 @@
-from typing import AsyncGenerator
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncGenerator
 from urllib.parse import parse_qs, urlparse
 
-from sqlalchemy import AsyncAdaptedQueuePool
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from yt_download_service.app.utils.env import (
     get_or_raise_env,
 )
+from yt_download_service.app.utils.metrics import DB_POOL_CONNECTIONS
+from yt_download_service.settings import get_settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 
 # Use your method for getting the database URL
 DB_URL = get_or_raise_env("DB_URL")
@@ -28,28 +32,57 @@ if parsed_args.get("sslmode") == "require":
 
 clean_db_url = parsed_url._replace(query=None).geturl()
 
-# 1. Use create_async_engine
-engine = create_async_engine(
-    clean_db_url,
-    connect_args=connect_args,
-    poolclass=AsyncAdaptedQueuePool,
-    pool_recycle=1800,
-    pool_pre_ping=True,
-    echo=True,
-)
 
-AsyncSessionFactory = async_sessionmaker(
-    engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
-)
+@lru_cache
+def get_engine() -> "AsyncEngine":
+    """
+    Return the engine, created on first use.
 
-async_session_factory = async_sessionmaker(
-    engine, expire_on_commit=False, class_=AsyncSession
-)
+    SQLAlchemy's asyncio extension and asyncpg are only imported here, so
+    importing the application does not pay for them; the warm-up does.
+    """
+    from sqlalchemy import AsyncAdaptedQueuePool
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    settings = get_settings()
+
+    # 1. Use create_async_engine
+    engine = create_async_engine(
+        clean_db_url,
+        connect_args=connect_args,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_pre_ping=True,
+        # Statements are logged by the `sqlalchemy.engine` logger when enabled
+        # through LOG_LEVELS, echo logs them all unconditionally.
+        echo=settings.db_echo,
+    )
+
+    DB_POOL_CONNECTIONS.set_callback(
+        lambda: {
+            ("checked_out",): engine.pool.checkedout(),  # type: ignore[attr-defined]
+            # The pool reports unused overflow capacity as a negative overflow.
+            ("overflow",): max(engine.pool.overflow(), 0),  # type: ignore[attr-defined]
+            ("size",): engine.pool.size(),  # type: ignore[attr-defined]
+        }
+    )
+    return engine
+
+
+@lru_cache
+def get_session_factory() -> "async_sessionmaker[AsyncSession]":
+    """Return the factory of sessions on the engine, created on first use."""
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+    return async_sessionmaker(get_engine(), expire_on_commit=False, class_=AsyncSession)
 
 
-async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
+async def get_db_session() -> AsyncGenerator["AsyncSession", None]:
     """Get a database session."""
-    session = async_session_factory()
+    session = get_session_factory()()
     try:
         yield session
         await session.commit()
@@ -1,16 +1,26 @@
+from typing import TYPE_CHECKING
 from uuid import UUID
 
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+
 from yt_download_service.app.interfaces.user_service import IUserService
+from yt_download_service.app.utils.auth_cache import auth_cache
 from yt_download_service.domain.models.user import UserCreate, UserRead
 from yt_download_service.infrastructure.database.models import DBUser
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
 
 class UserService(IUserService):
-    """Service for user-related database operations."""
+    """
+    Service for user-related database operations.
+
+    Users are read through the in-process auth cache, so methods writing
+    users must invalidate them there.
+    """
 
-    async def create(self, db: AsyncSession, user_to_create: UserCreate) -> UserRead:
+    async def create(self, db: "AsyncSession", user_to_create: UserCreate) -> UserRead:
         """Create a new user in the database."""
         # 1. Create the SQLAlchemy model instance
         db_user = DBUser(**user_to_create.model_dump())
@@ -21,21 +31,35 @@ class UserService(IUserService):
         await db.refresh(db_user)
 
         # 3. Return the Pydantic model
-        return UserRead.model_validate(db_user)
+        user = UserRead.model_validate(db_user)
+        auth_cache.invalidate_user(email=user.email, user_id=user.id)
+        return user
 
-    async def get_by_id(self, db: AsyncSession, user_id: UUID) -> UserRead | None:
+    async def get_by_id(self, db: "AsyncSession", user_id: UUID) -> UserRead | None:
         """Get a user by their ID using an async session."""
+        cached_user = auth_cache.get_user_by_id(user_id)
+        if cached_user is not None:
+            return cached_user
+
         result = await db.execute(select(DBUser).where(DBUser.id == user_id))
         db_user = result.scalars().first()
 
         if db_user:
-            return UserRead.model_validate(db_user)
+            user = UserRead.model_validate(db_user)
+            auth_cache.set_user(user)
+            return user
         return None
 
-    async def get_by_email(self, db: AsyncSession, email: str) -> UserRead | None:
+    async def get_by_email(self, db: "AsyncSession", email: str) -> UserRead | None:
         """Fetch a user by email using an async session."""
+        cached_user = auth_cache.get_user_by_email(email)
+        if cached_user is not None:
+            return cached_user
+
         result = await db.execute(select(DBUser).where(DBUser.email == email))
         db_user = result.scalars().first()
         if db_user:
-            return UserRead.model_validate(db_user)
+            user = UserRead.model_validate(db_user)
+            auth_cache.set_user(user)
+            return user
         return None
@@ -1,15 +1,69 @@
-from fastapi import FastAPI
-from sqlalchemy import text
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import FastAPI, Request, Response
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import JSONResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.sessions import SessionMiddleware
+
 from yt_download_service.app.controllers import (
     auth_controller,
     history_controller,
     video_controller,
 )
-from yt_download_service.env import SECRET_KEY
-from yt_download_service.infrastructure.database.session import (
-    AsyncSessionFactory,
+from yt_download_service.app.utils.logging_config import (
+    configure_logging,
+    stop_logging,
 )
+from yt_download_service.app.utils.metrics import (
+    CONTENT_TYPE,
+    REGISTRY,
+    MetricsMiddleware,
+    record_error,
+    record_startup_milestone,
+)
+from yt_download_service.app.utils.tracing import RequestContextMiddleware
+from yt_download_service.env import SECRET_KEY
+from yt_download_service.settings import get_settings
+from yt_download_service.startup import readiness, warm_up
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+def size_default_executor() -> None:
+    """Size the executor running file I/O off the event loop."""
+    workers = get_settings().default_executor_workers
+    if workers is not None:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="default")
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Start serving right away and warm up in the background.
+
+    `/health` answers as soon as the server listens, `/ready` once the
+    warm-up succeeded. On shutdown, download jobs are cancelled and their
+    files deleted, queued history entries and logs are written out, and the
+    yt-dlp instances and cookie jars released.
+    """
+    size_default_executor()
+    warm_up_task = asyncio.create_task(warm_up(video_controller.video_service))
+    yield
+    warm_up_task.cancel()
+    await asyncio.gather(warm_up_task, return_exceptions=True)
+    await video_controller.job_service.close()
+    video_controller.video_service.close()
+    await video_controller.history_writer.close()
+    stop_logging()
+
 
 # OpenAPI Generation is handled automatically by FastAPI.
 app = FastAPI(
@@ -17,9 +71,13 @@ app = FastAPI(
     description="Allows a google authenticated user to download videos from YouTube.",
     version="1.0.0",
     contact={"name": "Jean Motte", "email": "jijimotte@gmail.com"},
+    lifespan=lifespan,
 )
 
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+app.add_middleware(MetricsMiddleware)
+# Outermost, so the request ID is set for everything below.
+app.add_middleware(RequestContextMiddleware)
 
 app.include_router(auth_controller.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(video_controller.router, prefix="/api/video", tags=["Video"])
@@ -32,13 +90,27 @@ def health_check():
     return {"status": "ok"}
 
 
-@app.on_event("startup")
-async def test_db_connection():
-    """Test database connection on startup using an async session."""
-    print("Testing database connection...")
-    try:
-        async with AsyncSessionFactory() as session:
-            await session.execute(text("SELECT 1"))
-        print("✅ Database connection successful.")
-    except Exception as e:
-        print(f"❌ Failed to connect to the database: {e}")
+@app.get("/ready", tags=["Health"])
+def readiness_check():
+    """Readiness endpoint, 503 until the warm-up succeeded."""
+    return JSONResponse(
+        {"ready": readiness.ready, "checks": readiness.checks},
+        status_code=200 if readiness.ready else 503,
+    )
+
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+def metrics():
+    """Expose the service metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.exception_handler(StarletteHTTPException)
+async def count_http_errors(request: Request, exc: StarletteHTTPException):
+    """Count HTTP errors by the exception they were raised from."""
+    # Controllers raise HTTPException while handling the original error.
+    record_error(exc.__cause__ or exc.__context__ or exc)
+    return await http_exception_handler(request, exc)
+
+
+record_startup_milestone("imported")
@@ -0,0 +1,139 @@
+import os
+import tempfile
+from functools import lru_cache
+from typing import Literal, Optional
+
+from pydantic import Field, NonNegativeInt, PositiveInt
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+FFmpegPreset = Literal[
+    "ultrafast",
+    "superfast",
+    "veryfast",
+    "faster",
+    "fast",
+    "medium",
+    "slow",
+    "slower",
+    "veryslow",
+]
+
+
+class Settings(BaseSettings):
+    """
+    Performance and resource tuning of the service.
+
+    Every field is read from the environment variable of the same name in
+    upper case, e.g. `DB_POOL_SIZE`, and empty variables keep the default.
+    Secrets and connection strings are still read by `env.py` modules.
+    """
+
+    model_config = SettingsConfigDict(env_ignore_empty=True, extra="ignore")
+
+    # -- Database pool
+    db_pool_size: PositiveInt = 5
+    db_max_overflow: NonNegativeInt = 10
+    db_pool_timeout_seconds: float = 30
+    db_pool_recycle_seconds: int = 1800
+    # Logs every statement, prefer LOG_LEVELS="sqlalchemy.engine=INFO".
+    db_echo: bool = False
+
+    # -- Concurrency
+    # Threads of the event loop's default executor, None keeps asyncio's.
+    default_executor_workers: Optional[PositiveInt] = None
+    # yt-dlp extractions running at once, each one holds a worker thread.
+    scheduler_extraction_workers: PositiveInt = 4
+    # ffmpeg jobs running at once.
+    scheduler_transcode_slots: PositiveInt = Field(
+        default_factory=lambda: os.cpu_count() or 2
+    )
+    # Slots a single user may hold at once in each pool.
+    scheduler_per_user_limit: PositiveInt = 2
+    # Requests allowed to wait for a slot in each pool before rejecting new ones.
+    scheduler_max_queue: NonNegativeInt = 32
+    # Extractions a formats batch runs at once, the per-user limit if unset.
+    formats_batch_concurrency: Optional[PositiveInt] = None
+    # Samples of a multi-range download cut at once.
+    samples_cut_concurrency: PositiveInt = 2
+
+    # -- yt-dlp
+    # Idle YoutubeDL instances kept for reuse, per cookie jar and in total.
+    ydl_pool_max_idle_per_key: NonNegativeInt = 4
+    ydl_pool_max_idle: NonNegativeInt = 32
+    # Idle instances unused for this long are closed.
+    ydl_pool_idle_ttl_seconds: float = 300
+
+    # -- ffmpeg
+    ffmpeg_preset: FFmpegPreset = "veryfast"
+    # Threads of each x264 encode, 0 lets ffmpeg decide.
+    ffmpeg_threads: NonNegativeInt = 0
+
+    # -- Caches
+    info_cache_size: NonNegativeInt = 256
+    # How long info dicts whose media URLs have no known expiry are kept.
+    info_cache_default_ttl_seconds: float = 300
+    info_cache_max_ttl_seconds: float = 3 * 3600
+    # Info dicts are dropped this long before their media URLs expire.
+    info_cache_expiry_margin_seconds: float = 600
+    result_cache_dir: str = os.path.join(
+        tempfile.gettempdir(), "yt_download_service", "results"
+    )
+    # Total size of the cached clips. 0 disables the cache.
+    result_cache_max_bytes: NonNegativeInt = 2 * 1024**3
+    # Decoded X-Youtube-Cookies jars, kept this long after their last use.
+    cookie_jar_cache_size: NonNegativeInt = 64
+    cookie_jar_ttl_seconds: float = 600
+    auth_cache_size: NonNegativeInt = 1024
+    # Changes made by other instances are seen after at most this long.
+    auth_user_cache_ttl_seconds: float = 60
+
+    # -- Files
+    # Where downloads and samples are written, the system default if unset.
+    scratch_dir: Optional[str] = None
+
+    # -- Limits
+    max_video_duration_seconds: PositiveInt = 180
+    max_sample_duration_seconds: PositiveInt = 180
+    # Total length of the samples of a multi-range download.
+    max_samples_total_seconds: PositiveInt = 600
+    access_token_expire_minutes: PositiveInt = 30
+
+    # -- Download jobs
+    # How long finished jobs, and their files, are kept for the client to fetch.
+    job_result_ttl_seconds: float = 15 * 60
+    # Unfinished jobs a single user may have at once.
+    job_max_pending_per_user: PositiveInt = 10
+
+    # -- History writes
+    # Entries written by a single INSERT.
+    history_batch_size: PositiveInt = 100
+    # How long an entry may wait for its batch to fill up.
+    history_flush_interval_seconds: float = 0.5
+    # Entries kept in memory when the database falls behind.
+    history_max_pending: PositiveInt = 10_000
+
+    # -- History API
+    # Entries returned by `GET /api/history` when the client sets no limit.
+    history_page_size: PositiveInt = 50
+    history_max_page_size: PositiveInt = 500
+    # Rows fetched from the database cursor at once by history exports.
+    history_export_batch_size: PositiveInt = 500
+
+    # -- Logging
+    log_level: str = "INFO"
+    # Per-logger levels, e.g. "sqlalchemy.engine=INFO,yt_download_service.span=DEBUG".
+    log_levels: str = ""
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Return the settings, read from the environment on first use."""
+    return Settings()
+
+
+def format_duration_limit(seconds: int) -> str:
+    """Describe a duration limit for error messages, e.g. "3 minutes"."""
+    if seconds % 60 == 0:
+        minutes = seconds // 60
+        return f"{minutes} minute" if minutes == 1 else f"{minutes} minutes"
+    return f"{seconds} seconds"
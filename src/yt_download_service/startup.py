@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import shutil
+from typing import Any, Callable, Dict
+
+from yt_download_service.app.use_cases.video_service import VideoService
+from yt_download_service.app.utils.lazy_import import preload_lazy_modules
+from yt_download_service.app.utils.metrics import record_startup_milestone
+from yt_download_service.app.utils.tracing import span
+from yt_download_service.infrastructure.database.session import get_engine
+from yt_download_service.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Checks the service cannot serve without. The database may recover on
+# its own, so a failure there is reported without holding readiness back.
+REQUIRED_CHECKS = ("imports", "ffmpeg", "yt_dlp")
+
+
+class Readiness:
+    """Whether the warm-up is over, and how each of its checks went."""
+
+    def __init__(self) -> None:
+        self.warmed_up = False
+        self.checks: Dict[str, bool] = {}
+
+    @property
+    def ready(self) -> bool:
+        """Whether the service should receive traffic."""
+        return self.warmed_up and all(
+            self.checks.get(name, False) for name in REQUIRED_CHECKS
+        )
+
+
+readiness = Readiness()
+
+
+def _check_ffmpeg() -> bool:
+    """Check that the ffmpeg and ffprobe executables can be found."""
+    missing = [name for name in ("ffmpeg", "ffprobe") if shutil.which(name) is None]
+    if missing:
+        logger.error("Not found on the PATH: %s", ", ".join(missing))
+    return not missing
+
+
+async def _open_db_connections() -> None:
+    """Open as many connections as the pool keeps, and leave them in it."""
+    from sqlalchemy import text
+
+    engine = get_engine()
+
+    async def connect() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    # Held at once, so the pool has to open a new connection for each.
+    await asyncio.gather(*(connect() for _ in range(get_settings().db_pool_size)))
+
+
+async def _run_check(name: str, check: Callable[[], Any]) -> None:
+    """Run one warm-up step, failed if it raises or returns False."""
+    try:
+        with span("warm_up", step=name):
+            result = check()
+            if asyncio.iscoroutine(result):
+                result = await result
+        readiness.checks[name] = result is not False
+    except Exception:
+        logger.exception("Warm-up step %s failed", name)
+        readiness.checks[name] = False
+
+
+async def warm_up(video_service: VideoService) -> None:
+    """
+    Do the work first requests would otherwise pay for, then turn ready.
+
+    Runs in the background once the application has started: imports the
+    lazily imported dependencies, opens the database connections, builds
+    the yt-dlp instances and checks that ffmpeg is installed.
+    """
+    await _run_check("imports", lambda: asyncio.to_thread(preload_lazy_modules))
+    await _run_check("ffmpeg", _check_ffmpeg)
+    await _run_check("database", _open_db_connections)
+    await _run_check("yt_dlp", lambda: asyncio.to_thread(video_service.warm_up))
+    readiness.warmed_up = True
+    if readiness.ready:
+        record_startup_milestone("ready")
+        logger.info("Service ready", extra={"checks": readiness.checks})
+    else:
+        logger.error("Service not ready", extra={"checks": readiness.checks})
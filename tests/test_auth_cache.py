@@ -0,0 +1,132 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+
+from yt_download_service.app.utils import auth_cache as auth_cache_module
+from yt_download_service.app.utils.auth_cache import AuthCache, auth_cache
+from yt_download_service.app.utils.jwt_handler import create_access_token
+from yt_download_service.domain.models.user import UserCreate, UserRead
+from yt_download_service.infrastructure.services.user_service import UserService
+
+EMAIL = "alice@example.com"
+
+
+class FakeResult:
+    """Result of a query returning `row`."""
+
+    def __init__(self, row) -> None:
+        self.row = row
+
+    def scalars(self) -> "FakeResult":
+        """Return itself, holding a single column."""
+        return self
+
+    def first(self):
+        """Return the row, if any."""
+        return self.row
+
+
+class FakeSession:
+    """Async session over a single users table, counting the queries."""
+
+    def __init__(self) -> None:
+        self.users = []
+        self.queries = 0
+
+    def add(self, user) -> None:
+        """Stage a user."""
+        self.users.append(user)
+
+    async def commit(self) -> None:
+        """Commit nothing, the users are already stored."""
+
+    async def refresh(self, user) -> None:
+        """Fill in the columns the database would."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        user.id, user.created_at, user.updated_at = uuid.uuid4(), now, now
+
+    async def execute(self, statement) -> FakeResult:
+        """Answer any query with the last user added."""
+        self.queries += 1
+        return FakeResult(self.users[-1] if self.users else None)
+
+
+@pytest.fixture(autouse=True)
+def empty_auth_cache():
+    auth_cache.clear()
+    yield
+    auth_cache.clear()
+
+
+def user(email: str = EMAIL) -> UserRead:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return UserRead(id=uuid.uuid4(), email=email, created_at=now, updated_at=now)
+
+
+def test_creating_a_user_invalidates_the_cached_lookups():
+    async def main():
+        stale = user()
+        auth_cache.set_user(stale)
+        db = FakeSession()
+        users = UserService()
+
+        created = await users.create(db, UserCreate(email=EMAIL, first_name="Alice"))
+
+        assert auth_cache.get_user_by_email(EMAIL) is None
+        assert auth_cache.get_user_by_id(stale.id) is None
+        found = await users.get_by_email(db, EMAIL)
+        assert (found.id, found.first_name) == (created.id, "Alice")
+        # Read from the database once, then from the cache.
+        assert await users.get_by_id(db, created.id) == found
+        assert db.queries == 1
+
+    asyncio.run(main())
+
+
+def test_invalidating_a_user_forgets_both_of_its_keys():
+    cache = AuthCache()
+    cached = user()
+    cache.set_user(cached)
+
+    cache.invalidate_user(email=EMAIL)
+
+    assert cache.get_user_by_id(cached.id) is None
+
+
+def test_users_expire_after_the_ttl(clock):
+    cache = AuthCache(user_ttl=60)
+    cached = user()
+    cache.set_user(cached)
+
+    clock.now += 59
+    assert cache.get_user_by_email(EMAIL) == cached
+
+    clock.now += 1
+    assert cache.get_user_by_email(EMAIL) is None
+    assert cache.get_user_by_id(cached.id) is None
+
+
+def test_tokens_are_cached_until_they_expire(clock, monkeypatch):
+    decoded = []
+    decode = auth_cache_module.decode_access_token
+
+    def decode_access_token(token):
+        decoded.append(token)
+        return decode(token)
+
+    monkeypatch.setattr(auth_cache_module, "decode_access_token", decode_access_token)
+    cache = AuthCache()
+    token = create_access_token(
+        {"sub": EMAIL}, expires_delta=datetime.timedelta(seconds=60)
+    )
+
+    assert cache.decode_token(token)["sub"] == EMAIL
+    clock.now += 55
+    assert cache.decode_token(token)["sub"] == EMAIL
+    assert len(decoded) == 1
+
+    clock.now += 10
+    cache.decode_token(token)
+    assert len(decoded) == 2
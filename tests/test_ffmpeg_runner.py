@@ -0,0 +1,72 @@
+import asyncio
+import shutil
+
+import pytest
+
+from yt_download_service.app.utils.ffmpeg_runner import (
+    FFmpegError,
+    run_ffmpeg,
+    stream_ffmpeg,
+)
+from yt_download_service.app.utils.metrics import FFMPEG_ACTIVE
+
+# Stand-ins for ffmpeg: the runner only cares about pipes and exit codes.
+pytestmark = pytest.mark.skipif(
+    shutil.which("yes") is None or shutil.which("false") is None,
+    reason="coreutils are not installed",
+)
+
+
+def active(program: str) -> float:
+    return dict((labels, value) for _, labels, value in FFMPEG_ACTIVE.samples()).get(
+        f'{{program="{program}"}}', 0
+    )
+
+
+def test_abandoned_stream_is_killed_and_reaped():
+    async def main():
+        before = active("yes")
+        stream = await stream_ffmpeg(["yes"], chunk_size=1024)
+        await anext(stream)
+        assert active("yes") == before + 1
+        # Let `yes` fill the pipe, so unread output is left behind.
+        await asyncio.sleep(0.2)
+
+        await asyncio.wait_for(stream.aclose(), 10)
+
+        assert active("yes") == before
+
+    asyncio.run(main())
+
+
+def test_stream_dropped_unread_is_killed_and_reaped():
+    async def main():
+        before = active("yes")
+        await stream_ffmpeg(["yes"])
+        # The garbage collected stream is closed by the event loop.
+        for _ in range(100):
+            if active("yes") == before:
+                break
+            await asyncio.sleep(0.1)
+        assert active("yes") == before
+
+    asyncio.run(main())
+
+
+def test_cancelled_run_is_killed_and_reaped():
+    async def main():
+        before = active("yes")
+        task = asyncio.create_task(run_ffmpeg(["yes"]))
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, 10)
+        assert active("yes") == before
+
+    asyncio.run(main())
+
+
+def test_failure_without_output_reports_the_exit_code():
+    with pytest.raises(FFmpegError, match="false exited with code 1"):
+        asyncio.run(run_ffmpeg(["false"]))
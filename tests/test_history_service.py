@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from yt_download_service.app.use_cases.history_service import (
+    HistoryService,
+    decode_history_cursor,
+    encode_history_cursor,
+)
+from yt_download_service.infrastructure.database.models import DBHistory, DBUser
+
+USER_ID = uuid.uuid4()
+NOON = datetime.datetime(2026, 1, 1, 12)
+
+
+class SQLiteSession:
+    """
+    Async session over an in-memory SQLite database.
+
+    Enough for the history pages, plain SELECTs. The statistics upserts
+    are Postgres-specific and cannot run here.
+    """
+
+    def __init__(self) -> None:
+        engine = create_engine("sqlite://")
+        for table in (DBUser.__table__, DBHistory.__table__):
+            table.create(engine)
+        self.session = Session(engine)
+
+    def add_entries(self, user_id: uuid.UUID, created_ats) -> list:
+        """Add entries created at the given times, and return their IDs."""
+        ids = []
+        for index, created_at in enumerate(created_ats):
+            ids.append(uuid.uuid4())
+            self.session.add(
+                DBHistory(
+                    id=ids[-1],
+                    user_id=user_id,
+                    yt_video_url=f"https://www.youtube.com/watch?v=video{index:05d}",
+                    video_title=f"Video {index}",
+                    format_id="136",
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+            )
+        self.session.commit()
+        return ids
+
+    async def execute(self, statement):
+        """Run a statement."""
+        return self.session.execute(statement)
+
+
+def newest_first(ids, created_ats):
+    return [
+        history_id
+        for created_at, history_id in sorted(
+            zip(created_ats, ids), key=lambda entry: (-entry[0].timestamp(), entry[1])
+        )
+    ]
+
+
+async def all_pages(db: SQLiteSession, limit: int):
+    service = HistoryService()
+    pages, cursor = [], None
+    while True:
+        page, cursor = await service.get_history_page(
+            db, USER_ID, limit=limit, cursor=cursor
+        )
+        pages.append([entry.id for entry in page])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    cursor = (datetime.datetime(2026, 1, 1, 12, 0, 0, 123456), uuid.uuid4())
+
+    encoded = encode_history_cursor(cursor)
+
+    assert "=" not in encoded
+    assert decode_history_cursor(encoded) == cursor
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not a cursor",
+        base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+        base64.urlsafe_b64encode(b"2026-01-01T12:00:00").decode(),
+        base64.urlsafe_b64encode(b"yesterday|not-a-uuid").decode(),
+    ],
+)
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid history cursor"):
+        decode_history_cursor(cursor)
+    with pytest.raises(ValueError, match="Invalid history cursor"):
+        asyncio.run(
+            HistoryService().get_history_page(
+                SQLiteSession(), USER_ID, limit=10, cursor=cursor
+            )
+        )
+
+
+def test_pages_split_entries_created_at_the_same_time():
+    db = SQLiteSession()
+    created_ats = [NOON] * 4 + [
+        NOON - datetime.timedelta(hours=hours) for hours in (1, 2)
+    ]
+    ids = db.add_entries(USER_ID, created_ats)
+    db.add_entries(uuid.uuid4(), [NOON])
+
+    pages = asyncio.run(all_pages(db, limit=3))
+
+    # Each entry once, in order, although the first page ends among ties.
+    assert [len(page) for page in pages] == [3, 3]
+    assert sum(pages, []) == newest_first(ids, created_ats)
+
+
+def test_last_page_returns_no_cursor():
+    db = SQLiteSession()
+    created_ats = [NOON - datetime.timedelta(minutes=minutes) for minutes in range(4)]
+    ids = db.add_entries(USER_ID, created_ats)
+
+    # A full last page does not announce an empty one.
+    assert asyncio.run(all_pages(db, limit=2)) == [ids[:2], ids[2:]]
+    assert asyncio.run(all_pages(db, limit=10)) == [ids]
+    assert asyncio.run(all_pages(SQLiteSession(), limit=10)) == [[]]
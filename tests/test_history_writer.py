@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import uuid
+
+from yt_download_service.app.use_cases.history_service import HistoryService
+from yt_download_service.app.use_cases.history_writer import HistoryWriter
+
+USER_ID = uuid.uuid4()
+
+
+class FakeDatabase:
+    """Hands out sessions recording the rows inserted in `history`."""
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.rollbacks = 0
+        # Connections are refused, or lost during the INSERT.
+        self.down = False
+        self.failing = False
+
+    def session(self) -> "FakeSession":
+        """Open a session, as the application's session factory does."""
+        return FakeSession(self)
+
+
+class FakeSession:
+    """Async session writing to a FakeDatabase."""
+
+    def __init__(self, database: FakeDatabase) -> None:
+        self.database = database
+
+    async def __aenter__(self) -> "FakeSession":
+        """Open the session."""
+        if self.database.down:
+            raise ConnectionRefusedError("Connection refused")
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Close the session."""
+
+    async def execute(self, statement, params=None) -> None:
+        """Record the rows of multi-row INSERTs into `history`."""
+        if self.database.failing:
+            raise ConnectionResetError("Connection lost")
+        if getattr(statement, "table", None) is not None and params is not None:
+            assert statement.table.name == "history"
+            self.database.batches.append(params)
+
+    async def commit(self) -> None:
+        """Commit the batch."""
+
+    async def rollback(self) -> None:
+        """Count the rollback."""
+        self.database.rollbacks += 1
+
+
+def make_writer(database: FakeDatabase, **kwargs) -> HistoryWriter:
+    return HistoryWriter(HistoryService(), session_factory=database.session, **kwargs)
+
+
+def record(writer: HistoryWriter, index: int) -> None:
+    writer.record(
+        user_id=USER_ID,
+        video_url=f"https://www.youtube.com/watch?v=video{index:05d}",
+        video_title=f"Video {index}",
+        format_id="136",
+        resolution="1280x720",
+        start_time_str="00:00:10",
+        end_time_str="00:00:40",
+    )
+
+
+def titles(database: FakeDatabase):
+    return [[row["video_title"] for row in batch] for batch in database.batches]
+
+
+def test_full_batches_are_written_in_multi_row_inserts():
+    async def main():
+        database = FakeDatabase()
+        writer = make_writer(database, batch_size=3, flush_interval=60)
+        for index in range(7):
+            record(writer, index)
+
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+        assert titles(database) == [
+            ["Video 0", "Video 1", "Video 2"],
+            ["Video 3", "Video 4", "Video 5"],
+            ["Video 6"],
+        ]
+        row = database.batches[0][0]
+        assert (row["user_id"], row["start_time"], row["end_time"]) == (
+            USER_ID,
+            10,
+            40,
+        )
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_partial_batch_is_written_after_the_flush_interval():
+    async def main():
+        database = FakeDatabase()
+        writer = make_writer(database, batch_size=10, flush_interval=0.05)
+        record(writer, 0)
+
+        await asyncio.sleep(0)
+        assert database.batches == []
+        await asyncio.sleep(0.1)
+        assert titles(database) == [["Video 0"]]
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_flush_writes_the_pending_entries_now():
+    async def main():
+        database = FakeDatabase()
+        writer = make_writer(database, batch_size=10, flush_interval=60)
+        record(writer, 0)
+        record(writer, 1)
+
+        await writer.flush()
+
+        assert titles(database) == [["Video 0", "Video 1"]]
+        await writer.close()
+        assert len(database.batches) == 1
+
+    asyncio.run(main())
+
+
+def test_close_writes_what_is_left():
+    async def main():
+        database = FakeDatabase()
+        writer = make_writer(database, batch_size=2, flush_interval=60)
+        for index in range(3):
+            record(writer, index)
+
+        await writer.close()
+
+        assert titles(database) == [["Video 0", "Video 1"], ["Video 2"]]
+
+    asyncio.run(main())
+
+
+def test_batch_is_dropped_when_the_database_is_down(caplog):
+    async def main():
+        database = FakeDatabase()
+        writer = make_writer(database, batch_size=2, flush_interval=60)
+        database.down = True
+        for index in range(2):
+            record(writer, index)
+
+        with caplog.at_level(logging.ERROR):
+            await writer.flush()
+        assert "Could not save 2 history entries" in caplog.text
+
+        # The writer carries on with the next entries once it is back.
+        database.down = False
+        record(writer, 2)
+        await writer.close()
+        assert titles(database) == [["Video 2"]]
+
+    asyncio.run(main())
+
+
+def test_failed_insert_is_rolled_back_and_dropped(caplog):
+    async def main():
+        database = FakeDatabase()
+        writer = make_writer(database, batch_size=2, flush_interval=60)
+        database.failing = True
+        record(writer, 0)
+
+        with caplog.at_level(logging.ERROR):
+            await writer.close()
+
+        assert database.rollbacks == 1
+        assert database.batches == []
+        assert "Could not save 1 history entries" in caplog.text
+
+    asyncio.run(main())
+
+
+def test_entries_past_the_pending_limit_are_dropped(caplog):
+    async def main():
+        database = FakeDatabase()
+        writer = make_writer(database, batch_size=10, flush_interval=60, max_pending=2)
+        with caplog.at_level(logging.WARNING):
+            for index in range(3):
+                record(writer, index)
+        assert "dropping an entry" in caplog.text
+
+        await writer.close()
+        assert titles(database) == [["Video 0", "Video 1"]]
+
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from yt_download_service.app.utils.info_cache import (
+    VideoInfoCache,
+    make_info_cache_key,
+)
+
+KEY = make_info_cache_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+
+
+def info_dict(expire=None):
+    url = "https://media.example/136"
+    if expire is not None:
+        url += f"?expire={int(expire)}"
+    return {"id": "dQw4w9WgXcQ", "formats": [{"format_id": "136", "url": url}]}
+
+
+def test_concurrent_lookups_share_one_extraction():
+    cache = VideoInfoCache()
+    started = threading.Event()
+    unblock = threading.Event()
+    extractions = []
+
+    def extract():
+        extractions.append(1)
+        started.set()
+        unblock.wait(5)
+        return info_dict()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(cache.get_or_extract, KEY, extract)
+        assert started.wait(5)
+        followers = [
+            executor.submit(cache.get_or_extract, KEY, extract) for _ in range(3)
+        ]
+        # Let the followers reach the flight before it lands.
+        time.sleep(0.1)
+        unblock.set()
+        results = [leader.result(5)] + [follower.result(5) for follower in followers]
+
+    assert extractions == [1]
+    assert all(result is results[0] for result in results)
+    assert cache.get_or_extract(KEY, extract) is results[0]
+    assert extractions == [1]
+
+
+def test_leader_error_reaches_followers_and_is_not_cached():
+    cache = VideoInfoCache()
+    started = threading.Event()
+    unblock = threading.Event()
+
+    def fail():
+        started.set()
+        unblock.wait(5)
+        raise ValueError("Video unavailable")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(cache.get_or_extract, KEY, fail)
+        assert started.wait(5)
+        follower = executor.submit(cache.get_or_extract, KEY, fail)
+        time.sleep(0.1)
+        unblock.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="Video unavailable"):
+                future.result(5)
+
+    # The next lookup extracts again, and succeeds.
+    assert cache.get_or_extract(KEY, info_dict) == info_dict()
+
+
+def test_entries_expire_after_the_default_ttl(clock):
+    cache = VideoInfoCache(default_ttl=300)
+    first = cache.get_or_extract(KEY, info_dict)
+
+    clock.now += 299
+    assert cache.get_or_extract(KEY, info_dict) is first
+
+    clock.now += 1
+    assert cache.get_or_extract(KEY, info_dict) is not first
+
+
+def test_entries_expire_before_their_media_urls(clock):
+    cache = VideoInfoCache(default_ttl=300, max_ttl=3 * 3600, expiry_margin=600)
+    expiring = info_dict(expire=time.time() + 1200)
+    cache.get_or_extract(KEY, lambda: expiring)
+
+    # Served until the margin before the URLs expire, not the default TTL.
+    clock.now += 590
+    assert cache.get_or_extract(KEY, info_dict) is expiring
+    clock.now += 20
+    assert cache.get_or_extract(KEY, info_dict) is not expiring
+
+
+def test_urls_expiring_within_the_margin_are_not_cached():
+    cache = VideoInfoCache(expiry_margin=600)
+    expiring = info_dict(expire=time.time() + 300)
+
+    assert cache.get_or_extract(KEY, lambda: expiring) is expiring
+    assert cache.get_or_extract(KEY, info_dict) is not expiring
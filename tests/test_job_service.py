@@ -0,0 +1,225 @@
+import asyncio
+import datetime
+import os
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from yt_download_service.app.controllers import video_controller
+from yt_download_service.app.domain.schemas import DownloadJobRequest, DownloadResult
+from yt_download_service.app.use_cases.job_service import (
+    JobNotFoundError,
+    JobNotReadyError,
+    JobService,
+)
+from yt_download_service.app.use_cases.video_service import VideoService
+from yt_download_service.app.utils.progress import ProgressBroker
+from yt_download_service.app.utils.scheduler import SchedulerFullError
+from yt_download_service.domain.models.user import UserRead
+
+VIDEO_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+ALICE = uuid.uuid4()
+BOB = uuid.uuid4()
+
+
+class FakeHistoryWriter:
+    """Collects the history entries instead of writing them."""
+
+    def __init__(self) -> None:
+        self.entries = []
+
+    def record(self, **entry) -> None:
+        """Keep the entry."""
+        self.entries.append(entry)
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    """Make full downloads wait for `finish` and write a file under `tmp_path`."""
+    state = {"started": 0, "finish": asyncio.Event()}
+
+    async def download_full_video(url, format_id=None, **kwargs):
+        state["started"] += 1
+        await state["finish"].wait()
+        if state.get("error"):
+            raise ValueError(state["error"])
+        path = tmp_path / f"video_{state['started']}.mp4"
+        path.write_bytes(b"video")
+        return DownloadResult(
+            file_path=str(path),
+            video_title="Test video",
+            resolution="1280x720",
+            final_format_id="136",
+            video_processing="copy",
+            audio_processing="copy",
+        )
+
+    service = VideoService()
+    monkeypatch.setattr(service, "download_full_video", download_full_video)
+    state["service"] = service
+    yield state
+    service.close()
+
+
+def make_jobs(downloads, **kwargs) -> JobService:
+    return JobService(
+        downloads["service"], FakeHistoryWriter(), ProgressBroker(), **kwargs
+    )
+
+
+def submit(jobs: JobService, user_id=ALICE):
+    return jobs.submit(DownloadJobRequest(url=VIDEO_URL), user_id)
+
+
+async def settle(jobs: JobService, job_id: str) -> None:
+    await asyncio.wait_for(asyncio.shield(jobs._jobs[job_id].task), 5)
+
+
+def test_submitted_job_is_polled_then_fetched(downloads):
+    async def main():
+        jobs = make_jobs(downloads, result_ttl=60)
+        status = submit(jobs)
+        assert status.status == "queued"
+        await asyncio.sleep(0)
+        assert jobs.get_status(status.job_id, ALICE).status == "running"
+
+        downloads["finish"].set()
+        await settle(jobs, status.job_id)
+
+        status = jobs.get_status(status.job_id, ALICE)
+        assert status.status == "succeeded"
+        assert status.expires_at - status.finished_at == datetime.timedelta(seconds=60)
+        assert status.video_title == "Test video"
+        result = jobs.get_result(status.job_id, ALICE)
+        with open(result.file_path, "rb") as f:
+            assert f.read() == b"video"
+        (entry,) = jobs.history_writer.entries
+        assert entry["user_id"] == ALICE
+        assert entry["format_id"] == "136"
+        await jobs.close()
+
+    asyncio.run(main())
+
+
+def test_jobs_are_only_visible_to_their_owner(downloads):
+    async def main():
+        jobs = make_jobs(downloads)
+        status = submit(jobs)
+
+        with pytest.raises(JobNotFoundError):
+            jobs.get_status(status.job_id, BOB)
+        with pytest.raises(JobNotFoundError):
+            jobs.get_status("unknown", ALICE)
+        await jobs.close()
+
+    asyncio.run(main())
+
+
+def test_result_of_an_unfinished_job_is_a_409(downloads, monkeypatch):
+    async def main():
+        jobs = make_jobs(downloads)
+        monkeypatch.setattr(video_controller, "job_service", jobs)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        user = UserRead(
+            id=ALICE, email="alice@example.com", created_at=now, updated_at=now
+        )
+        status = submit(jobs)
+
+        with pytest.raises(JobNotReadyError, match="is queued"):
+            jobs.get_result(status.job_id, ALICE)
+        with pytest.raises(HTTPException) as error:
+            await video_controller.get_download_job_result(status.job_id, user)
+        assert error.value.status_code == 409
+        await jobs.close()
+
+    asyncio.run(main())
+
+
+def test_failed_job_reports_its_error(downloads):
+    async def main():
+        jobs = make_jobs(downloads)
+        downloads["error"] = "Video unavailable"
+        status = submit(jobs)
+
+        downloads["finish"].set()
+        await settle(jobs, status.job_id)
+
+        status = jobs.get_status(status.job_id, ALICE)
+        assert (status.status, status.error) == ("failed", "Video unavailable")
+        with pytest.raises(JobNotReadyError, match="is failed"):
+            jobs.get_result(status.job_id, ALICE)
+        assert jobs.history_writer.entries == []
+        await jobs.close()
+
+    asyncio.run(main())
+
+
+def test_discarding_cancels_a_running_job(downloads):
+    async def main():
+        jobs = make_jobs(downloads)
+        status = submit(jobs)
+        await asyncio.sleep(0)
+        task = jobs._jobs[status.job_id].task
+
+        jobs.discard(status.job_id)
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(JobNotFoundError):
+            jobs.get_status(status.job_id, ALICE)
+        assert jobs.history_writer.entries == []
+
+    asyncio.run(main())
+
+
+def test_discarding_a_finished_job_deletes_its_file(downloads):
+    async def main():
+        jobs = make_jobs(downloads)
+        status = submit(jobs)
+        downloads["finish"].set()
+        await settle(jobs, status.job_id)
+        path = jobs.get_result(status.job_id, ALICE).file_path
+
+        jobs.discard(status.job_id)
+
+        assert not os.path.exists(path)
+        with pytest.raises(JobNotFoundError):
+            jobs.get_result(status.job_id, ALICE)
+
+    asyncio.run(main())
+
+
+def test_finished_jobs_expire_after_the_result_ttl(downloads):
+    async def main():
+        jobs = make_jobs(downloads, result_ttl=0.05)
+        status = submit(jobs)
+        downloads["finish"].set()
+        await settle(jobs, status.job_id)
+        path = jobs.get_result(status.job_id, ALICE).file_path
+
+        await asyncio.sleep(0.1)
+
+        with pytest.raises(JobNotFoundError):
+            jobs.get_status(status.job_id, ALICE)
+        assert not os.path.exists(path)
+
+    asyncio.run(main())
+
+
+def test_users_with_too_many_unfinished_jobs_are_turned_away(downloads):
+    async def main():
+        jobs = make_jobs(downloads, max_pending_per_user=1)
+        first = submit(jobs)
+
+        with pytest.raises(SchedulerFullError) as error:
+            submit(jobs)
+        assert error.value.retry_after == 30
+        # Other users are not affected, nor is the user once the job is done.
+        submit(jobs, BOB)
+        downloads["finish"].set()
+        await settle(jobs, first.job_id)
+        submit(jobs)
+        await jobs.close()
+
+    asyncio.run(main())
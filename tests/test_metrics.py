@@ -0,0 +1,188 @@
+import math
+import re
+from typing import Dict, List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from yt_download_service.app.utils.metrics import (
+    CONTENT_TYPE,
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+)
+
+# Grammar of the Prometheus text exposition format, version 0.0.4.
+_NAME = r"[a-zA-Z_:][a-zA-Z0-9_:]*"
+_LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\"n])*"'
+_SAMPLE_PATTERN = re.compile(
+    rf"^(?P<name>{_NAME})(?:\{{(?P<labels>{_LABEL}(?:,{_LABEL})*)\}})?"
+    r" (?P<value>[+-]Inf|NaN|-?\d+(?:\.\d+)?(?:e[+-]?\d+)?)$"
+)
+_HELP_PATTERN = re.compile(rf"^# HELP (?P<name>{_NAME}) (?P<text>.*)$")
+_TYPE_PATTERN = re.compile(
+    rf"^# TYPE (?P<name>{_NAME}) (?P<kind>counter|gauge|histogram|untyped)$"
+)
+_LABEL_PAIR_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def parse_exposition(text: str) -> Tuple[Dict[str, str], List[Sample]]:
+    """
+    Parse exposition text strictly, failing on any malformed line.
+
+    Returns
+    -------
+        The type of each metric family, and the samples in order.
+
+    """
+    assert text.endswith("\n")
+    kinds: Dict[str, str] = {}
+    samples: List[Sample] = []
+    for line in text[:-1].split("\n"):
+        if match := _TYPE_PATTERN.match(line):
+            assert match["name"] not in kinds, f"duplicate TYPE: {line}"
+            kinds[match["name"]] = match["kind"]
+        elif line.startswith("# HELP"):
+            assert _HELP_PATTERN.match(line), f"malformed HELP: {line}"
+        else:
+            match = _SAMPLE_PATTERN.match(line)
+            assert match, f"malformed sample: {line!r}"
+            family = re.sub(r"_(total|bucket|sum|count)$", "", match["name"])
+            assert family in kinds or match["name"] in kinds, f"no TYPE: {line}"
+            labels = dict(_LABEL_PAIR_PATTERN.findall(match["labels"] or ""))
+            samples.append((match["name"], labels, float(match["value"])))
+    return kinds, samples
+
+
+def render(metric) -> str:
+    return metric.render() + "\n"
+
+
+def test_counter_renders_one_total_per_label_set():
+    counter = Counter("ytds_test_bytes", "Bytes sent.", ("route",))
+    counter.inc(100, route="/b")
+    counter.inc(2.5, route="/a")
+    counter.inc(route="/a")
+
+    kinds, samples = parse_exposition(render(counter))
+
+    assert kinds == {"ytds_test_bytes": "counter"}
+    assert samples == [
+        ("ytds_test_bytes_total", {"route": "/a"}, 3.5),
+        ("ytds_test_bytes_total", {"route": "/b"}, 100),
+    ]
+
+
+def test_label_values_and_help_are_escaped():
+    counter = Counter("ytds_test_errors", 'Errors, "quoted"\nand \\ escaped.', ("t",))
+    counter.inc(t='a"b\\c\nd')
+
+    text = render(counter)
+
+    assert '# HELP ytds_test_errors Errors, \\"quoted\\"\\nand \\\\ escaped.' in text
+    assert 'ytds_test_errors_total{t="a\\"b\\\\c\\nd"} 1' in text
+    parse_exposition(text)
+
+
+def test_gauge_is_set_or_read_from_its_callback():
+    gauge = Gauge("ytds_test_active", "Active things.", ("pool",))
+    gauge.set(3, pool="ffmpeg")
+    gauge.inc(pool="ffmpeg")
+    gauge.dec(2, pool="ffmpeg")
+    assert parse_exposition(render(gauge))[1] == [
+        ("ytds_test_active", {"pool": "ffmpeg"}, 2)
+    ]
+
+    gauge.set_callback(lambda: {("extraction",): 7, ("ffmpeg",): 0.5})
+    assert parse_exposition(render(gauge))[1] == [
+        ("ytds_test_active", {"pool": "extraction"}, 7),
+        ("ytds_test_active", {"pool": "ffmpeg"}, 0.5),
+    ]
+
+
+def test_gauge_without_labels_has_no_braces():
+    gauge = Gauge("ytds_test_uptime", "Uptime.")
+    gauge.set(1.25)
+    assert render(gauge).splitlines()[-1] == "ytds_test_uptime 1.25"
+
+
+def test_histogram_buckets_are_cumulative_and_end_with_inf():
+    histogram = Histogram(
+        "ytds_test_seconds", "Durations.", ("stage",), buckets=(1, 0.5)
+    )
+    for value in (0.1, 0.5, 0.75, 3):
+        histogram.observe(value, stage="cut")
+
+    kinds, samples = parse_exposition(render(histogram))
+
+    assert kinds == {"ytds_test_seconds": "histogram"}
+    assert samples == [
+        ("ytds_test_seconds_bucket", {"stage": "cut", "le": "0.5"}, 2),
+        ("ytds_test_seconds_bucket", {"stage": "cut", "le": "1"}, 3),
+        ("ytds_test_seconds_bucket", {"stage": "cut", "le": "+Inf"}, 4),
+        ("ytds_test_seconds_sum", {"stage": "cut"}, 4.35),
+        ("ytds_test_seconds_count", {"stage": "cut"}, 4),
+    ]
+
+
+def test_histogram_time_observes_blocks_that_raise():
+    histogram = Histogram("ytds_test_step_seconds", "Steps.", buckets=(math.inf,))
+    with pytest.raises(RuntimeError):
+        with histogram.time():
+            raise RuntimeError("failed")
+
+    samples = dict(
+        (name, value) for name, _, value in parse_exposition(render(histogram))[1]
+    )
+    assert samples["ytds_test_step_seconds_count"] == 1
+
+
+def test_labels_must_match_the_declared_names():
+    counter = Counter("ytds_test_requests", "Requests.", ("route", "status"))
+    with pytest.raises(ValueError):
+        counter.inc(route="/a")
+    with pytest.raises(ValueError):
+        counter.inc(route="/a", status="200", method="GET")
+
+
+def test_registry_rejects_duplicate_names():
+    registry = MetricsRegistry()
+    registry.counter("ytds_test_total_things", "Things.")
+    with pytest.raises(ValueError):
+        registry.gauge("ytds_test_total_things", "Things again.")
+
+
+def test_registry_renders_every_metric():
+    registry = MetricsRegistry()
+    registry.counter("ytds_test_a", "A.").inc()
+    registry.gauge("ytds_test_b", "B.").set(2)
+    registry.histogram("ytds_test_c", "C.", buckets=(1,)).observe(0.5)
+
+    kinds, _ = parse_exposition(registry.render())
+
+    assert kinds == {
+        "ytds_test_a": "counter",
+        "ytds_test_b": "gauge",
+        "ytds_test_c": "histogram",
+    }
+
+
+def test_metrics_endpoint_serves_valid_exposition():
+    from yt_download_service.main import app
+
+    client = TestClient(app)
+    client.get("/health")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    kinds, samples = parse_exposition(response.text)
+    assert kinds["ytds_http_request_duration_seconds"] == "histogram"
+    assert any(
+        name == "ytds_http_request_duration_seconds_count"
+        and labels["route"] == "/health"
+        for name, labels, _ in samples
+    )
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from yt_download_service.app.utils.progress import (
+    NO_PROGRESS,
+    ProgressBroker,
+    parse_ffmpeg_progress,
+)
+
+
+async def collect(subscription):
+    return [event async for event in subscription]
+
+
+def test_subscribe_rejects_malformed_ids():
+    broker = ProgressBroker()
+    for progress_id in ("", "a" * 65, "../jobs", "a b"):
+        with pytest.raises(ValueError):
+            broker.subscribe(progress_id, "alice")
+
+
+def test_open_ignores_missing_or_malformed_ids():
+    async def main():
+        broker = ProgressBroker()
+        assert broker.open(None, "alice") is NO_PROGRESS
+        assert broker.open("a b", "alice") is NO_PROGRESS
+
+    asyncio.run(main())
+
+
+def test_subscriber_gets_events_of_a_later_download():
+    async def main():
+        broker = ProgressBroker()
+        subscription = asyncio.create_task(
+            collect(broker.subscribe("dl-1", "alice", heartbeat_interval=5))
+        )
+        await asyncio.sleep(0)
+
+        reporter = broker.open("dl-1", "alice")
+        reporter.publish("extracting")
+        reporter.finish()
+
+        events = await asyncio.wait_for(subscription, 5)
+        assert [event["stage"] for event in events] == [
+            "queued",
+            "extracting",
+            "done",
+        ]
+
+    asyncio.run(main())
+
+
+def test_users_cannot_take_over_each_others_ids():
+    async def main():
+        broker = ProgressBroker()
+        intruder = asyncio.create_task(
+            collect(broker.subscribe("dl-1", "mallory", heartbeat_interval=5))
+        )
+        await asyncio.sleep(0)
+
+        reporter = broker.open("dl-1", "alice")
+        assert reporter is not NO_PROGRESS
+        owner = asyncio.create_task(
+            collect(broker.subscribe("dl-1", "alice", heartbeat_interval=5))
+        )
+        await asyncio.sleep(0)
+        reporter.finish()
+
+        assert [event["stage"] for event in await owner] == ["queued", "done"]
+        assert not intruder.done()
+        intruder.cancel()
+
+    asyncio.run(main())
+
+
+def test_finished_download_is_replayed_to_late_subscribers():
+    async def main():
+        broker = ProgressBroker(finished_retention=60)
+        reporter = broker.open("dl-1", "alice")
+        reporter.fail("boom")
+        await asyncio.sleep(0)
+
+        events = await collect(broker.subscribe("dl-1", "alice"))
+        assert events == [{"stage": "failed", "error": "boom"}]
+
+    asyncio.run(main())
+
+
+def test_parse_ffmpeg_progress():
+    event = parse_ffmpeg_progress(
+        {"out_time_us": "5000000", "total_size": "1024", "speed": "2.5x"},
+        duration=10,
+    )
+    assert event == {
+        "out_time_seconds": 5.0,
+        "percent": 50.0,
+        "bytes_written": 1024,
+        "speed": 2.5,
+    }
@@ -0,0 +1,128 @@
+import os
+import time
+
+from yt_download_service.app.utils.result_cache import (
+    LEFTOVER_MAX_AGE_SECONDS,
+    ResultCache,
+    make_result_cache_key,
+)
+
+VIDEO_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def key(format_id: str):
+    return make_result_cache_key(VIDEO_URL, format_id, 10, 20)
+
+
+def clip(tmp_path, name: str, size: int) -> str:
+    path = tmp_path / f"{name}.mp4"
+    path.write_bytes(name.encode() * (size // len(name)))
+    return str(path)
+
+
+def age(path: str, seconds: float) -> None:
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def cached_media(directory: str):
+    return [name for name in os.listdir(directory) if name.endswith(".mp4")]
+
+
+def test_put_then_get_returns_a_copy_and_the_metadata(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+    source = clip(tmp_path, "abc", 300)
+
+    cache.put(key("136"), source, {"filename": "video.mp4"})
+    os.remove(source)
+    hit = cache.get(key("136"))
+
+    assert hit is not None
+    path, metadata = hit
+    assert metadata == {"filename": "video.mp4"}
+    with open(path, "rb") as f:
+        assert f.read() == b"abc" * 100
+    # Deleting the served copy leaves the entry in place.
+    os.remove(path)
+    assert cache.get(key("136")) is not None
+    assert cache.get(key("247")) is None
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=0)
+
+    cache.put(key("136"), clip(tmp_path, "abc", 300), {})
+
+    assert cache.get(key("136")) is None
+    assert not os.path.exists(tmp_path / "cache")
+
+
+def age_entry(cache: ResultCache, format_id: str, seconds: float) -> None:
+    # Served copies are hard links, sharing the entry's modification time.
+    path, _ = cache.get(key(format_id))
+    age(path, seconds)
+    os.remove(path)
+
+
+def test_hits_refresh_the_entry(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = ResultCache(directory, max_bytes=1000)
+    cache.put(key("136"), clip(tmp_path, "abc", 300), {})
+    age_entry(cache, "136", 60)
+    (media,) = cached_media(directory)
+    assert os.stat(os.path.join(directory, media)).st_mtime < time.time() - 50
+
+    cache.get(key("136"))
+
+    assert os.stat(os.path.join(directory, media)).st_mtime > time.time() - 5
+
+
+def test_least_recently_used_entries_are_evicted_to_the_shared_budget(tmp_path):
+    directory = str(tmp_path / "cache")
+    # Two processes sharing the directory share its budget.
+    first, second = ResultCache(directory, 1000), ResultCache(directory, 1000)
+    first.put(key("136"), clip(tmp_path, "abc", 300), {})
+    second.put(key("247"), clip(tmp_path, "def", 300), {})
+    first.put(key("398"), clip(tmp_path, "ghi", 300), {})
+    age_entry(first, "136", 300)
+    age_entry(first, "247", 200)
+    age_entry(first, "398", 100)
+    # The oldest entry is used again, leaving 247 the least recently used.
+    os.remove(second.get(key("136"))[0])
+
+    second.put(key("399"), clip(tmp_path, "jkl", 300), {})
+
+    assert len(cached_media(directory)) == 3
+    assert first.get(key("247")) is None
+    for format_id in ("136", "398", "399"):
+        assert first.get(key(format_id)) is not None
+
+
+def test_clips_over_the_whole_budget_are_not_stored(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+
+    cache.put(key("136"), clip(tmp_path, "abc", 1200), {})
+
+    assert cache.get(key("136")) is None
+
+
+def test_startup_only_sweeps_stale_leftovers(tmp_path):
+    directory = tmp_path / "cache"
+    cache = ResultCache(str(directory), max_bytes=1000)
+    cache.put(key("136"), clip(tmp_path, "abc", 300), {})
+    age_entry(cache, "136", 2 * LEFTOVER_MAX_AGE_SECONDS)
+    leftovers = {}
+    for subdirectory in ("tmp", "served"):
+        for name in ("stale", "recent"):
+            path = directory / subdirectory / f"{name}.mp4"
+            path.write_bytes(b"x")
+            leftovers[subdirectory, name] = path
+            if name == "stale":
+                age(str(path), LEFTOVER_MAX_AGE_SECONDS + 60)
+
+    ResultCache(str(directory), max_bytes=1000)
+
+    for (_, name), path in leftovers.items():
+        assert path.exists() == (name == "recent")
+    # However old, cached entries stay until evicted.
+    assert cache.get(key("136")) is not None
@@ -0,0 +1,355 @@
+import asyncio
+import os
+import re
+import shutil
+import subprocess
+from typing import Dict, List, Tuple
+
+import pytest
+
+from yt_download_service.app.use_cases import sample_cutter
+from yt_download_service.app.use_cases.sample_cutter import SampleCutter
+from yt_download_service.app.utils.ffmpeg_runner import run_ffmpeg
+
+FRAME_RATE = 30
+FRAME = 1 / FRAME_RATE
+GOP_SECONDS = 2
+CLIP_SECONDS = 12
+# A white flash during the first tenth of every second, and a beep at the
+# same time, to find where a cut starts and whether the tracks line up.
+FLASHES = (
+    f"color=c=black:s=160x90:r={FRAME_RATE},"
+    "drawbox=c=white:t=fill:enable='lt(mod(t,1),0.1)'"
+)
+BEEPS = (
+    "sine=frequency=1000:sample_rate=48000:samples_per_frame=48,"
+    "volume=volume=0:enable='gte(mod(t,1),0.1)'"
+)
+# Fragmented, like YouTube's DASH formats.
+FRAGMENTED = ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+
+H264 = "avc1.64001f"
+VP9 = "vp09.00.31.08"
+
+
+def ffmpeg(*args: str) -> None:
+    subprocess.run(["ffmpeg", "-v", "error", "-y", *args], check=True)
+
+
+def ffprobe(*args: str) -> str:
+    return subprocess.run(
+        ["ffprobe", "-v", "error", *args], check=True, capture_output=True, text=True
+    ).stdout
+
+
+@pytest.fixture(scope="module")
+def media(tmp_path_factory) -> Dict[str, str]:
+    if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+        pytest.skip("ffmpeg is not installed")
+    directory = tmp_path_factory.mktemp("media")
+    paths = {
+        H264: str(directory / "h264.mp4"),
+        VP9: str(directory / "vp9.webm"),
+        "audio": str(directory / "audio.m4a"),
+    }
+    gop = ["-g", str(GOP_SECONDS * FRAME_RATE), "-keyint_min", "1"]
+    source = ["-f", "lavfi", "-i", FLASHES, "-t", str(CLIP_SECONDS), *gop, "-an"]
+    ffmpeg(
+        *source,
+        *["-c:v", "libx264", "-preset", "veryfast", "-sc_threshold", "0"],
+        *["-pix_fmt", "yuv420p", *FRAGMENTED, paths[H264]],
+    )
+    ffmpeg(
+        *source,
+        *["-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8"],
+        paths[VP9],
+    )
+    ffmpeg(
+        *["-f", "lavfi", "-i", BEEPS, "-t", str(CLIP_SECONDS), "-vn"],
+        *["-c:a", "aac", *FRAGMENTED, paths["audio"]],
+    )
+    return paths
+
+
+@pytest.fixture(scope="module")
+def mpegts_demuxer(tmp_path_factory) -> None:
+    # Smart cuts join MPEG-TS segments, some ffmpeg builds crash reading them.
+    path = str(tmp_path_factory.mktemp("mpegts") / "probe.ts")
+    ffmpeg("-f", "lavfi", "-i", FLASHES, "-t", "0.2", "-f", "mpegts", path)
+    probe = subprocess.run(["ffprobe", "-v", "error", path], capture_output=True)
+    if probe.returncode != 0:
+        pytest.skip("this ffmpeg build cannot read MPEG-TS")
+
+
+def cut(
+    media: Dict[str, str], vcodec: str, start: float, end: float, work_dir: str
+) -> Tuple[str, str, str]:
+    output = os.path.join(work_dir, "sample.mp4")
+
+    async def main():
+        command, video_mode, audio_mode = await SampleCutter().build_command(
+            {"url": media[vcodec], "vcodec": vcodec},
+            {"url": media["audio"], "acodec": "mp4a.40.2"},
+            start,
+            end,
+            work_dir,
+            output,
+        )
+        await run_ffmpeg(command)
+        return video_mode, audio_mode
+
+    video_mode, audio_mode = asyncio.run(main())
+    return output, video_mode, audio_mode
+
+
+def streams(path: str) -> Dict[str, Dict[str, str]]:
+    output = ffprobe(
+        "-show_entries",
+        "stream=codec_type,codec_name,start_time,duration",
+        "-of",
+        "compact=p=0:nk=0",
+        path,
+    )
+    result = {}
+    for line in output.splitlines():
+        fields = dict(field.split("=", 1) for field in line.split("|"))
+        result[fields["codec_type"]] = fields
+    return result
+
+
+def video_packets(path: str) -> List[Tuple[float, str]]:
+    output = ffprobe(
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        path,
+    )
+    packets = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(",")
+        packets.append((float(pts_time), flags))
+    return packets
+
+
+def onsets(path: str, kind: str) -> List[float]:
+    """Return when the flashes, or the beeps, of a file start."""
+    if kind == "video":
+        args, pattern = ["-an", "-vf", "blackdetect=d=0:pix_th=0.5"], r"black_end:(\S+)"
+    else:
+        args = ["-vn", "-af", "silencedetect=n=-30dB:d=0.05"]
+        pattern = r"silence_end: (\S+)"
+    stderr = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", path, *args, "-f", "null", "-"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    return [float(time) for time in re.findall(pattern, stderr)]
+
+
+def av_offsets(video_path: str, audio_path: str, until: float) -> List[float]:
+    """Return how long after each flash before `until` its beep starts."""
+    beeps = onsets(audio_path, "audio")
+    return [
+        min(beeps, key=lambda beep: abs(beep - flash)) - flash
+        for flash in onsets(video_path, "video")
+        if flash < until
+    ]
+
+
+def assert_accurate_sample(media: Dict[str, str], path: str, start: float, end: float):
+    info = streams(path)
+    video, audio = info["video"], info["audio"]
+    assert video["codec_name"] == "h264"
+    video_start = float(video["start_time"])
+    video_end = video_start + float(video["duration"])
+    audio_end = float(audio["start_time"]) + float(audio["duration"])
+
+    # Within one frame of the requested length, the audio ending with it.
+    assert float(video["duration"]) == pytest.approx(end - start, abs=FRAME)
+    assert audio_end == pytest.approx(video_end, abs=FRAME)
+
+    # The first frame decoded is a keyframe, and the first shown.
+    packets = video_packets(path)
+    assert packets[0][1].startswith("K")
+    assert packets[0][0] == min(pts for pts, _ in packets)
+
+    # Frame accurate: the first flash is where it was in the source.
+    flashes = onsets(path, "video")
+    first_flash = int(start) + 1 - start
+    assert flashes[0] - video_start == pytest.approx(first_flash, abs=FRAME)
+
+    # Each beep follows its flash as closely as in the source.
+    (source_offset,) = set(
+        round(offset, 3)
+        for offset in av_offsets(media[H264], media["audio"], CLIP_SECONDS - 1)
+    )
+    # Leaving out the end, where both detectors report the end of stream.
+    offsets = av_offsets(path, path, video_end - 0.25)
+    assert len(offsets) == len(
+        [s for s in range(CLIP_SECONDS) if start < s < end - 0.25]
+    )
+    for offset in offsets:
+        assert offset == pytest.approx(source_offset, abs=FRAME)
+
+
+def test_find_cut_keyframes(media):
+    async def main():
+        cutter = SampleCutter()
+        return (
+            await cutter.find_cut_keyframes(media[H264], 2.5, 9.5),
+            await cutter.find_cut_keyframes(media[H264], 4.5, 7),
+            await cutter.find_cut_keyframes(media[H264], 4.5, 5.5),
+        )
+
+    whole_gops, one_keyframe, no_keyframe = asyncio.run(main())
+
+    assert whole_gops == pytest.approx((4, 8), abs=3 * FRAME)
+    assert one_keyframe is None
+    assert no_keyframe is None
+
+
+def test_smart_cut_copies_the_whole_gops(media, mpegts_demuxer, tmp_path):
+    path, video_mode, audio_mode = cut(media, H264, 2.5, 9.5, str(tmp_path))
+
+    assert (video_mode, audio_mode) == ("smart_cut", "copy")
+    assert_accurate_sample(media, path, 2.5, 9.5)
+
+
+def test_non_h264_source_is_reencoded(media, tmp_path):
+    path, video_mode, audio_mode = cut(media, VP9, 2.5, 9.5, str(tmp_path))
+
+    assert (video_mode, audio_mode) == ("transcode", "transcode")
+    assert_accurate_sample(media, path, 2.5, 9.5)
+
+
+def test_range_without_a_whole_gop_is_reencoded(media, tmp_path):
+    path, video_mode, audio_mode = cut(media, H264, 4.5, 7, str(tmp_path))
+
+    assert (video_mode, audio_mode) == ("transcode", "transcode")
+    assert_accurate_sample(media, path, 4.5, 7)
+
+
+@pytest.fixture
+def planned_cut(monkeypatch):
+    """Smart cut 2.5s to 9.5s of a source with keyframes at 4s and 8s, offline."""
+    commands = []
+    running = []
+    concurrency = []
+
+    async def find_cut_keyframes(self, video_url, start_seconds, end_seconds):
+        return 4.0, 8.0
+
+    async def fake_run_ffmpeg(command):
+        running.append(command)
+        concurrency.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(command)
+        commands.append(command)
+
+    monkeypatch.setattr(SampleCutter, "find_cut_keyframes", find_cut_keyframes)
+    monkeypatch.setattr(sample_cutter, "run_ffmpeg", fake_run_ffmpeg)
+
+    def cut(work_dir: str, acodec: str = "mp4a.40.2", try_slots=lambda count: []):
+        return asyncio.run(
+            SampleCutter(preset="veryfast", threads=2).build_command(
+                {"url": "https://media.example/video", "vcodec": H264},
+                {"url": "https://media.example/audio", "acodec": acodec},
+                2.5,
+                9.5,
+                work_dir,
+                "pipe:1",
+                try_slots,
+            )
+        )
+
+    return cut, commands, concurrency
+
+
+def argument(command: List[str], flag: str) -> str:
+    return command[command.index(flag) + 1]
+
+
+def test_plan_segments_copies_between_the_keyframes():
+    cutter = SampleCutter()
+
+    assert cutter.plan_segments(2.5, 9.5, (4, 8), "high") == [
+        (2.5, 1.5, "high"),
+        (4, 4, None),
+        (8, 1.5, "high"),
+    ]
+    # A range starting or ending on a keyframe has nothing to encode there.
+    assert cutter.plan_segments(4, 8, (4, 8), "main") == [(4, 4, None)]
+
+
+def test_smart_cut_encodes_the_edges_and_concatenates(planned_cut, tmp_path):
+    cut, commands, _ = planned_cut
+
+    command, video_mode, audio_mode = cut(str(tmp_path))
+
+    assert (video_mode, audio_mode) == ("smart_cut", "copy")
+    segments = sorted(commands, key=lambda segment: segment[-1])
+    assert [segment[-1] for segment in segments] == [
+        str(tmp_path / f"segment_{index}.ts") for index in range(3)
+    ]
+    assert [
+        (argument(segment, "-ss"), argument(segment, "-t"), argument(segment, "-c:v"))
+        for segment in segments
+    ] == [
+        ("2.500", "1.500", "libx264"),
+        ("4.000", "4.000", "copy"),
+        ("8.000", "1.500", "libx264"),
+    ]
+    for segment in segments:
+        assert argument(segment, "-f") == "mpegts"
+    assert argument(segments[0], "-profile:v") == "high"
+    assert argument(segments[0], "-x264-params") == "repeat-headers=1"
+
+    assert (tmp_path / "segments.txt").read_text() == "".join(
+        f"file '{segment[-1]}'\n" for segment in segments
+    )
+    assert command[command.index("-f") : command.index("-i") + 2] == [
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(tmp_path / "segments.txt"),
+    ]
+    assert argument(command, "-ss") == "2.500"
+    assert argument(command, "-t") == "7.000"
+    assert argument(command, "-c:v") == "copy"
+    assert argument(command, "-c:a") == "copy"
+    assert argument(command, "-video_track_timescale") == "90000"
+    assert command[-3:] == ["-f", "mp4", "pipe:1"]
+
+
+def test_smart_cut_transcodes_non_mp4_audio(planned_cut, tmp_path):
+    cut, _, _ = planned_cut
+
+    command, video_mode, audio_mode = cut(str(tmp_path), acodec="opus")
+
+    assert (video_mode, audio_mode) == ("smart_cut", "transcode")
+    assert argument(command, "-c:a") == "aac"
+
+
+def test_segments_run_in_parallel_only_on_extra_slots(planned_cut, tmp_path):
+    cut, _, concurrency = planned_cut
+
+    cut(str(tmp_path))
+    assert max(concurrency) == 1
+
+    requested, released = [], []
+
+    def try_slots(count):
+        requested.append(count)
+        return [lambda: released.append(1)]
+
+    concurrency.clear()
+    cut(str(tmp_path), try_slots=try_slots)
+    assert requested == [2]
+    assert max(concurrency) == 2
+    assert released == [1]
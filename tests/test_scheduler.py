@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+import threading
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from yt_download_service.app.controllers import video_controller
+from yt_download_service.app.utils.dependencies import get_current_user_from_token
+from yt_download_service.app.utils.scheduler import (
+    JobScheduler,
+    SchedulerFullError,
+    SlotPool,
+)
+from yt_download_service.domain.models.user import UserRead
+from yt_download_service.main import app
+
+
+async def wait_for(future: asyncio.Future, timeout: float = 5):
+    return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+
+def test_slot_is_handed_over_on_release():
+    async def main():
+        pool = SlotPool("test", limit=1, per_user_limit=1, max_queue=2)
+        await pool.acquire("alice")
+        waiting = asyncio.create_task(pool.acquire("bob"))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        assert pool.queued == 1
+
+        pool.release("alice")
+
+        await wait_for(waiting)
+        assert pool.active == 1
+        assert pool.queued == 0
+        assert pool._active_by_user == {"bob": 1}
+
+    asyncio.run(main())
+
+
+def test_users_over_their_limit_let_others_go_first():
+    async def main():
+        pool = SlotPool("test", limit=2, per_user_limit=1, max_queue=4)
+        await pool.acquire("alice")
+        await pool.acquire("bob")
+        alice_again = asyncio.create_task(pool.acquire("alice"))
+        carol = asyncio.create_task(pool.acquire("carol"))
+        await asyncio.sleep(0)
+
+        # Alice still holds a slot, so Bob's goes to Carol, queued after her.
+        pool.release("bob")
+        await wait_for(carol)
+        assert not alice_again.done()
+
+        pool.release("alice")
+        await wait_for(alice_again)
+        assert pool._active_by_user == {"alice": 1, "carol": 1}
+
+    asyncio.run(main())
+
+
+def test_cancellation_after_the_handover_gives_the_slot_back():
+    async def main():
+        pool = SlotPool("test", limit=1, per_user_limit=1, max_queue=2)
+        await pool.acquire("alice")
+        waiting = asyncio.create_task(pool.acquire("bob"))
+        await asyncio.sleep(0)
+
+        # Bob is handed the slot, then cancelled before he resumes.
+        pool.release("alice")
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert pool.active == 0
+        assert pool._active_by_user == {}
+        await pool.acquire("carol")
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        pool = SlotPool("test", limit=1, per_user_limit=1, max_queue=2)
+        await pool.acquire("alice")
+        waiting = asyncio.create_task(pool.acquire("bob"))
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert pool.queued == 0
+        pool.release("alice")
+        assert pool.active == 0
+
+    asyncio.run(main())
+
+
+def test_full_queue_rejects_with_a_retry_delay():
+    async def main():
+        pool = SlotPool("test", limit=1, per_user_limit=1, max_queue=1)
+        await pool.acquire("alice")
+        waiting = asyncio.create_task(pool.acquire("bob"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(SchedulerFullError) as error:
+            await pool.acquire("carol")
+
+        # Two holds of 10 seconds, the default estimate, on a single slot.
+        assert error.value.retry_after == 20
+        assert "test queue is full" in str(error.value)
+        waiting.cancel()
+
+    asyncio.run(main())
+
+
+def test_full_queue_is_answered_with_429_and_retry_after(monkeypatch):
+    async def get_video_formats(url, encoded_cookies=None, user_id=None):
+        raise SchedulerFullError("extraction", retry_after=7)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    user = UserRead(
+        id=uuid.uuid4(), email="alice@example.com", created_at=now, updated_at=now
+    )
+    monkeypatch.setattr(
+        video_controller.video_service, "get_video_formats", get_video_formats
+    )
+    monkeypatch.setitem(
+        app.dependency_overrides, get_current_user_from_token, lambda: user
+    )
+
+    response = TestClient(app).post(
+        "/api/video/formats",
+        json={"url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ"},
+    )
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+    assert "extraction queue is full" in response.json()["detail"]
+
+
+def test_cancelled_extraction_holds_its_slot_until_the_call_returns():
+    async def main():
+        scheduler = JobScheduler(extraction_workers=1, per_user_limit=1)
+        unblock = threading.Event()
+        extraction = asyncio.create_task(
+            scheduler.run_extraction("alice", unblock.wait, 5)
+        )
+        await asyncio.sleep(0.05)
+
+        extraction.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await extraction
+        # The thread is still running the call.
+        assert scheduler.extraction.active == 1
+
+        unblock.set()
+        for _ in range(100):
+            if scheduler.extraction.active == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert scheduler.extraction.active == 0
+
+    asyncio.run(main())
+
+
+def test_extra_transcode_slots_are_only_taken_when_free():
+    async def main():
+        scheduler = JobScheduler(transcode_slots=3, per_user_limit=3, max_queue=4)
+        release = await scheduler.acquire_transcode_slot("alice")
+
+        extra = scheduler.try_acquire_transcode_slots("alice", 5)
+        assert len(extra) == 2
+        assert scheduler.transcoding.active == 3
+        assert scheduler.try_acquire_transcode_slots("bob", 1) == []
+
+        for release_extra in extra:
+            release_extra()
+            release_extra()
+        release()
+        assert scheduler.transcoding.active == 0
+
+    asyncio.run(main())
+
+
+def test_extra_transcode_slots_count_against_the_user_limit():
+    async def main():
+        scheduler = JobScheduler(transcode_slots=4, per_user_limit=2, max_queue=4)
+        release = await scheduler.acquire_transcode_slot("alice")
+
+        (release_extra,) = scheduler.try_acquire_transcode_slots("alice", 3)
+        assert len(scheduler.try_acquire_transcode_slots("bob", 3)) == 2
+
+        # Alice's next request waits for one of her slots.
+        waiting = asyncio.create_task(scheduler.acquire_transcode_slot("alice"))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        release_extra()
+        (await waiting)()
+        release()
+        assert scheduler.transcoding.active == 2
+
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import copy
+import logging
+
+import pytest
+
+from yt_download_service.app.use_cases.video_service import VideoService
+from yt_download_service.app.utils.async_utils import start_generator
+
+VIDEO_URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def video_format(format_id, vcodec, height, tbr, **extra):
+    return {
+        "format_id": format_id,
+        "vcodec": vcodec,
+        "acodec": "none",
+        "height": height,
+        "width": height * 16 // 9,
+        "resolution": f"{height * 16 // 9}x{height}",
+        "tbr": tbr,
+        "ext": "mp4" if vcodec.startswith("avc1") else "webm",
+        "protocol": "https",
+        "url": f"https://media.example/{format_id}",
+        **extra,
+    }
+
+
+def audio_format(format_id, acodec, abr, ext):
+    return {
+        "format_id": format_id,
+        "vcodec": "none",
+        "acodec": acodec,
+        "abr": abr,
+        "ext": ext,
+        "protocol": "https",
+        "url": f"https://media.example/{format_id}",
+    }
+
+
+INFO_DICT = {
+    "id": "dQw4w9WgXcQ",
+    "title": "Test video",
+    "duration": 60,
+    "formats": [
+        audio_format("140", "mp4a.40.2", 129, "m4a"),
+        audio_format("251", "opus", 160, "webm"),
+        video_format("136", "avc1.64001f", 720, 1440),
+        video_format("247", "vp09.00.31.08", 720, 1440),
+        video_format("hls-720", "avc1.64001f", 720, 1440, protocol="m3u8_native"),
+    ],
+}
+
+
+@pytest.fixture
+def service():
+    service = VideoService()
+    service._extract_video_info = lambda url, encoded_cookies=None: copy.deepcopy(
+        INFO_DICT
+    )
+    yield service
+    service.close()
+
+
+def test_format_selection_leaves_the_cached_info_untouched(service):
+    cached = service._get_video_info(VIDEO_URL)
+
+    service._get_formats_sync(VIDEO_URL)
+    service._select_full_download_formats(cached)
+    service._select_sample_formats(cached, "247")
+
+    assert service._get_video_info(VIDEO_URL) is cached
+    assert cached == INFO_DICT
+
+
+def test_sample_formats_prefer_h264_and_m4a(service, caplog):
+    with caplog.at_level(logging.INFO):
+        video, audio = service._select_sample_formats(
+            service._get_video_info(VIDEO_URL), "247"
+        )
+
+    assert video["format_id"] == "136"
+    assert audio["format_id"] == "140"
+    assert "format 136 instead of 247" in caplog.text
+
+
+def test_requested_h264_format_is_kept_silently(service, caplog):
+    with caplog.at_level(logging.INFO):
+        video, _ = service._select_sample_formats(
+            service._get_video_info(VIDEO_URL), "136"
+        )
+
+    assert video["format_id"] == "136"
+    assert "instead of" not in caplog.text
+
+
+def test_stream_cleanup_runs_when_closing_hangs(service):
+    cleaned = []
+
+    async def hanging_stream():
+        try:
+            yield b"first"
+            yield b"second"
+        finally:
+            await asyncio.Event().wait()
+
+    async def main():
+        stream = await start_generator(
+            service._stream_then_cleanup(hanging_stream(), lambda: cleaned.append(1))
+        )
+        assert await anext(stream) == b"first"
+        close = asyncio.create_task(stream.aclose())
+        await asyncio.sleep(0.01)
+        close.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await close
+
+    asyncio.run(main())
+    assert cleaned == [1]
+
+
+def test_stream_cleanup_runs_when_dropped_unread(service):
+    cleaned = []
+
+    async def stream():
+        yield b"first"
+
+    async def main():
+        await start_generator(
+            service._stream_then_cleanup(stream(), lambda: cleaned.append(1))
+        )
+        # The garbage collected generator is closed by the event loop.
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cleaned == [1]
+
+
+def test_close_forgets_the_cookie_jars(service):
+    encoded_cookies = base64.b64encode(b"# Netscape HTTP Cookie File\n").decode()
+    service._cookie_jars.decode(encoded_cookies)
+    assert len(service._cookie_jars._jars) == 1
+
+    service.close()
+
+    assert len(service._cookie_jars._jars) == 0